@@ -0,0 +1,91 @@
+"""
+Developed by Keagan B
+ClipMaker -- bench_rescan.py
+
+Benchmarks a full folder scan against an incremental rescan of an unchanged library.
+Run from the repository root with `python benchmarks/bench_rescan.py`
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import db_handler
+import scanner
+
+DIR_COUNT = 200
+FILES_PER_DIR = 500
+
+
+def rescan(clip_folders, extensions):
+    """
+    Scans the folders against the stored state, then stores the result
+    :param clip_folders: Folders to scan
+    :param extensions: Set built with scanner.build_extension_set
+    :return: Dict of folder ID to ScanResult
+    """
+    known_dirs, known_files = db_handler.get_scan_state([clip_folder.db_id for clip_folder in clip_folders])
+
+    results = scanner.scan_folders(clip_folders, extensions, known_dirs, known_files,
+                                   lambda clip_folder, paths: db_handler.add_clips(clip_folder.db_id, paths))
+
+    for clip_folder in clip_folders:
+        result = results[clip_folder.db_id]
+        previous_dirs = known_dirs[clip_folder.db_id]
+
+        db_handler.save_scan_state(clip_folder.db_id,
+                                   {path: mtime for path, mtime in result.dirs.items() if previous_dirs.get(path) != mtime},
+                                   [path for path in previous_dirs if path not in result.dirs],
+                                   result.added | result.modified, result.removed)
+
+    db_handler.wait_for_writes()
+
+    return results
+
+
+def main():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = db_handler.get_database(os.path.join(temp_dir, "bench.db"))
+        db_handler.start_writer()
+
+        # generate library
+        library = os.path.join(temp_dir, "library")
+        for dir_index in range(DIR_COUNT):
+            dir_path = os.path.join(library, f"session {dir_index}")
+            os.makedirs(dir_path)
+
+            for file_index in range(FILES_PER_DIR):
+                open(os.path.join(dir_path, f"clip {file_index}.mp4"), "w").close()
+
+        clip_folders = [db_handler.add_dir(library, include_subdirs=True)]
+        extensions = scanner.build_extension_set(["mp4", "mkv"])
+        file_count = DIR_COUNT * FILES_PER_DIR
+
+        # first scan lists & stats everything
+        start = time.perf_counter()
+        rescan(clip_folders, extensions)
+        print(f"full scan:        {(time.perf_counter() - start) * 1000:.1f} ms for {file_count} files")
+
+        # nothing changed, every directory is skipped
+        start = time.perf_counter()
+        results = rescan(clip_folders, extensions)
+        print(f"unchanged rescan: {(time.perf_counter() - start) * 1000:.1f} ms, "
+              f"{results[clip_folders[0].db_id].skipped_dirs} of {DIR_COUNT + 1} directories skipped")
+
+        # one new file, only its directory is listed
+        time.sleep(0.01)
+        open(os.path.join(library, "session 0", "new clip.mp4"), "w").close()
+
+        start = time.perf_counter()
+        results = rescan(clip_folders, extensions)
+        print(f"one file added:   {(time.perf_counter() - start) * 1000:.1f} ms, "
+              f"{len(results[clip_folders[0].db_id].added)} added")
+
+        db_handler.stop_writer()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Developed by Keagan B
+ClipMaker -- bench_search.py
+
+Benchmarks full text search on a generated library, against the old index that kept file extensions & searched
+every word as a prefix.
+Run from the repository root with `python benchmarks/bench_search.py`
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import db_handler
+
+CLIP_COUNT = 100_000
+TAG_COUNT = 50
+TAGS_PER_CLIP = 3
+GAMES = ["Valorant", "Minecraft", "Rocket League", "Apex Legends", "Overwatch", "Fortnite"]
+QUERIES = ["m", "mp", "mp4", "v", "va", "valorant", "rocket le", "2024", "tag 1"]
+QUERY_RUNS = 20
+
+
+def time_queries() -> None:
+    """
+    Prints the average time & result count of each query
+    :return:
+    """
+    for query in QUERIES:
+        start = time.perf_counter()
+        for _ in range(QUERY_RUNS):
+            results = db_handler.search_clips(query)
+        print(f"  {query!r:12} {(time.perf_counter() - start) * 1000 / QUERY_RUNS:8.3f} ms avg, "
+              f"{len(results)} results")
+
+
+def main():
+    random.seed(0)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = db_handler.get_database(os.path.join(temp_dir, "bench.db"))
+
+        # generate library, named like recorder output
+        folder = db_handler.add_dir("/bench")
+        paths = [f"/bench/{random.choice(GAMES)} 2024-{random.randint(1, 12):02}-{random.randint(1, 28):02} "
+                 f"{index:06}.{random.choice(['mp4', 'mp4', 'mkv'])}" for index in range(CLIP_COUNT)]
+        clips = db_handler.add_clips(folder.db_id, paths)
+
+        section = db_handler.create_tag_section("bench")
+        tags = [db_handler.create_tag(section.db_id, f"tag {i}").db_id for i in range(TAG_COUNT)]
+
+        db.executemany("INSERT OR IGNORE INTO clip_to_tags (clip_id, tag_id) VALUES (?, ?)",
+                       [(clip.db_id, tag) for clip in clips for tag in random.sample(tags, TAGS_PER_CLIP)])
+        db.commit()
+
+        print(f"file names without extensions, short words matched whole ({CLIP_COUNT} clips):")
+        time_queries()
+
+        # index the full file names again & search every word as a prefix, like before migration 8
+        db.execute("""
+        UPDATE clip_search SET file_name = (SELECT substr(path, length(rtrim(path, replace(path, '/', ''))) + 1)
+                                            FROM clips WHERE clips.id = clip_search.rowid)
+        """)
+        db.execute("INSERT INTO clip_search (clip_search) VALUES ('optimize')")
+        db.commit()
+
+        min_length = db_handler.SEARCH_PREFIX_MIN_LENGTH
+        db_handler.SEARCH_PREFIX_MIN_LENGTH = 1
+
+        print("full file names, every word a prefix:")
+        time_queries()
+
+        db_handler.SEARCH_PREFIX_MIN_LENGTH = min_length
+
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Developed by Keagan B
+ClipMaker -- bench_tag_index.py
+
+Benchmarks the in-memory tag index against the SQL filter query on a generated library.
+Run from the repository root with `python benchmarks/bench_tag_index.py`
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import db_handler
+
+CLIP_COUNT = 100_000
+TAG_COUNT = 50
+TAGS_PER_CLIP = 5
+QUERY_RUNS = 100
+
+
+def main():
+    random.seed(0)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = db_handler.get_database(os.path.join(temp_dir, "bench.db"))
+
+        # generate library
+        folder = db_handler.add_dir("/bench")
+        clips = db_handler.add_clips(folder.db_id, [f"/bench/{i}.mp4" for i in range(CLIP_COUNT)])
+
+        section = db_handler.create_tag_section("bench")
+        tags = [db_handler.create_tag(section.db_id, f"tag {i}").db_id for i in range(TAG_COUNT)]
+
+        db.executemany("INSERT OR IGNORE INTO clip_to_tags (clip_id, tag_id) VALUES (?, ?)",
+                       [(clip.db_id, tag) for clip in clips for tag in random.sample(tags, TAGS_PER_CLIP)])
+        db.commit()
+
+        # index build time
+        start = time.perf_counter()
+        db_handler.build_tag_index()
+        print(f"index build: {(time.perf_counter() - start) * 1000:.1f} ms for {CLIP_COUNT} clips")
+
+        filters = [[[section.db_id, random.sample(tags, random.randint(1, 3))]] for _ in range(QUERY_RUNS)]
+
+        # index query latency
+        start = time.perf_counter()
+        for tag_filter in filters:
+            db_handler.get_filtered_clip_ids(tag_filter)
+        print(f"index query: {(time.perf_counter() - start) * 1000 / QUERY_RUNS:.3f} ms avg")
+
+        # SQL query latency
+        index = db_handler.TAG_INDEX
+        db_handler.TAG_INDEX = None
+
+        start = time.perf_counter()
+        for tag_filter in filters:
+            db_handler.get_filtered_clip_ids(tag_filter)
+        print(f"SQL query:   {(time.perf_counter() - start) * 1000 / QUERY_RUNS:.3f} ms avg")
+
+        db_handler.TAG_INDEX = index
+
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
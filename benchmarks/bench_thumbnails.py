@@ -0,0 +1,119 @@
+"""
+Developed by Keagan B
+ClipMaker -- bench_thumbnails.py
+
+Benchmarks thumbnail throughput with one & several workers, and the cache's hit rate when browsing a library
+bigger than the cache. Throughput needs ffmpeg on the PATH, the cache benchmark doesn't.
+Run from the repository root with `python benchmarks/bench_thumbnails.py`
+"""
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import thumbnails
+
+CLIP_COUNT = 24
+CLIP_SECONDS = 5
+
+LIBRARY_SIZE = 5000
+LOOKUPS = 50000
+THUMBNAIL_BYTES = 8 * 1024
+CACHED_FRACTION = 0.2
+
+
+def make_thumbnails(cache, clip_paths, workers):
+    """
+    Makes a thumbnail for every clip & waits for them all
+    :param cache: ThumbnailCache to use
+    :param clip_paths: Paths of the clips
+    :param workers: Number of worker threads
+    :return: Seconds taken
+    """
+    done = threading.Semaphore(0)
+
+    generator = thumbnails.ThumbnailGenerator(cache, lambda clip_id, path: done.release(), workers)
+    generator.start()
+
+    start = time.perf_counter()
+    for clip_id, path in enumerate(clip_paths):
+        generator.request(clip_id, path, CLIP_SECONDS * 1000, clip_id)
+
+    for _ in clip_paths:
+        done.acquire()
+
+    elapsed = time.perf_counter() - start
+    generator.stop()
+
+    return elapsed
+
+
+def bench_throughput(temp_dir):
+    """
+    Makes test clips with ffmpeg, then times cold & warm thumbnail runs
+    :param temp_dir: Folder to work in
+    :return:
+    """
+    if shutil.which("ffmpeg") is None:
+        print("throughput: skipped, ffmpeg is not on the PATH")
+        return
+
+    clip_paths = []
+    for index in range(CLIP_COUNT):
+        path = os.path.join(temp_dir, f"clip {index}.mp4")
+        subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", f"testsrc=size=1920x1080:rate=30:d={CLIP_SECONDS}",
+                        "-c:v", "libx264", "-preset", "ultrafast", path], check=True)
+        clip_paths.append(path)
+
+    for workers in sorted({1, thumbnails.MAX_WORKERS}):
+        cache = thumbnails.ThumbnailCache(os.path.join(temp_dir, f"cache {workers}"))
+
+        elapsed = make_thumbnails(cache, clip_paths, workers)
+        print(f"cold, {workers} workers: {CLIP_COUNT / elapsed:.1f} thumbnails/s")
+
+        elapsed = make_thumbnails(cache, clip_paths, workers)
+        print(f"warm, {workers} workers: {CLIP_COUNT / elapsed:.1f} thumbnails/s, "
+              f"hit rate {cache.get_stats()['hit_rate']:.0%}")
+
+
+def bench_cache(temp_dir):
+    """
+    Browses a library with a skewed access pattern through a cache that only fits part of it
+    :param temp_dir: Folder to work in
+    :return:
+    """
+    cache = thumbnails.ThumbnailCache(os.path.join(temp_dir, "lru"),
+                                      max_bytes=int(LIBRARY_SIZE * CACHED_FRACTION) * THUMBNAIL_BYTES)
+    data = os.urandom(THUMBNAIL_BYTES)
+    keys = [thumbnails.get_key(f"/clips/clip {index}.mp4", 0, index) for index in range(LIBRARY_SIZE)]
+
+    # recent clips get looked at far more than old ones
+    rng = random.Random(0)
+    weights = [1 / (rank + 1) for rank in range(LIBRARY_SIZE)]
+    lookups = rng.choices(keys, weights, k=LOOKUPS)
+
+    start = time.perf_counter()
+    for key in lookups:
+        if cache.get(key) is None:
+            cache.put(key, data)
+    elapsed = time.perf_counter() - start
+
+    stats = cache.get_stats()
+    print(f"cache: {LOOKUPS / elapsed:.0f} lookups/s, hit rate {stats['hit_rate']:.1%} with "
+          f"{CACHED_FRACTION:.0%} of {LIBRARY_SIZE} thumbnails cached, {stats['bytes'] // 1024} KiB used")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        bench_cache(temp_dir)
+        bench_throughput(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Developed by Keagan B
+ClipMaker -- bench_trims.py
+
+Benchmarks each export mode on generated test pattern clips, timing it and checking how exact its cuts are: the
+length of the output against the trim asked for, and the timestamp of its first frame. Needs ffmpeg on the PATH.
+Run from the repository root with `python benchmarks/bench_trims.py`
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import media_handler
+
+CLIP_SECONDS = 60
+FRAME_RATE = 30
+
+# keyframe every 2 seconds, like most recorders
+GOP_SIZE = 60
+
+# (start, end) in milliseconds. Ends at -1 run to the end of the clip
+TRIMS = [(0, 10000), (2500, 7250), (12345, 20000), (50000, 59500), (40000, -1)]
+
+# cuts within a frame of the asked for time count as exact
+TOLERANCE_MS = 1000 / FRAME_RATE
+
+
+def make_clip(path):
+    """
+    Makes a test pattern clip with a tone
+    :param path: Path to write the clip to
+    :return:
+    """
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", f"testsrc=size=1280x720:rate={FRAME_RATE}:"
+                    f"d={CLIP_SECONDS}", "-f", "lavfi", "-i", f"sine=frequency=440:d={CLIP_SECONDS}", "-c:v",
+                    "libx264", "-preset", "ultrafast", "-g", str(GOP_SIZE), "-c:a", "aac", "-shortest", path],
+                   check=True)
+
+
+def probe_output(path):
+    """
+    :param path: Path of an exported clip
+    :return: Length of the clip & timestamp of its first video frame, in milliseconds
+    """
+    result = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries",
+                             "format=duration:frame=pts_time", "-read_intervals", "%+#1", "-of", "json", path],
+                            capture_output=True, check=True)
+    data = json.loads(result.stdout)
+
+    return float(data["format"]["duration"]) * 1000, float(data["frames"][0]["pts_time"]) * 1000
+
+
+def run_plan(plan):
+    """
+    Runs a plan's ffmpeg steps
+    :param plan: ExportPlan to run
+    :return: Seconds taken
+    """
+    start = time.perf_counter()
+    try:
+        for stream in plan.steps:
+            stream.run(quiet=True)
+    finally:
+        plan.cleanup()
+
+    return time.perf_counter() - start
+
+
+def bench_trim(clip_path, output_path, start, end):
+    """
+    Exports one trim with every mode that can make it
+    :param clip_path: Path of the test clip
+    :param output_path: Path to write exports to
+    :param start: Starting millisecond
+    :param end: Ending millisecond, -1 for the end of the clip
+    :return:
+    """
+    expected_ms = (end if end > 0 else CLIP_SECONDS * 1000) - start
+
+    plans = [
+        ("re-encode", media_handler.ExportPlan(media_handler.REENCODE, [
+            media_handler.build_trim(clip_path, output_path, start, end)
+        ])),
+        ("keyframe", media_handler.plan_export(clip_path, output_path, start, end, media_handler.KEYFRAME_PRECISION)),
+        ("frame", media_handler.plan_export(clip_path, output_path, start, end, media_handler.FRAME_PRECISION)),
+    ]
+
+    for precision, plan in plans:
+        mode = plan.mode
+        elapsed = run_plan(plan)
+        duration_ms, first_frame_ms = probe_output(output_path)
+
+        error_ms = duration_ms - expected_ms
+        exact = "exact" if abs(error_ms) <= TOLERANCE_MS else "off"
+
+        print(f"{start:>6}-{end:<6} {precision:<9} {mode:<11} {elapsed:6.2f}s  length {duration_ms:8.1f} ms "
+              f"({error_ms:+7.1f}, {exact})  first frame {first_frame_ms:6.1f} ms")
+
+
+def main():
+    if shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None:
+        print("skipped, ffmpeg is not on the PATH")
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        clip_path = os.path.join(temp_dir, "pattern.mp4")
+        make_clip(clip_path)
+
+        for start, end in TRIMS:
+            bench_trim(clip_path, os.path.join(temp_dir, "trimmed.mp4"), start, end)
+
+
+if __name__ == "__main__":
+    main()
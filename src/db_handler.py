@@ -8,9 +8,231 @@ Database interaction utilities
 from __future__ import annotations
 
 import sqlite3
+import json
+import os
 import models
-
+import db_writer
+import tag_index
+import entity_cache
+import db_profiler
+import scanner
+from concurrent.futures import Future
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # only needed for hints, export_queue imports this module through media_handler
+    import export_queue
+
+# read connection, only used from the UI thread
 DB_OBJ: sqlite3.Connection | None = None
+DB_PATH: str | None = None
+
+# background writer that owns the write connection. Writes run inline on DB_OBJ until it is started
+WRITER: db_writer.DatabaseWriter | None = None
+
+# set once the writer is stopped, so late writes from other threads are refused instead of run on DB_OBJ
+WRITES_CLOSED = False
+
+# ID for the next export job. Only the UI thread adds jobs, so IDs are handed out here without waiting on the writer
+NEXT_EXPORT_JOB_ID: int | None = None
+
+# clip columns that can be edited through queue_clip_edit
+CLIP_EDIT_FIELDS = ("path", "custom_name", "is_favorite", "is_hidden", "trimmed_start", "trimmed_end")
+
+# clip columns read into Clip objects, in the order build_clip_obj expects them
+CLIP_COLUMNS = ("id", "path", "custom_name", "is_favorite", "is_hidden", "trimmed_start", "trimmed_end", "probed_size",
+                "duration_ms", "width", "height", "fps", "video_codec", "audio_codec", "bit_rate")
+
+# CLIP_COLUMNS as a select list
+CLIP_SELECT = ", ".join(f"clips.{column}" for column in CLIP_COLUMNS)
+
+# clip edits waiting to be written, by clip ID. Values are read from the clip object when flushed
+PENDING_CLIP_EDITS: dict[int, tuple[models.Clip, set[str]]] = {}
+
+# in-memory tag -> clip bitsets, kept in step with clip_to_tags
+TAG_INDEX: tag_index.TagIndex | None = None
+
+# identity maps, so every database row has one live object
+CLIP_CACHE = entity_cache.EntityCache("clips", capacity=2048)
+TAG_CACHE = entity_cache.EntityCache("tags")
+TAG_SECTION_CACHE = entity_cache.EntityCache("tag sections")
+
+# tag IDs in each section, in display order
+SECTION_TAG_IDS: dict[int, list[int]] = {}
+
+# shortest word searched as a prefix. Shorter words would match most of the search index, so they're matched whole
+SEARCH_PREFIX_MIN_LENGTH = 2
+
+# ordered schema migrations, applied on top of the base schema. The database's user_version
+# stores how many of these have been applied, so only append new entries to the end.
+MIGRATIONS: list[str] = [
+    # 1 - stop duplicate tag links & index the relationship tables
+    """
+    DELETE FROM clip_to_tags WHERE id NOT IN (SELECT MIN(id) FROM clip_to_tags GROUP BY clip_id, tag_id);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_clip_to_tags_clip_tag ON clip_to_tags (clip_id, tag_id);
+    CREATE INDEX IF NOT EXISTS idx_clip_to_tags_tag_clip ON clip_to_tags (tag_id, clip_id);
+
+    DELETE FROM tag_section_to_tags WHERE rowid NOT IN
+        (SELECT MIN(rowid) FROM tag_section_to_tags GROUP BY section_id, tag_id);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_tag_section_to_tags_section_tag ON tag_section_to_tags (section_id, tag_id);
+    CREATE INDEX IF NOT EXISTS idx_tag_section_to_tags_tag_section ON tag_section_to_tags (tag_id, section_id);
+
+    DELETE FROM clip_folder_to_clips WHERE id NOT IN
+        (SELECT MIN(id) FROM clip_folder_to_clips GROUP BY clip_folder_id, clip_id);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_clip_folder_to_clips_folder_clip
+        ON clip_folder_to_clips (clip_folder_id, clip_id);
+    CREATE INDEX IF NOT EXISTS idx_clip_folder_to_clips_clip ON clip_folder_to_clips (clip_id);
+    """,
+    # 2 - full text search over clip names, file names & tag names. The row ID is the clip ID
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS clip_search USING fts5(custom_name, file_name, tag_names, prefix='2 3');
+
+    INSERT INTO clip_search (rowid, custom_name, file_name, tag_names)
+    SELECT id, custom_name,
+        substr(path, length(rtrim(path, replace(replace(path, '/', ''), '\\', ''))) + 1),
+        (SELECT group_concat(tags.tag_name, ' ') FROM clip_to_tags JOIN tags ON tags.id = clip_to_tags.tag_id
+         WHERE clip_to_tags.clip_id = clips.id)
+    FROM clips;
+
+    CREATE TRIGGER IF NOT EXISTS clip_search_clip_insert AFTER INSERT ON clips BEGIN
+        INSERT INTO clip_search (rowid, custom_name, file_name, tag_names) VALUES (new.id, new.custom_name,
+            substr(new.path, length(rtrim(new.path, replace(replace(new.path, '/', ''), '\\', ''))) + 1), NULL);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS clip_search_clip_update AFTER UPDATE OF path, custom_name ON clips BEGIN
+        UPDATE clip_search SET custom_name = new.custom_name,
+            file_name = substr(new.path, length(rtrim(new.path, replace(replace(new.path, '/', ''), '\\', ''))) + 1)
+        WHERE rowid = new.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS clip_search_clip_delete AFTER DELETE ON clips BEGIN
+        DELETE FROM clip_search WHERE rowid = old.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS clip_search_tag_link AFTER INSERT ON clip_to_tags BEGIN
+        UPDATE clip_search SET tag_names = (SELECT group_concat(tags.tag_name, ' ') FROM clip_to_tags
+            JOIN tags ON tags.id = clip_to_tags.tag_id WHERE clip_to_tags.clip_id = new.clip_id)
+        WHERE rowid = new.clip_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS clip_search_tag_unlink AFTER DELETE ON clip_to_tags BEGIN
+        UPDATE clip_search SET tag_names = (SELECT group_concat(tags.tag_name, ' ') FROM clip_to_tags
+            JOIN tags ON tags.id = clip_to_tags.tag_id WHERE clip_to_tags.clip_id = old.clip_id)
+        WHERE rowid = old.clip_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS clip_search_tag_rename AFTER UPDATE OF tag_name ON tags BEGIN
+        UPDATE clip_search SET tag_names = (SELECT group_concat(tags.tag_name, ' ') FROM clip_to_tags
+            JOIN tags ON tags.id = clip_to_tags.tag_id WHERE clip_to_tags.clip_id = clip_search.rowid)
+        WHERE rowid IN (SELECT clip_id FROM clip_to_tags WHERE tag_id = new.id);
+    END;
+    """,
+    # 3 - remove link rows left behind by deleted clips, tags, sections & folders
+    """
+    DELETE FROM clip_to_tags WHERE clip_id NOT IN (SELECT id FROM clips) OR tag_id NOT IN (SELECT id FROM tags);
+    DELETE FROM clip_folder_to_clips
+        WHERE clip_id NOT IN (SELECT id FROM clips) OR clip_folder_id NOT IN (SELECT id FROM clip_folders);
+    DELETE FROM tag_section_to_tags
+        WHERE tag_id NOT IN (SELECT id FROM tags) OR section_id NOT IN (SELECT id FROM tag_sections);
+    DELETE FROM tags WHERE id NOT IN (SELECT tag_id FROM tag_section_to_tags);
+    """,
+    # 4 - file & directory state from the last folder scan, so unchanged directories can be skipped.
+    # file_size is NULL for clips that haven't been scanned yet
+    """
+    ALTER TABLE clips ADD COLUMN file_mtime_ns INTEGER;
+    ALTER TABLE clips ADD COLUMN file_size INTEGER;
+
+    CREATE TABLE IF NOT EXISTS scanned_dirs
+    (
+        clip_folder_id INTEGER NOT NULL,
+        path TEXT NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        PRIMARY KEY (clip_folder_id, path),
+        FOREIGN KEY (clip_folder_id) REFERENCES clip_folders(id)
+    );
+    """,
+    # 5 - flag clips whose file can't be found. Their last known size is kept, for relinking by file name
+    """
+    ALTER TABLE clips ADD COLUMN is_missing INTEGER DEFAULT 0 CHECK (is_missing == 0 || is_missing == 1);
+    CREATE INDEX IF NOT EXISTS idx_clips_missing ON clips (id) WHERE is_missing = 1;
+    """,
+    # 6 - file details read by ffprobe. probed_mtime_ns & probed_size are the file's state when it was probed,
+    # and are NULL for clips that haven't been probed
+    """
+    ALTER TABLE clips ADD COLUMN probed_mtime_ns INTEGER;
+    ALTER TABLE clips ADD COLUMN probed_size INTEGER;
+    ALTER TABLE clips ADD COLUMN duration_ms INTEGER;
+    ALTER TABLE clips ADD COLUMN width INTEGER;
+    ALTER TABLE clips ADD COLUMN height INTEGER;
+    ALTER TABLE clips ADD COLUMN fps REAL;
+    ALTER TABLE clips ADD COLUMN video_codec TEXT;
+    ALTER TABLE clips ADD COLUMN audio_codec TEXT;
+    ALTER TABLE clips ADD COLUMN bit_rate INTEGER;
+    """,
+    # 7 - exports, so unfinished ones can be resumed & up to date outputs skipped. fingerprint & the source state
+    # are set once a job starts, output state once its output is written. finished_at is NULL until a job ends
+    """
+    CREATE TABLE IF NOT EXISTS export_jobs
+    (
+        id INTEGER PRIMARY KEY,
+        clip_id INTEGER NOT NULL,
+        source_path TEXT NOT NULL,
+        trimmed_start INTEGER NOT NULL,
+        trimmed_end INTEGER NOT NULL,
+        preset TEXT NOT NULL,
+        output_path TEXT NOT NULL,
+        state TEXT NOT NULL,
+        error TEXT,
+        fingerprint TEXT,
+        source_mtime_ns INTEGER,
+        source_size INTEGER,
+        output_mtime_ns INTEGER,
+        output_size INTEGER,
+        finished_at REAL
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_export_jobs_output ON export_jobs (output_path, id);
+    CREATE INDEX IF NOT EXISTS idx_export_jobs_unfinished ON export_jobs (id) WHERE finished_at IS NULL;
+    """,
+    # 8 - index file names without their extension. Every clip shares a token like mp4, which made short prefix
+    # searches match the whole library. Names are cut at their last dot, names without one are kept whole
+    """
+    DROP TRIGGER IF EXISTS clip_search_clip_insert;
+    DROP TRIGGER IF EXISTS clip_search_clip_update;
+
+    DELETE FROM clip_search;
+
+    INSERT INTO clip_search (rowid, custom_name, file_name, tag_names)
+    SELECT id, custom_name,
+        CASE WHEN instr(name, '.') > 0 THEN substr(name, 1, length(rtrim(name, replace(name, '.', ''))) - 1)
+            ELSE name END,
+        (SELECT group_concat(tags.tag_name, ' ') FROM clip_to_tags JOIN tags ON tags.id = clip_to_tags.tag_id
+         WHERE clip_to_tags.clip_id = files.id)
+    FROM (SELECT id, custom_name, substr(path, length(rtrim(path, replace(replace(path, '/', ''), '\\', ''))) + 1)
+          AS name FROM clips) AS files;
+
+    INSERT INTO clip_search (clip_search) VALUES ('optimize');
+
+    CREATE TRIGGER clip_search_clip_insert AFTER INSERT ON clips BEGIN
+        INSERT INTO clip_search (rowid, custom_name, file_name, tag_names)
+        SELECT new.id, new.custom_name,
+            CASE WHEN instr(name, '.') > 0 THEN substr(name, 1, length(rtrim(name, replace(name, '.', ''))) - 1)
+                ELSE name END,
+            NULL
+        FROM (SELECT substr(new.path, length(rtrim(new.path, replace(replace(new.path, '/', ''), '\\', ''))) + 1)
+              AS name);
+    END;
+
+    CREATE TRIGGER clip_search_clip_update AFTER UPDATE OF path, custom_name ON clips BEGIN
+        UPDATE clip_search SET custom_name = new.custom_name, file_name = (
+            SELECT CASE WHEN instr(name, '.') > 0 THEN substr(name, 1, length(rtrim(name, replace(name, '.', ''))) - 1)
+                ELSE name END
+            FROM (SELECT substr(new.path, length(rtrim(new.path, replace(replace(new.path, '/', ''), '\\', ''))) + 1)
+                  AS name))
+        WHERE rowid = new.id;
+    END;
+    """,
+]
 
 
 def get_database(path: str = "./clips.db", should_wipe=False) -> sqlite3.Connection:
@@ -21,11 +243,14 @@ def get_database(path: str = "./clips.db", should_wipe=False) -> sqlite3.Connect
     :param should_wipe: Should the database be wiped on app start up?
     :return: sqlite3.Connection object to database
     """
-    global DB_OBJ
+    global DB_OBJ, DB_PATH, WRITES_CLOSED
 
     # check if a database has already been established
     if DB_OBJ is None:
-        db = sqlite3.connect(path)
+        db = sqlite3.connect(path, factory=db_profiler.connection_factory())
+        db_writer.configure_connection(db)
+        DB_PATH = path
+        WRITES_CLOSED = False
     else:
         db = DB_OBJ
 
@@ -38,6 +263,15 @@ def get_database(path: str = "./clips.db", should_wipe=False) -> sqlite3.Connect
         db.execute("DROP TABLE IF EXISTS clip_to_tags")
         db.execute("DROP TABLE IF EXISTS clip_folders")
         db.execute("DROP TABLE IF EXISTS clip_folder_to_clips")
+        db.execute("DROP TABLE IF EXISTS clip_search")
+        db.execute("DROP TABLE IF EXISTS scanned_dirs")
+        db.execute("DROP TABLE IF EXISTS export_jobs")
+
+        # reset schema version so migrations are reapplied
+        db.execute("PRAGMA user_version = 0")
+
+        # forget objects loaded from the old data
+        clear_caches()
 
     db.execute("""
     CREATE TABLE IF NOT EXISTS tag_sections
@@ -111,11 +345,162 @@ def get_database(path: str = "./clips.db", should_wipe=False) -> sqlite3.Connect
 
     db.commit()
 
+    # bring older databases up to date
+    migrate_database(db)
+
     DB_OBJ = db
 
+    # load tag filter index
+    build_tag_index()
+
     return db
 
 
+def clear_caches() -> None:
+    """
+    Drops every cached object
+    :return:
+    """
+    global NEXT_EXPORT_JOB_ID
+
+    for cache in (CLIP_CACHE, TAG_CACHE, TAG_SECTION_CACHE):
+        cache.clear()
+
+    SECTION_TAG_IDS.clear()
+
+    # read again from the database in use
+    NEXT_EXPORT_JOB_ID = None
+
+
+def cache_stats() -> dict[str, dict]:
+    """
+    :return: Hit & miss counts for each object cache
+    """
+    return {cache.name: cache.stats() for cache in (CLIP_CACHE, TAG_CACHE, TAG_SECTION_CACHE)}
+
+
+def build_tag_index() -> tag_index.TagIndex:
+    """
+    Builds the in-memory tag index from every clip & tag link in the database
+    :return: The new TagIndex object
+    """
+    global TAG_INDEX
+
+    cursor = DB_OBJ.cursor()
+    data = cursor.execute("SELECT clip_id, tag_id FROM clip_to_tags").fetchall()
+    cursor.close()
+
+    index = tag_index.TagIndex()
+    index.build(data)
+
+    TAG_INDEX = index
+
+    return index
+
+
+def start_writer() -> db_writer.DatabaseWriter:
+    """
+    Starts the background writer thread. All writes made after this are queued instead of run on the UI thread.
+    :return: The running DatabaseWriter object
+    """
+    global WRITER, WRITES_CLOSED
+
+    if WRITER is None:
+        # make sure nothing is left pending on the read connection
+        DB_OBJ.commit()
+
+        WRITER = db_writer.DatabaseWriter(DB_PATH)
+        WRITER.start()
+        WRITES_CLOSED = False
+
+    return WRITER
+
+
+def stop_writer() -> None:
+    """
+    Commits any queued writes and stops the background writer thread. Writes made afterwards are refused, so threads
+    still running can't write through the read connection
+    :return:
+    """
+    global WRITER, WRITES_CLOSED
+
+    flush_clip_edits()
+
+    if WRITER is not None:
+        WRITER.stop()
+
+        # closed before the writer is dropped, so no write slips through in between
+        WRITES_CLOSED = True
+        WRITER = None
+
+
+def writes_closed() -> bool:
+    """
+    :return: True if the writer has been stopped & writes are being refused
+    """
+    return WRITES_CLOSED
+
+
+def wait_for_writes() -> None:
+    """
+    Blocks until every queued write has been committed. Use before reads that must see the latest edits.
+    :return:
+    """
+    flush_clip_edits()
+
+    if WRITER is not None:
+        WRITER.flush()
+
+
+def _write(job, *args) -> Future:
+    """
+    Queues a write job on the writer thread, or runs it straight away if the writer isn't started yet
+    :param job: Function to run, called as job(connection, *args)
+    :param args: Extra arguments for the job
+    :return: Future that resolves to the job's return value once it is committed. Fails if the writer was stopped
+    """
+    # read once, another thread may stop the writer in between
+    writer = WRITER
+    if writer is not None:
+        return writer.submit(job, *args)
+
+    future = Future()
+    if WRITES_CLOSED:
+        future.set_exception(RuntimeError("The database writer has been stopped"))
+        return future
+
+    try:
+        with DB_OBJ:
+            future.set_result(job(DB_OBJ, *args))
+    except Exception as e:
+        future.set_exception(e)
+
+    return future
+
+
+def migrate_database(db: sqlite3.Connection) -> None:
+    """
+    Applies any schema migrations the database hasn't seen yet, in order
+    :param db: Connection to the database to migrate
+    :return:
+    """
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+
+    for index in range(version, len(MIGRATIONS)):
+        # apply migration & bump version in the same transaction
+        try:
+            db.executescript(f"""
+            BEGIN;
+            {MIGRATIONS[index]}
+            PRAGMA user_version = {index + 1};
+            COMMIT;
+            """)
+        except sqlite3.Error:
+            # leave the database at the last good version
+            db.rollback()
+            raise
+
+
 def does_dir_exist(path) -> int | None:
     """
     Check if a directory exists in the database
@@ -134,22 +519,28 @@ def does_dir_exist(path) -> int | None:
         return None
 
 
-def add_dir(path) -> models.ClipFolder:
+def add_dir(path, include_subdirs: bool = False) -> models.ClipFolder:
     """
     Add a new directory to the database
     :param path: Path of the directory to add
-    :param should_commit:  Should the function immediately commit?
+    :param include_subdirs: Should clips in subfolders be included?
     :return: ClipFolder object representing the new directory
     """
-    # add directory to database with default values
-    cursor = DB_OBJ.cursor()
-    cursor.execute("INSERT INTO clip_folders (path) VALUES (?);", (path,))
+    def write(db: sqlite3.Connection) -> int:
+        # add directory to database
+        cursor = db.cursor()
+        cursor.execute("INSERT INTO clip_folders (path, include_subdirs) VALUES (?, ?);", (path, int(include_subdirs)))
 
-    # pull id from database
-    db_id = cursor.execute("SELECT last_insert_rowid();").fetchone()[0]
-    cursor.close()
+        # pull id from database
+        db_id = cursor.execute("SELECT last_insert_rowid();").fetchone()[0]
+        cursor.close()
+
+        return db_id
+
+    # wait for the new ID
+    db_id = _write(write).result()
 
-    return models.ClipFolder(path=path, db_id=db_id)
+    return models.ClipFolder(path=path, db_id=db_id, include_subdirs=include_subdirs)
 
 
 def remove_folder(obj: models.ClipFolder) -> None:
@@ -158,24 +549,29 @@ def remove_folder(obj: models.ClipFolder) -> None:
     :param obj: The folder object to remove
     :return:
     """
-    cursor = DB_OBJ.cursor()
-    # get list of clips
-    clip_ids = cursor.execute("SELECT clip_id FROM clip_folder_to_clips WHERE clip_folder_id = ?;",
-                              (obj.db_id,)).fetchall()
+    def write(db: sqlite3.Connection) -> None:
+        cursor = db.cursor()
+        folder_clips = "SELECT clip_id FROM clip_folder_to_clips WHERE clip_folder_id = ?"
 
-    # remove clips from database
-    for clip_id in clip_ids:
-        clip_id = clip_id[0]
-        cursor.execute("DELETE FROM clips WHERE id = ?;", (clip_id,))
-        cursor.execute("DELETE FROM clip_to_tags WHERE clip_id - ?;", (clip_id,))
-        cursor.execute("DELETE FROM clip_folder_to_clips WHERE clip_id = ?;", (clip_id,))
+        # remove clips & their tag links from database, the folder links go last since the others select from them
+        cursor.execute(f"DELETE FROM clip_to_tags WHERE clip_id IN ({folder_clips});", (obj.db_id,))
+        cursor.execute(f"DELETE FROM clips WHERE id IN ({folder_clips});", (obj.db_id,))
+        cursor.execute(f"DELETE FROM clip_folder_to_clips WHERE clip_id IN ({folder_clips});", (obj.db_id,))
 
-    # remove clip folder
-    cursor.execute("DELETE FROM clip_folders WHERE id = ?;", (obj.db_id,))
+        # remove clip folder & its scan state
+        cursor.execute("DELETE FROM scanned_dirs WHERE clip_folder_id = ?;", (obj.db_id,))
+        cursor.execute("DELETE FROM clip_folders WHERE id = ?;", (obj.db_id,))
 
-    cursor.close()
+        cursor.close()
 
-    DB_OBJ.commit()
+    _write(write)
+
+    # clear removed clips from the tag index & cache
+    if TAG_INDEX is not None:
+        TAG_INDEX.remove_clips([clip.db_id for clip in obj.clips])
+
+    for clip in obj.clips:
+        CLIP_CACHE.evict(clip.db_id)
 
 
 def get_clip_folders() -> list[models.ClipFolder]:
@@ -195,6 +591,417 @@ def get_clip_folders() -> list[models.ClipFolder]:
     return clip_folders
 
 
+def get_scan_state(folder_ids: list[int]) -> tuple[dict[int, dict[str, int]], dict[str, dict[str, tuple[int, int]]]]:
+    """
+    Loads the directory & file state stored by the last scan of some clip folders
+    :param folder_ids: IDs of the clip folders
+    :return: A dict of folder ID to that folder's directory mtimes, and a dict of directory path to the clip files
+    found in it, each mapped to their (mtime_ns, size). Files are listed in path order
+    """
+    known_dirs: dict[int, dict[str, int]] = {folder_id: {} for folder_id in folder_ids}
+    known_files: dict[str, dict[str, tuple[int, int]]] = {}
+
+    cursor = DB_OBJ.cursor()
+
+    data = cursor.execute("SELECT clip_folder_id, path, mtime_ns FROM scanned_dirs WHERE clip_folder_id IN "
+                          "(SELECT value FROM json_each(?))", (json.dumps(folder_ids),)).fetchall()
+    for folder_id, path, mtime_ns in data:
+        known_dirs[folder_id][path] = mtime_ns
+
+    # file state is kept per clip, since folders can overlap
+    data = cursor.execute("SELECT path, file_mtime_ns, file_size FROM clips WHERE is_missing = 0 "
+                          "AND file_size IS NOT NULL ORDER BY path").fetchall()
+    for path, mtime_ns, size in data:
+        # clip paths are always built as directory + os.sep + name, and rpartition is far cheaper than dirname
+        known_files.setdefault(path.rpartition(os.sep)[0], {})[path] = (mtime_ns, size)
+
+    cursor.close()
+
+    return known_dirs, known_files
+
+
+def save_scan_state(clip_folder: int, changed_dirs: dict[str, int], removed_dirs: list[str],
+                    changed_files: dict[str, tuple[int, int]], removed_files: list[str]) -> None:
+    """
+    Stores what a folder scan found, for the next scan to compare against
+    :param clip_folder: Database ID of the scanned clip folder
+    :param changed_dirs: New & changed directories, mapped to their mtime_ns
+    :param removed_dirs: Directories that are no longer part of the folder
+    :param changed_files: Added & modified clip files, mapped to their (mtime_ns, size). Clips must already exist
+    :param removed_files: Clip files that are no longer there
+    :return:
+    """
+    _write(_save_scan_state, clip_folder, changed_dirs, removed_dirs, changed_files, removed_files)
+
+
+def apply_scan_results(results: dict[int, scanner.ScanResult],
+                       known_dirs: dict[int, dict[str, int]]) -> dict[int, list[models.Clip]]:
+    """
+    Adds the new clips & stores the scan state from several folder scans, all in a single transaction
+    :param results: Folder ID to the result of scanning that folder
+    :param known_dirs: Folder ID to the directory mtimes the scans were compared against
+    :return: A dict of folder ID to the clips that were newly added to it
+    """
+    def write(db: sqlite3.Connection) -> dict[int, dict[str, int]]:
+        new_ids = {}
+
+        for folder_id, result in results.items():
+            previous_dirs = known_dirs.get(folder_id, {})
+
+            # clips have to exist before their file state can be stored
+            new_ids[folder_id] = _add_clips(db, folder_id, list(result.added))
+            _save_scan_state(db, folder_id, result.changed_dirs(previous_dirs), result.removed_dirs(previous_dirs),
+                             result.added | result.modified, result.removed)
+
+        return new_ids
+
+    # wait for the new IDs
+    new_ids = _write(write).result()
+
+    return {folder_id: [CLIP_CACHE.put(db_id, models.Clip(path=path, db_id=db_id)) for path, db_id in db_ids.items()]
+            for folder_id, db_ids in new_ids.items()}
+
+
+def _save_scan_state(db: sqlite3.Connection, clip_folder: int, changed_dirs: dict[str, int], removed_dirs: list[str],
+                     changed_files: dict[str, tuple[int, int]], removed_files: list[str]) -> None:
+    """
+    Write job that stores what a folder scan found. See save_scan_state
+    :param db: Write connection
+    :return:
+    """
+    cursor = db.cursor()
+
+    cursor.executemany("""
+    INSERT INTO scanned_dirs (clip_folder_id, path, mtime_ns) VALUES (?, ?, ?)
+    ON CONFLICT (clip_folder_id, path) DO UPDATE SET mtime_ns = excluded.mtime_ns
+    """, [(clip_folder, path, mtime_ns) for path, mtime_ns in changed_dirs.items()])
+
+    if len(removed_dirs) > 0:
+        cursor.execute("DELETE FROM scanned_dirs WHERE clip_folder_id = ? AND path IN "
+                       "(SELECT value FROM json_each(?))", (clip_folder, json.dumps(removed_dirs)))
+
+    cursor.executemany("UPDATE clips SET file_mtime_ns = ?, file_size = ?, is_missing = 0 WHERE path = ?",
+                       [(mtime_ns, size, path) for path, (mtime_ns, size) in changed_files.items()])
+
+    # keep the last known state of removed files, for relinking
+    if len(removed_files) > 0:
+        cursor.execute("UPDATE clips SET is_missing = 1 WHERE path IN (SELECT value FROM json_each(?))",
+                       (json.dumps(removed_files),))
+
+    cursor.close()
+
+
+def get_clip_paths() -> dict[int, str]:
+    """
+    :return: A dict of every clip ID to its path
+    """
+    cursor = DB_OBJ.cursor()
+    data = cursor.execute("SELECT id, path FROM clips").fetchall()
+    cursor.close()
+
+    return dict(data)
+
+
+def set_missing_clips(missing_ids: set[int]) -> None:
+    """
+    Flags exactly the given clips as missing, and every other clip as found
+    :param missing_ids: IDs of the clips whose files can't be found
+    :return:
+    """
+    # one statement, only touching rows whose flag changes
+    _write(_execute, """
+    UPDATE clips SET is_missing = NOT is_missing
+    WHERE is_missing != (id IN (SELECT value FROM json_each(?)))
+    """, (json.dumps(list(missing_ids)),))
+
+
+def mark_clips_missing(clip_ids: list[int]) -> None:
+    """
+    Flags clips as missing
+    :param clip_ids: IDs of the clips whose files can't be found
+    :return:
+    """
+    _write(_execute, "UPDATE clips SET is_missing = 1 WHERE id IN (SELECT value FROM json_each(?))",
+           (json.dumps(clip_ids),))
+
+
+def prune_missing_clips() -> list[int]:
+    """
+    Deletes every clip flagged as missing, along with its tags & folder links
+    :return: IDs of the deleted clips
+    """
+    def write(db: sqlite3.Connection) -> list[int]:
+        cursor = db.cursor()
+        missing_clips = "SELECT id FROM clips WHERE is_missing = 1"
+
+        clip_ids = [row[0] for row in cursor.execute(missing_clips).fetchall()]
+
+        # the clips go last since the others select from them
+        cursor.execute(f"DELETE FROM clip_to_tags WHERE clip_id IN ({missing_clips});")
+        cursor.execute(f"DELETE FROM clip_folder_to_clips WHERE clip_id IN ({missing_clips});")
+        cursor.execute("DELETE FROM clips WHERE is_missing = 1;")
+
+        cursor.close()
+
+        return clip_ids
+
+    # wait for the delete, so the clips aren't loaded again afterwards
+    clip_ids = _write(write).result()
+
+    # clear deleted clips from the tag index, cache & pending edits
+    if TAG_INDEX is not None:
+        TAG_INDEX.remove_clips(clip_ids)
+
+    for clip_id in clip_ids:
+        CLIP_CACHE.evict(clip_id)
+        PENDING_CLIP_EDITS.pop(clip_id, None)
+
+    return clip_ids
+
+
+def relink_missing_clips() -> dict[int, str]:
+    """
+    Points missing clips at a file with the same name that the folder scans found elsewhere. A missing clip is only
+    relinked when there is exactly one such file, with the same size if the clip's size is known. The clip made for
+    the found file is merged into the missing clip, which keeps its ID, name, trims & tags.
+    :return: A dict of relinked clip ID to its new path
+    """
+    def write(db: sqlite3.Connection) -> list[tuple[int, int, str, list[int]]]:
+        cursor = db.cursor()
+
+        # found clips by file name
+        candidates: dict[str, list[tuple[int, str, int | None]]] = {}
+        for db_id, path, size in cursor.execute("SELECT id, path, file_size FROM clips WHERE is_missing = 0"):
+            candidates.setdefault(path.rpartition(os.sep)[2], []).append((db_id, path, size))
+
+        # pair each missing clip with a single matching found clip
+        matches: dict[int, list[tuple[int, str]]] = {}
+        missing = cursor.execute("SELECT id, path, file_size FROM clips WHERE is_missing = 1").fetchall()
+        for db_id, path, size in missing:
+            found = [candidate for candidate in candidates.get(path.rpartition(os.sep)[2], [])
+                     if size is None or candidate[2] is None or candidate[2] == size]
+
+            if len(found) == 1:
+                matches.setdefault(found[0][0], []).append((db_id, found[0][1]))
+
+        relinked = []
+        for found_id, missing in matches.items():
+            # skip files that more than one missing clip could be
+            if len(missing) > 1:
+                continue
+
+            missing_id, new_path = missing[0]
+
+            # move the found clip's tags over, through inserts & deletes so the search index stays in step
+            tag_ids = [row[0] for row in cursor.execute("SELECT tag_id FROM clip_to_tags WHERE clip_id = ?",
+                                                        (found_id,)).fetchall()]
+            cursor.execute("INSERT OR IGNORE INTO clip_to_tags (clip_id, tag_id) SELECT ?, tag_id FROM clip_to_tags "
+                           "WHERE clip_id = ?", (missing_id, found_id))
+            cursor.execute("DELETE FROM clip_to_tags WHERE clip_id = ?", (found_id,))
+
+            # the missing clip takes over the found clip's folder
+            cursor.execute("DELETE FROM clip_folder_to_clips WHERE clip_id = ?", (missing_id,))
+            cursor.execute("UPDATE clip_folder_to_clips SET clip_id = ? WHERE clip_id = ?", (missing_id, found_id))
+
+            # and its path & file state, once the found clip is out of the way of the unique path
+            file_state = cursor.execute("SELECT file_mtime_ns, file_size FROM clips WHERE id = ?",
+                                        (found_id,)).fetchone()
+            cursor.execute("DELETE FROM clips WHERE id = ?", (found_id,))
+            cursor.execute("UPDATE clips SET path = ?, file_mtime_ns = ?, file_size = ?, is_missing = 0 WHERE id = ?",
+                           (new_path, *file_state, missing_id))
+
+            relinked.append((missing_id, found_id, new_path, tag_ids))
+
+        cursor.close()
+
+        return relinked
+
+    relinked = _write(write).result()
+
+    # bring loaded objects & the tag index in line
+    for missing_id, found_id, new_path, tag_ids in relinked:
+        CLIP_CACHE.evict(found_id)
+        PENDING_CLIP_EDITS.pop(found_id, None)
+
+        if TAG_INDEX is not None:
+            TAG_INDEX.remove_clips([found_id])
+            for tag_id in tag_ids:
+                TAG_INDEX.add(missing_id, tag_id)
+
+        clip = CLIP_CACHE.get(missing_id)
+        if clip is not None:
+            clip.path = new_path
+
+            clip_tag_ids = {tag.db_id for tag in clip.tags}
+            clip.tags.extend(get_tag(tag_id) for tag_id in tag_ids if tag_id not in clip_tag_ids)
+
+    return {missing_id: new_path for missing_id, _found_id, new_path, _tag_ids in relinked}
+
+
+def get_unprobed_clips() -> dict[int, tuple[str, tuple[int, int] | None]]:
+    """
+    Finds clips that need their file details read, because they were never probed or a scan saw their file change
+    :return: A dict of clip ID to the clip's path & the (mtime_ns, size) its file had when last probed
+    """
+    cursor = DB_OBJ.cursor()
+    data = cursor.execute("""
+    SELECT id, path, probed_mtime_ns, probed_size FROM clips
+    WHERE is_missing = 0 AND (probed_size IS NULL OR file_size != probed_size OR file_mtime_ns != probed_mtime_ns)
+    """).fetchall()
+    cursor.close()
+
+    return {db_id: (path, None if size is None else (mtime_ns, size)) for db_id, path, mtime_ns, size in data}
+
+
+def save_media_info(results: dict[int, tuple[tuple[int, int], models.MediaInfo | None]]) -> None:
+    """
+    Stores the file details of probed clips, and updates any loaded clip objects. Safe to call from any thread.
+    :param results: Clip ID to the (mtime_ns, size) the file had when probed & its MediaInfo, or None if the file
+    couldn't be read
+    :return:
+    """
+    rows = []
+    for clip_id, ((mtime_ns, size), media_info) in results.items():
+        # files ffprobe can't read are stored with no details, so they aren't probed again until they change
+        media_info = media_info or models.MediaInfo()
+
+        rows.append((mtime_ns, size, media_info.duration_ms, media_info.width, media_info.height, media_info.fps,
+                     media_info.video_codec, media_info.audio_codec, media_info.bit_rate, clip_id))
+
+        media_info.file_size = size
+
+        clip = CLIP_CACHE.get(clip_id)
+        if clip is not None:
+            clip.media_info = media_info
+
+    _write(_executemany, """
+    UPDATE clips SET probed_mtime_ns = ?, probed_size = ?, duration_ms = ?, width = ?, height = ?, fps = ?,
+        video_codec = ?, audio_codec = ?, bit_rate = ?
+    WHERE id = ?
+    """, rows)
+
+
+def get_unscanned_clip_ids() -> set[int]:
+    """
+    :return: IDs of clips that no folder scan has recorded file state for yet, and aren't known to be missing
+    """
+    cursor = DB_OBJ.cursor()
+    data = cursor.execute("SELECT id FROM clips WHERE file_size IS NULL AND is_missing = 0").fetchall()
+    cursor.close()
+
+    return {row[0] for row in data}
+
+
+def get_clips_from_paths(paths: list[str]) -> dict[str, models.Clip]:
+    """
+    Finds multiple clips in the database by path
+    :param paths: Paths of the clips to find
+    :return: A dict of path to Clip object. Paths that were not found are left out
+    """
+    if len(paths) == 0:
+        return {}
+
+    cursor = DB_OBJ.cursor()
+    data = cursor.execute("SELECT id, path FROM clips WHERE path IN (SELECT value FROM json_each(?))",
+                          (json.dumps(paths),)).fetchall()
+    cursor.close()
+
+    clips = get_clips_from_ids([row[0] for row in data])
+
+    return {path: clips[db_id] for db_id, path in data if db_id in clips}
+
+
+def add_export_jobs(jobs: list[export_queue.ExportJob]) -> list[int]:
+    """
+    Records new export jobs. Must be called from the UI thread
+    :param jobs: Jobs to record
+    :return: Database IDs of the jobs, in the same order
+    """
+    global NEXT_EXPORT_JOB_ID
+
+    # hand out IDs past any job already saved, rather than waiting for the writer to insert the rows
+    if NEXT_EXPORT_JOB_ID is None:
+        NEXT_EXPORT_JOB_ID = (DB_OBJ.execute("SELECT MAX(id) FROM export_jobs").fetchone()[0] or 0) + 1
+
+    db_ids = list(range(NEXT_EXPORT_JOB_ID, NEXT_EXPORT_JOB_ID + len(jobs)))
+    NEXT_EXPORT_JOB_ID += len(jobs)
+
+    # the writer runs jobs in order, so these rows are in before any update_export_job made with their IDs
+    rows = [(db_id, job.clip_id, job.input_path, job.start, job.end, job.precision, job.output_path, job.state)
+            for db_id, job in zip(db_ids, jobs)]
+
+    def write(db: sqlite3.Connection) -> None:
+        db.executemany("""
+        INSERT INTO export_jobs (id, clip_id, source_path, trimmed_start, trimmed_end, preset, output_path, state)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+    _write(write)
+
+    return db_ids
+
+
+def update_export_job(job: export_queue.ExportJob) -> None:
+    """
+    Saves an export job's state. Once a job has written its output, older finished jobs for the same output are
+    removed. Safe to call from any thread.
+    :param job: Job to save
+    :return:
+    """
+    source_mtime_ns, source_size = job.source_state or (None, None)
+    output_mtime_ns, output_size = job.output_state or (None, None)
+
+    _write(_execute, """
+    UPDATE export_jobs SET state = ?, error = ?, fingerprint = ?, source_mtime_ns = ?, source_size = ?,
+        output_mtime_ns = ?, output_size = ?, finished_at = ?
+    WHERE id = ?
+    """, (job.state, job.error, job.fingerprint, source_mtime_ns, source_size, output_mtime_ns, output_size,
+          job.finished_at or None, job.db_id))
+
+    if job.output_state is not None:
+        _write(_execute, """
+        DELETE FROM export_jobs WHERE output_path = ? AND id < ? AND finished_at IS NOT NULL
+        """, (job.output_path, job.db_id))
+
+
+def get_unfinished_export_jobs() -> list[tuple[int, int, int, int, str, str]]:
+    """
+    Finds export jobs that were queued or running when the app last closed. Jobs whose clip was removed are left out
+    :return: List of (database ID, clip ID, trimmed start, trimmed end, preset, output path), oldest first
+    """
+    cursor = DB_OBJ.cursor()
+    data = cursor.execute("""
+    SELECT export_jobs.id, clip_id, export_jobs.trimmed_start, export_jobs.trimmed_end, preset, output_path
+    FROM export_jobs JOIN clips ON clips.id = export_jobs.clip_id
+    WHERE finished_at IS NULL ORDER BY export_jobs.id
+    """).fetchall()
+    cursor.close()
+
+    return data
+
+
+def get_export_outputs(output_paths: list[str]) -> dict[str, tuple[str, int, int]]:
+    """
+    Finds what the last export written to each path was
+    :param output_paths: Paths to look up
+    :return: A dict of output path to the (fingerprint, mtime_ns, size) of the export written there. Paths nothing
+    was exported to are left out
+    """
+    if len(output_paths) == 0:
+        return {}
+
+    cursor = DB_OBJ.cursor()
+    data = cursor.execute("""
+    SELECT output_path, fingerprint, output_mtime_ns, output_size FROM export_jobs
+    WHERE id IN (SELECT MAX(id) FROM export_jobs
+                 WHERE output_size IS NOT NULL AND output_path IN (SELECT value FROM json_each(?))
+                 GROUP BY output_path)
+    """, (json.dumps(output_paths),)).fetchall()
+    cursor.close()
+
+    return {path: (fingerprint, mtime_ns, size) for path, fingerprint, mtime_ns, size in data}
+
+
 def does_clip_exist(path: str) -> int | None:
     """
     Check if a clip exists in the database
@@ -221,18 +1028,81 @@ def add_clip(clip_folder: int, path: str) -> models.Clip:
     :param should_commit: Should the function immediately commit?
     :return: Clip object representing the new clip
     """
-    # add clip to database with default values
-    cursor = DB_OBJ.cursor()
-    cursor.execute("INSERT INTO clips (path) VALUES (?)", (path,))
+    def write(db: sqlite3.Connection) -> int:
+        # add clip to database with default values
+        cursor = db.cursor()
+        cursor.execute("INSERT INTO clips (path) VALUES (?)", (path,))
+
+        # pull id from database
+        db_id = cursor.execute("SELECT last_insert_rowid();").fetchone()[0]
+
+        # add clip & folder relationship
+        cursor.execute("INSERT INTO clip_folder_to_clips (clip_folder_id, clip_id) VALUES (?, ?)",
+                       (clip_folder, db_id))
+        cursor.close()
+
+        return db_id
+
+    # wait for the new ID
+    db_id = _write(write).result()
+
+    return CLIP_CACHE.put(db_id, models.Clip(path=path, db_id=db_id))
+
+
+def add_clips(clip_folder: int, paths: list[str]) -> list[models.Clip]:
+    """
+    Adds many clips to the database in a single transaction. Paths that are already in the database are skipped.
+    :param clip_folder: Database ID of the clips' parent
+    :param paths: Paths of the clips to add
+    :return: Clip objects representing the newly added clips
+    """
+    if len(paths) == 0:
+        return []
+
+    # wait for the new IDs
+    db_ids = _write(_add_clips, clip_folder, paths).result()
+
+    return [CLIP_CACHE.put(db_id, models.Clip(path=path, db_id=db_id)) for path, db_id in db_ids.items()]
 
-    # pull id from database
-    db_id = cursor.execute("SELECT last_insert_rowid();").fetchone()[0]
 
-    # add clip & folder relationship
-    cursor.execute("INSERT INTO clip_folder_to_clips (clip_folder_id, clip_id) VALUES (?, ?)", (clip_folder, db_id))
+def _add_clips(db: sqlite3.Connection, clip_folder: int, paths: list[str]) -> dict[str, int]:
+    """
+    Write job that adds clips to a folder, skipping paths that are already in the database
+    :param db: Write connection
+    :param clip_folder: Database ID of the clips' parent
+    :param paths: Paths of the clips to add
+    :return: A dict of each newly added path to its clip ID, in insertion order
+    """
+    cursor = db.cursor()
+
+    # find which paths already exist, binding the whole path list as one JSON parameter
+    existing = cursor.execute("SELECT path FROM clips WHERE path IN (SELECT value FROM json_each(?))",
+                              (json.dumps(paths),)).fetchall()
+    existing = {row[0] for row in existing}
+
+    # remove duplicates while keeping order
+    new_paths = [path for path in dict.fromkeys(paths) if path not in existing]
+
+    if len(new_paths) == 0:
+        cursor.close()
+        return {}
+
+    # add clips to database with default values
+    cursor.executemany("INSERT INTO clips (path) VALUES (?)", [(path,) for path in new_paths])
+
+    # pull ids from database
+    data = cursor.execute("SELECT id, path FROM clips WHERE path IN (SELECT value FROM json_each(?))",
+                          (json.dumps(new_paths),)).fetchall()
+    db_ids = dict((path, db_id) for db_id, path in data)
+
+    # add clip & folder relationships
+    cursor.executemany("INSERT INTO clip_folder_to_clips (clip_folder_id, clip_id) VALUES (?, ?)",
+                       [(clip_folder, db_ids[path]) for path in new_paths])
+
     cursor.close()
 
-    return models.Clip(path=path, db_id=db_id)
+    # keep insertion order
+    return {path: db_ids[path] for path in new_paths}
 
 
 def get_clip_from_id(db_id: int) -> models.Clip | None:
@@ -241,15 +1111,91 @@ def get_clip_from_id(db_id: int) -> models.Clip | None:
     :param db_id: The ID of the Clip to find
     :return: A Clip object, or None if no clip was found
     """
+    return get_clips_from_ids([db_id]).get(db_id)
+
+
+def get_clips_from_ids(clip_ids: list[int]) -> dict[int, models.Clip]:
+    """
+    Finds multiple clips in the database, loading their tags in bulk
+    :param clip_ids: The IDs of the Clips to find
+    :return: A dict of clip ID to Clip object. IDs that were not found are left out
+    """
+    clips: dict[int, models.Clip] = {}
+
+    # use loaded clips where possible
+    missing_ids = []
+    for clip_id in clip_ids:
+        clip = CLIP_CACHE.get(clip_id)
+        if clip is not None:
+            clips[clip_id] = clip
+        else:
+            missing_ids.append(clip_id)
+
+    if len(missing_ids) == 0:
+        return clips
+
     cursor = DB_OBJ.cursor()
-    data = cursor.execute("SELECT * FROM clips WHERE id = ?", (db_id,)).fetchone()
+
+    for chunk in _chunk_list(missing_ids):
+        placeholders = ", ".join("?" * len(chunk))
+
+        # grab clip rows
+        data = cursor.execute(f"SELECT {CLIP_SELECT} FROM clips WHERE id IN ({placeholders})", chunk).fetchall()
+
+        # grab every tag on these clips in the same pass
+        tag_data = cursor.execute(f"""
+        SELECT clip_to_tags.clip_id, tags.* FROM clip_to_tags
+        JOIN tags ON tags.id = clip_to_tags.tag_id
+        WHERE clip_to_tags.clip_id IN ({placeholders})
+        """, chunk).fetchall()
+
+        clips.update(_build_clips_with_tags(data, tag_data))
+
     cursor.close()
 
-    if data is not None:
-        clip = build_clip_obj(data)
-        return clip
-    else:
-        return None
+    return clips
+
+
+def get_clips_in_folders(folder_ids: list[int]) -> dict[int, list[models.Clip]]:
+    """
+    Loads every clip in one or more clip folders along with their tags
+    :param folder_ids: IDs of the clip folders to load
+    :return: A dict of folder ID to the list of Clip objects in that folder
+    """
+    folders: dict[int, list[models.Clip]] = {folder_id: [] for folder_id in folder_ids}
+
+    if len(folder_ids) == 0:
+        return folders
+
+    placeholders = ", ".join("?" * len(folder_ids))
+
+    cursor = DB_OBJ.cursor()
+
+    # grab clip rows, keeping track of the folder each one belongs to
+    data = cursor.execute(f"""
+    SELECT clip_folder_to_clips.clip_folder_id, {CLIP_SELECT} FROM clips
+    JOIN clip_folder_to_clips ON clip_folder_to_clips.clip_id = clips.id
+    WHERE clip_folder_to_clips.clip_folder_id IN ({placeholders})
+    ORDER BY clips.id
+    """, folder_ids).fetchall()
+
+    # grab every tag on clips in these folders
+    tag_data = cursor.execute(f"""
+    SELECT clip_to_tags.clip_id, tags.* FROM clip_to_tags
+    JOIN tags ON tags.id = clip_to_tags.tag_id
+    JOIN clip_folder_to_clips ON clip_folder_to_clips.clip_id = clip_to_tags.clip_id
+    WHERE clip_folder_to_clips.clip_folder_id IN ({placeholders})
+    """, folder_ids).fetchall()
+
+    cursor.close()
+
+    clips = _build_clips_with_tags([row[1:] for row in data], tag_data)
+
+    # sort clips into their folders
+    for row in data:
+        folders[row[0]].append(clips[row[1]])
+
+    return folders
 
 
 def update_clip(clip: models.Clip) -> None:
@@ -258,23 +1204,79 @@ def update_clip(clip: models.Clip) -> None:
     :param clip: Clip object to save
     :return:
     """
+    # a full save covers any queued edits
+    PENDING_CLIP_EDITS.pop(clip.db_id, None)
+
+    # take the values now, the clip object may keep changing before the write runs
+    values = (clip.path, clip.custom_name,
+              int(clip.is_favorite), int(clip.is_hidden),
+              clip.trimmed_start, clip.trimmed_end,
+              clip.db_id)
+
+    def write(db: sqlite3.Connection) -> None:
+        cursor = db.cursor()
+        cursor.execute("""
+        UPDATE clips SET
+        path = ?,
+        custom_name = ?,
+        is_favorite = ?,
+        is_hidden = ?,
+        trimmed_start = ?,
+        trimmed_end = ?
+        WHERE id = ?
+        """, values)
+        cursor.close()
+
+    _write(write)
+
+
+def queue_clip_edit(clip: models.Clip, *fields: str) -> None:
+    """
+    Marks fields of a clip as changed without writing them yet. Repeated edits to the same clip are merged,
+    and only the changed columns are written when flush_clip_edits is called.
+    :param clip: Clip object that was edited
+    :param fields: Names of the edited fields, from CLIP_EDIT_FIELDS
+    :return:
+    """
+    for field in fields:
+        if field not in CLIP_EDIT_FIELDS:
+            raise ValueError(f"{field} is not an editable clip field")
 
-    cursor = DB_OBJ.cursor()
-    cursor.execute("""
-    UPDATE clips SET
-    path = ?,
-    custom_name = ?,
-    is_favorite = ?,
-    is_hidden = ?,
-    trimmed_start = ?,
-    trimmed_end = ?
-    WHERE id = ?
-    """,
-                   (clip.path, clip.custom_name,
-                    int(clip.is_favorite), int(clip.is_hidden),
-                    clip.trimmed_start, clip.trimmed_end,
-                    clip.db_id))
-    cursor.close()
+    _clip, dirty_fields = PENDING_CLIP_EDITS.setdefault(clip.db_id, (clip, set()))
+    dirty_fields.update(fields)
+
+
+def flush_clip_edits() -> None:
+    """
+    Queues one UPDATE per edited clip, setting only the changed columns
+    :return:
+    """
+    if len(PENDING_CLIP_EDITS) == 0:
+        return
+
+    updates = []
+    for clip, fields in PENDING_CLIP_EDITS.values():
+        # keep column order stable so identical updates share a statement
+        fields = [field for field in CLIP_EDIT_FIELDS if field in fields]
+
+        # take the values now, the clip object may keep changing before the write runs
+        values = []
+        for field in fields:
+            value = getattr(clip, field)
+            values.append(int(value) if isinstance(value, bool) else value)
+
+        updates.append((f"UPDATE clips SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?",
+                        (*values, clip.db_id)))
+
+    PENDING_CLIP_EDITS.clear()
+
+    def write(db: sqlite3.Connection) -> None:
+        cursor = db.cursor()
+        for sql, parameters in updates:
+            cursor.execute(sql, parameters)
+        cursor.close()
+
+    _write(write)
 
 
 def create_tag_section(section_name: str) -> models.TagSection:
@@ -283,28 +1285,55 @@ def create_tag_section(section_name: str) -> models.TagSection:
     :param section_name: Name of the new tag section
     :return:
     """
-    cursor = DB_OBJ.cursor()
-    cursor.execute("INSERT INTO tag_sections (section_name) VALUES (?);", (section_name,))
+    def write(db: sqlite3.Connection) -> int:
+        cursor = db.cursor()
+        cursor.execute("INSERT INTO tag_sections (section_name) VALUES (?);", (section_name,))
 
-    # grab database ID
-    db_id = cursor.execute("SELECT last_insert_rowid();").fetchone()[0]
-    cursor.close()
+        # grab database ID
+        db_id = cursor.execute("SELECT last_insert_rowid();").fetchone()[0]
+        cursor.close()
+
+        return db_id
+
+    # wait for the new ID
+    db_id = _write(write).result()
 
-    return models.TagSection(db_id, section_name)
+    SECTION_TAG_IDS[db_id] = []
+
+    return TAG_SECTION_CACHE.put(db_id, models.TagSection(db_id, section_name))
 
 
 def delete_tag_section(db_id: int) -> None:
-    cursor = DB_OBJ.cursor()
-    # get all tags associated to this section
-    tags = cursor.execute("SELECT tag_id FROM tag_section_to_tags WHERE section_id = ?;", (db_id,)).fetchall()
+    """
+    Deletes a tag section & all of its tags from the database
+    :param db_id: The ID of the tag section to delete
+    :return:
+    """
+    # get all tags associated to this section. Tags are created before they're returned, so the read connection
+    # already has every one
+    tag_ids = [tag.db_id for tag in get_tags_in_section(db_id)]
 
-    for tag in tags:
-        # delete tag
-        delete_tag(tag[0])
+    def write(db: sqlite3.Connection) -> None:
+        cursor = db.cursor()
+        section_tags = "SELECT tag_id FROM tag_section_to_tags WHERE section_id = ?"
 
-    # delete this tag section
-    cursor.execute("DELETE FROM tag_sections WHERE id = ?;", (db_id,))
-    cursor.close()
+        # delete tags & their relationships, the section links go last since the others select from them
+        cursor.execute(f"DELETE FROM clip_to_tags WHERE tag_id IN ({section_tags});", (db_id,))
+        cursor.execute(f"DELETE FROM tags WHERE id IN ({section_tags});", (db_id,))
+        cursor.execute("DELETE FROM tag_section_to_tags WHERE section_id = ?;", (db_id,))
+
+        # delete this tag section
+        cursor.execute("DELETE FROM tag_sections WHERE id = ?;", (db_id,))
+        cursor.close()
+
+    _write(write)
+
+    # menus are built from loaded objects, so forgetting the tags here keeps them from showing before the write
+    for tag_id in tag_ids:
+        _forget_tag(tag_id)
+
+    TAG_SECTION_CACHE.evict(db_id)
+    SECTION_TAG_IDS.pop(db_id, None)
 
 
 def get_tags_in_section(section_id: int) -> list[models.Tag]:
@@ -313,17 +1342,25 @@ def get_tags_in_section(section_id: int) -> list[models.Tag]:
     :param section_id: Section to get tags from
     :return:
     """
-    cursor = DB_OBJ.cursor()
-    data = cursor.execute("SELECT tag_id FROM tag_section_to_tags WHERE section_id = ?;", (section_id,)).fetchall()
+    # use loaded tags if every tag in the section is still live
+    if section_id in SECTION_TAG_IDS:
+        tags = [TAG_CACHE.get(tag_id) for tag_id in SECTION_TAG_IDS[section_id]]
+        if None not in tags:
+            return tags
 
-    tags = []
+    cursor = DB_OBJ.cursor()
+    data = cursor.execute("""
+    SELECT tags.* FROM tag_section_to_tags
+    JOIN tags ON tags.id = tag_section_to_tags.tag_id
+    WHERE tag_section_to_tags.section_id = ?
+    ORDER BY tag_section_to_tags.rowid
+    """, (section_id,)).fetchall()
+    cursor.close()
 
     # build tags and append to list
-    for tag in data:
-        tag_data = cursor.execute("SELECT * FROM tags WHERE id = ?;", (tag[0],)).fetchone()
-        tags.append(build_tag_obj(tag_data))
+    tags = [build_tag_obj(tag_data) for tag_data in data]
 
-    cursor.close()
+    SECTION_TAG_IDS[section_id] = [tag.db_id for tag in tags]
 
     return tags
 
@@ -335,18 +1372,34 @@ def create_tag(tag_section: int, tag_name: str) -> models.Tag:
     :param tag_name: Name of the new tag
     :return:
     """
-    cursor = DB_OBJ.cursor()
-    cursor.execute("INSERT INTO tags (tag_name) VALUES (?);", (tag_name,))
+    def write(db: sqlite3.Connection) -> int:
+        cursor = db.cursor()
+        cursor.execute("INSERT INTO tags (tag_name) VALUES (?);", (tag_name,))
 
-    # grab database ID
-    db_id = cursor.execute("SELECT last_insert_rowid();").fetchone()[0]
+        # grab database ID
+        db_id = cursor.execute("SELECT last_insert_rowid();").fetchone()[0]
 
-    # add to relationship table
-    cursor.execute("INSERT INTO tag_section_to_tags (section_id, tag_id) VALUES (?, ?)", (tag_section, db_id))
+        # add to relationship table
+        cursor.execute("INSERT INTO tag_section_to_tags (section_id, tag_id) VALUES (?, ?)", (tag_section, db_id))
 
-    cursor.close()
+        cursor.close()
+
+        return db_id
+
+    # wait for the new ID
+    db_id = _write(write).result()
+
+    tag = TAG_CACHE.put(db_id, models.Tag(db_id, tag_name))
 
-    return models.Tag(db_id, tag_name)
+    # add tag to any loaded copy of its section
+    if tag_section in SECTION_TAG_IDS:
+        SECTION_TAG_IDS[tag_section].append(db_id)
+
+    section = TAG_SECTION_CACHE.get(tag_section)
+    if section is not None and tag not in section.tags:
+        section.tags.append(tag)
+
+    return tag
 
 
 def delete_tag(db_id: int) -> None:
@@ -355,7 +1408,39 @@ def delete_tag(db_id: int) -> None:
     :param db_id:  The ID of the tag to delete
     :return:
     """
-    cursor = DB_OBJ.cursor()
+    _write(_delete_tag, db_id)
+
+    # menus are built from loaded objects, so forgetting the tag here keeps it from showing before the write
+    _forget_tag(db_id)
+
+
+def _forget_tag(db_id: int) -> None:
+    """
+    Removes a deleted tag from the tag index, the cache & any loaded clips or sections
+    :param db_id: The ID of the deleted tag
+    :return:
+    """
+    if TAG_INDEX is not None:
+        TAG_INDEX.remove_tag(db_id)
+
+    TAG_CACHE.evict(db_id)
+
+    for tag_ids in SECTION_TAG_IDS.values():
+        if db_id in tag_ids:
+            tag_ids.remove(db_id)
+
+    for obj in CLIP_CACHE.values() + TAG_SECTION_CACHE.values():
+        obj.tags[:] = [tag for tag in obj.tags if tag.db_id != db_id]
+
+
+def _delete_tag(db: sqlite3.Connection, db_id: int) -> None:
+    """
+    Write job that deletes a tag & its relationships
+    :param db: Write connection
+    :param db_id: The ID of the tag to delete
+    :return:
+    """
+    cursor = db.cursor()
     # delete tag data
     cursor.execute("DELETE FROM tags WHERE id = ?;", (db_id,))
     # delete relationship to clips
@@ -372,9 +1457,17 @@ def add_tag(clip_id: int, tag_id: int) -> None:
     :param tag_id: ID of tag
     :return:
     """
-    cursor = DB_OBJ.cursor()
-    cursor.execute("INSERT INTO clip_to_tags (clip_id, tag_id) VALUES (?, ?)", (clip_id, tag_id))
-    cursor.close()
+    _write(_execute, "INSERT OR IGNORE INTO clip_to_tags (clip_id, tag_id) VALUES (?, ?)", (clip_id, tag_id))
+
+    if TAG_INDEX is not None:
+        TAG_INDEX.add(clip_id, tag_id)
+
+    # update loaded clip
+    clip = CLIP_CACHE.get(clip_id)
+    if clip is not None and tag_id not in [tag.db_id for tag in clip.tags]:
+        tag = get_tag(tag_id)
+        if tag is not None:
+            clip.tags.append(tag)
 
 
 def remove_tag(clip_id: int, tag_id: int) -> None:
@@ -384,9 +1477,37 @@ def remove_tag(clip_id: int, tag_id: int) -> None:
     :param tag_id: ID of tag
     :return:
     """
-    cursor = DB_OBJ.cursor()
-    cursor.execute("DELETE FROM clip_to_tags WHERE clip_id = ? AND tag_id = ?;", (clip_id, tag_id))
-    cursor.close()
+    _write(_execute, "DELETE FROM clip_to_tags WHERE clip_id = ? AND tag_id = ?;", (clip_id, tag_id))
+
+    if TAG_INDEX is not None:
+        TAG_INDEX.remove(clip_id, tag_id)
+
+    # update loaded clip
+    clip = CLIP_CACHE.get(clip_id)
+    if clip is not None:
+        clip.tags[:] = [tag for tag in clip.tags if tag.db_id != tag_id]
+
+
+def _execute(db: sqlite3.Connection, sql: str, parameters: tuple) -> None:
+    """
+    Write job that runs a single statement
+    :param db: Write connection
+    :param sql: Statement to run
+    :param parameters: Statement parameters
+    :return:
+    """
+    db.execute(sql, parameters)
+
+
+def _executemany(db: sqlite3.Connection, sql: str, parameters: list[tuple]) -> None:
+    """
+    Write job that runs a statement once for each set of parameters
+    :param db: Write connection
+    :param sql: Statement to run
+    :param parameters: List of statement parameters
+    :return:
+    """
+    db.executemany(sql, parameters)
 
 
 def get_tag(db_id: int) -> models.Tag | None:
@@ -395,6 +1516,10 @@ def get_tag(db_id: int) -> models.Tag | None:
     :param db_id: ID of the tag
     :return: Tag object, or None if the tag does not exist
     """
+    tag = TAG_CACHE.get(db_id)
+    if tag is not None:
+        return tag
+
     cursor = DB_OBJ.cursor()
     data = cursor.execute("SELECT * FROM tags WHERE id = ?", (db_id,)).fetchone()
     cursor.close()
@@ -435,8 +1560,8 @@ def get_all_tags() -> list[models.TagSection]:
         # build tag sections
         tag_section = build_tag_section_obj(tag_section)
 
-        # get tags in tag section
-        tag_section.tags.extend(get_tags_in_section(tag_section.db_id))
+        # get tags in tag section, replacing any tags a loaded section already had
+        tag_section.tags[:] = get_tags_in_section(tag_section.db_id)
 
         # add tag section to list
         tag_sections.append(tag_section)
@@ -482,26 +1607,141 @@ def has_tag(clip_id: int, tag_id: int) -> bool:
         return False
 
 
-def build_clip_obj(data: list) -> models.Clip:
+def get_filtered_clip_ids(tag_filter: list) -> set[int] | tag_index.ClipBitset | None:
+    """
+    Finds every clip that matches a tag filter, using the tag index if it's loaded or a single query otherwise
+    :param tag_filter: List of [section ID, [tag IDs]] pairs. A clip must have every listed tag to match
+    :return: Collection of matching clip IDs, or None if the filter has no tags and every clip matches
+    """
+    # collect every tag in the filter, regardless of section
+    tag_ids = list({tag_id for _section, tags in tag_filter for tag_id in tags})
+
+    if len(tag_ids) == 0:
+        return None
+
+    # evaluate the filter as bitwise ANDs
+    if TAG_INDEX is not None:
+        return TAG_INDEX.match_ids(tag_ids)
+
+    cursor = DB_OBJ.cursor()
+
+    # a clip matches when it is linked to all the filter tags
+    data = cursor.execute("""
+    SELECT clip_id FROM clip_to_tags
+    WHERE tag_id IN (SELECT value FROM json_each(?))
+    GROUP BY clip_id
+    HAVING COUNT(DISTINCT tag_id) = ?
+    """, (json.dumps(tag_ids), len(tag_ids))).fetchall()
+
+    cursor.close()
+
+    return {row[0] for row in data}
+
+
+def search_clips(query: str, limit: int | None = None) -> list[int]:
+    """
+    Full text search over clip names, file names & tag names. Every word in the query is matched as a prefix, apart
+    from words shorter than SEARCH_PREFIX_MIN_LENGTH which are matched whole.
+    :param query: Text to search for
+    :param limit: Max number of results, or None for all of them
+    :return: Matching clip IDs, best match first
+    """
+    # quote each word so user input can't be read as FTS syntax, and match it as a prefix
+    words = query.replace('"', " ").split()
+
+    if len(words) == 0:
+        return []
+
+    match = " ".join(f'"{word}"*' if len(word) >= SEARCH_PREFIX_MIN_LENGTH else f'"{word}"' for word in words)
+
+    cursor = DB_OBJ.cursor()
+
+    # custom names count the most, then file names, then tags
+    data = cursor.execute("""
+    SELECT rowid FROM clip_search
+    WHERE clip_search MATCH ?
+    ORDER BY bm25(clip_search, 10.0, 5.0, 1.0)
+    LIMIT ?
+    """, (match, -1 if limit is None else limit)).fetchall()
+
+    cursor.close()
+
+    return [row[0] for row in data]
+
+
+def build_clip_obj(data: list, tags: list[models.Tag] | None = None) -> models.Clip:
     """
     Utility function that creates a clip object from a data array
-    :param data: Data to build clip from
+    :param data: Data to build clip from, with the columns in CLIP_COLUMNS
+    :param tags: Tags already loaded for this clip. If None, the tags are queried from the database
     :return: Built clip object
     """
+    # a loaded clip may have edits that aren't written yet, so keep it over the row data
+    cached = CLIP_CACHE.get(data[0])
+    if cached is not None:
+        return cached
+
+    row = dict(zip(CLIP_COLUMNS, data))
+
     clip = models.Clip(
-        db_id=data[0],
-        path=data[1],
-        custom_name=data[2],
-        is_favorite=bool(data[3]),
-        is_hidden=bool(data[4]),
-        trimmed_start=data[5],
-        trimmed_end=data[6]
+        db_id=row["id"],
+        path=row["path"],
+        custom_name=row["custom_name"],
+        is_favorite=bool(row["is_favorite"]),
+        is_hidden=bool(row["is_hidden"]),
+        trimmed_start=row["trimmed_start"],
+        trimmed_end=row["trimmed_end"]
     )
 
+    # probed clips have their file details stored
+    if row["probed_size"] is not None:
+        clip.media_info = models.MediaInfo(duration_ms=row["duration_ms"], width=row["width"], height=row["height"],
+                                           fps=row["fps"], video_codec=row["video_codec"],
+                                           audio_codec=row["audio_codec"], bit_rate=row["bit_rate"],
+                                           file_size=row["probed_size"])
+
     # get all the tag objects on this clip
-    clip.tags.extend(get_tags_on_clip(clip.db_id))
+    if tags is None:
+        tags = get_tags_on_clip(clip.db_id)
+
+    clip.tags.extend(tags)
 
-    return clip
+    return CLIP_CACHE.put(clip.db_id, clip)
+
+
+def _build_clips_with_tags(data: list, tag_data: list) -> dict[int, models.Clip]:
+    """
+    Utility function that builds clip objects from clip rows and (clip_id, tag row) pairs
+    :param data: Clip rows to build clips from
+    :param tag_data: Rows of clip ID followed by the tag's data
+    :return: A dict of clip ID to built clip object
+    """
+    # group tags by clip, sharing one Tag object per tag ID
+    tag_objs: dict[int, models.Tag] = {}
+    clip_tags: dict[int, list[models.Tag]] = {}
+
+    for row in tag_data:
+        tag_id = row[1]
+        if tag_id not in tag_objs:
+            tag_objs[tag_id] = build_tag_obj(row[1:])
+
+        clip_tags.setdefault(row[0], []).append(tag_objs[tag_id])
+
+    clips = {}
+    for row in data:
+        clips[row[0]] = build_clip_obj(row, clip_tags.get(row[0], []))
+
+    return clips
+
+
+def _chunk_list(values: list, size: int = 500) -> list[list]:
+    """
+    Utility function that splits a list into chunks small enough to bind as query parameters
+    :param values: List to split
+    :param size: Max size of each chunk
+    :return: List of chunks
+    """
+    return [values[i:i + size] for i in range(0, len(values), size)]
 
 
 def build_clip_folder_obj(data: list) -> models.ClipFolder:
@@ -523,11 +1763,14 @@ def build_tag_obj(data: list) -> models.Tag:
     :param data: Data to build tag from
     :return: Built tag object
     """
+    cached = TAG_CACHE.get(data[0])
+    if cached is not None:
+        return cached
 
-    return models.Tag(
+    return TAG_CACHE.put(data[0], models.Tag(
         db_id=data[0],
         name=data[1]
-    )
+    ))
 
 
 def build_tag_section_obj(data: list) -> models.TagSection:
@@ -536,8 +1779,11 @@ def build_tag_section_obj(data: list) -> models.TagSection:
     :param data: Data to build tag section from
     :return: Built tag section object
     """
+    cached = TAG_SECTION_CACHE.get(data[0])
+    if cached is not None:
+        return cached
 
-    return models.TagSection(
+    return TAG_SECTION_CACHE.put(data[0], models.TagSection(
         db_id=data[0],
         section_name=data[1]
-    )
+    ))
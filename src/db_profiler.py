@@ -0,0 +1,256 @@
+"""
+Developed by Keagan B
+ClipMaker -- db_profiler.py
+
+Opt-in query instrumentation. When enabled, database connections are created with a wrapped connection & cursor
+that time every statement, count queries per calling db_handler function, and log slow statements along with
+their query plan. UI handlers wrapped with track_action log how many queries they issued.
+"""
+from __future__ import annotations
+
+from functools import wraps
+import threading
+import logging
+import sqlite3
+import time
+import sys
+
+logger = logging.getLogger(__name__)
+
+ENABLED = False
+
+# statements slower than this are logged with their parameters & query plan
+SLOW_QUERY_MS = 50.0
+
+# upper bounds of the latency histogram buckets, in milliseconds
+HISTOGRAM_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, float("inf"))
+
+# names of the modules whose functions queries are attributed to
+TRACKED_MODULES = ("db_handler", "db_writer")
+
+# longest parameter repr written to the slow query log
+MAX_LOGGED_PARAMETERS = 500
+
+_lock = threading.Lock()
+_function_stats: dict[str, dict] = {}
+_action_stats: dict[str, dict] = {}
+
+# the UI action currently running on each thread
+_local = threading.local()
+
+
+def enable(slow_query_ms: float = SLOW_QUERY_MS) -> None:
+    """
+    Turns on instrumentation for connections created from now on
+    :param slow_query_ms: Statements slower than this many milliseconds are logged
+    :return:
+    """
+    global ENABLED, SLOW_QUERY_MS
+
+    ENABLED = True
+    SLOW_QUERY_MS = slow_query_ms
+
+
+def connection_factory() -> type[sqlite3.Connection]:
+    """
+    :return: Connection class to pass to sqlite3.connect
+    """
+    return ProfiledConnection if ENABLED else sqlite3.Connection
+
+
+def reset() -> None:
+    """
+    Clears all collected stats
+    :return:
+    """
+    with _lock:
+        _function_stats.clear()
+        _action_stats.clear()
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """
+    Cursor that times every statement it runs
+    """
+
+    def execute(self, sql, parameters=(), /):
+        start = time.perf_counter()
+        try:
+            return sqlite3.Cursor.execute(self, sql, parameters)
+        finally:
+            _record(self.connection, sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters, /):
+        start = time.perf_counter()
+        try:
+            return sqlite3.Cursor.executemany(self, sql, seq_of_parameters)
+        finally:
+            _record(self.connection, sql, "<many>", time.perf_counter() - start)
+
+    def executescript(self, sql_script, /):
+        start = time.perf_counter()
+        try:
+            return sqlite3.Cursor.executescript(self, sql_script)
+        finally:
+            _record(self.connection, sql_script, "<script>", time.perf_counter() - start)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """
+    Connection whose cursors, including the ones made by its execute shortcuts, are ProfiledCursors
+    """
+
+    def cursor(self, factory=ProfiledCursor):
+        return sqlite3.Connection.cursor(self, factory)
+
+    def execute(self, sql, parameters=(), /):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters, /):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script, /):
+        return self.cursor().executescript(sql_script)
+
+
+def track_action(func):
+    """
+    Decorator for UI handlers. While the handler runs, queries on its thread are counted towards it, and a
+    summary is logged once it returns.
+    :param func: Handler to wrap
+    :return: Wrapped handler
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # skip all tracking when disabled, or when nested in another action
+        if not ENABLED or getattr(_local, "action", None) is not None:
+            return func(*args, **kwargs)
+
+        _local.action = {"name": func.__name__, "queries": 0, "query_time": 0.0}
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            action = _local.action
+            _local.action = None
+
+            elapsed = time.perf_counter() - start
+            logger.info("%s issued %d queries, %.1f ms in queries, %.1f ms total", action["name"],
+                        action["queries"], action["query_time"] * 1000, elapsed * 1000)
+
+            with _lock:
+                stats = _action_stats.setdefault(action["name"], {"calls": 0, "queries": 0, "time": 0.0})
+                stats["calls"] += 1
+                stats["queries"] += action["queries"]
+                stats["time"] += elapsed
+
+    return wrapper
+
+
+def summary() -> str:
+    """
+    :return: Readable table of query counts & latency histograms per function, followed by UI action totals
+    """
+    with _lock:
+        lines = ["queries by function:"]
+
+        bucket_names = " ".join(f"<{bound:g}" for bound in HISTOGRAM_BUCKETS_MS[:-1]) + " more"
+        lines.append(f"  {'function':40} {'count':>7} {'total ms':>10} {'avg ms':>8}  histogram ({bucket_names})")
+
+        for name, stats in sorted(_function_stats.items(), key=lambda item: -item[1]["time"]):
+            lines.append(f"  {name:40} {stats['count']:>7} {stats['time'] * 1000:>10.1f} "
+                         f"{stats['time'] * 1000 / stats['count']:>8.2f}  {stats['histogram']}")
+
+        lines.append("UI actions:")
+        for name, stats in sorted(_action_stats.items(), key=lambda item: -item[1]["time"]):
+            lines.append(f"  {name} ran {stats['calls']} times, issued {stats['queries']} queries, "
+                         f"{stats['time'] * 1000:.1f} ms")
+
+    return "\n".join(lines)
+
+
+def dump_summary() -> None:
+    """
+    Logs the summary, if instrumentation is enabled
+    :return:
+    """
+    if ENABLED:
+        logger.info("database query summary\n%s", summary())
+
+
+def _calling_function() -> str:
+    """
+    Finds the db_handler or db_writer function that issued the current query
+    :return: Function name, or "<other>" if the query didn't come from a tracked module
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_globals.get("__name__") in TRACKED_MODULES:
+            code = frame.f_code
+            # report write jobs defined inside a function as that function
+            return getattr(code, "co_qualname", code.co_name).split(".<locals>")[0]
+
+        frame = frame.f_back
+
+    return "<other>"
+
+
+def _record(db: sqlite3.Connection, sql: str, parameters, elapsed: float) -> None:
+    """
+    Stores the timing of one statement, and logs it if it was slow
+    :param db: Connection that ran the statement
+    :param sql: The statement
+    :param parameters: Statement parameters
+    :param elapsed: Run time in seconds
+    :return:
+    """
+    name = _calling_function()
+
+    with _lock:
+        stats = _function_stats.setdefault(name, {"count": 0, "time": 0.0,
+                                                  "histogram": [0] * len(HISTOGRAM_BUCKETS_MS)})
+        stats["count"] += 1
+        stats["time"] += elapsed
+
+        elapsed_ms = elapsed * 1000
+        for index, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if elapsed_ms < bound:
+                stats["histogram"][index] += 1
+                break
+
+    action = getattr(_local, "action", None)
+    if action is not None:
+        action["queries"] += 1
+        action["query_time"] += elapsed
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        # keep huge parameters, like bulk path lists, from flooding the log
+        logged_parameters = repr(parameters)
+        if len(logged_parameters) > MAX_LOGGED_PARAMETERS:
+            logged_parameters = f"{logged_parameters[:MAX_LOGGED_PARAMETERS]}... ({len(logged_parameters)} chars)"
+
+        logger.warning("slow query in %s (%.1f ms): %s\nparameters: %s\nplan:\n%s", name, elapsed * 1000,
+                       " ".join(sql.split()), logged_parameters, _explain(db, sql, parameters))
+
+
+def _explain(db: sqlite3.Connection, sql: str, parameters) -> str:
+    """
+    Gets the query plan for a statement
+    :param db: Connection to explain on
+    :param sql: The statement
+    :param parameters: Statement parameters
+    :return: The plan, one step per line
+    """
+    # scripts & batches can't be explained as a whole
+    if not isinstance(parameters, (tuple, list, dict)):
+        return "  (not available)"
+
+    try:
+        # use a plain cursor, so explaining isn't recorded as a query
+        cursor = sqlite3.Connection.cursor(db)
+        plan = cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+        cursor.close()
+    except sqlite3.Error as e:
+        return f"  (not available: {e})"
+
+    return "\n".join(f"  {row[-1]}" for row in plan)
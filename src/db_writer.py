@@ -0,0 +1,155 @@
+"""
+Developed by Keagan B
+ClipMaker -- db_writer.py
+
+Background database writer. Owns the only write connection & applies queued jobs in batched transactions,
+so the UI thread never waits on a commit.
+"""
+from __future__ import annotations
+
+from concurrent.futures import Future
+import threading
+import logging
+import sqlite3
+import queue
+import db_profiler
+
+logger = logging.getLogger(__name__)
+
+# max number of queued jobs applied in one transaction
+MAX_BATCH_SIZE = 500
+
+# milliseconds a connection waits on a locked database before giving up
+BUSY_TIMEOUT_MS = 5000
+
+
+def configure_connection(db: sqlite3.Connection) -> None:
+    """
+    Applies the connection settings shared by the read & write connections
+    :param db: Connection to configure
+    :return:
+    """
+    db.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = NORMAL")
+
+
+class DatabaseWriter(threading.Thread):
+    """
+    Thread that drains a queue of write jobs. Each job is a function that takes the write connection as its first
+    argument. Jobs are applied in batches, one transaction per batch, with a savepoint per job so a failing job
+    doesn't undo the rest of its batch.
+    """
+
+    def __init__(self, path: str):
+        threading.Thread.__init__(self, name="ClipMaker DB writer", daemon=True)
+
+        self.path = path
+
+        self._jobs: queue.Queue[tuple | None] = queue.Queue()
+
+        # guards _stopped, so no job can be queued behind the stop signal where it would never run
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def submit(self, job, *args) -> Future:
+        """
+        Queues a write job
+        :param job: Function to run, called as job(connection, *args)
+        :param args: Extra arguments for the job
+        :return: Future that resolves to the job's return value once its batch is committed. Fails straight away if
+        the writer has been stopped
+        """
+        future = Future()
+
+        with self._lock:
+            if self._stopped:
+                future.set_exception(RuntimeError("The database writer has been stopped"))
+            else:
+                self._jobs.put((job, args, future))
+
+        return future
+
+    def flush(self) -> None:
+        """
+        Blocks until every job queued so far has been committed
+        :return:
+        """
+        self.submit(lambda _db: None).result()
+
+    def stop(self) -> None:
+        """
+        Commits any remaining jobs and stops the thread. Jobs submitted afterwards are refused
+        :return:
+        """
+        with self._lock:
+            self._stopped = True
+            self._jobs.put(None)
+
+        self.join()
+
+    def run(self) -> None:
+        # the write connection belongs to this thread only
+        db = sqlite3.connect(self.path, isolation_level=None, factory=db_profiler.connection_factory())
+        configure_connection(db)
+
+        running = True
+        while running:
+            # wait for work, then grab everything else already queued
+            batch = [self._jobs.get()]
+            while len(batch) < MAX_BATCH_SIZE:
+                try:
+                    batch.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+
+            # a None entry is the stop signal, finish the jobs queued before it
+            if None in batch:
+                batch = batch[:batch.index(None)]
+                running = False
+
+            self._apply_batch(db, batch)
+
+        db.close()
+
+    def _apply_batch(self, db: sqlite3.Connection, batch: list[tuple]) -> None:
+        """
+        Runs a batch of jobs in a single transaction
+        :param db: Write connection
+        :param batch: List of (job, args, future) tuples
+        :return:
+        """
+        if len(batch) == 0:
+            return
+
+        results = []
+
+        try:
+            db.execute("BEGIN")
+
+            for job, args, future in batch:
+                db.execute("SAVEPOINT job")
+                try:
+                    results.append((future, job(db, *args), None))
+                except Exception as e:
+                    # undo only this job
+                    db.execute("ROLLBACK TO job")
+                    logger.exception("Database write %s failed", getattr(job, "__qualname__", job))
+                    results.append((future, None, e))
+
+                db.execute("RELEASE job")
+
+            db.execute("COMMIT")
+        except sqlite3.Error as e:
+            # the transaction itself failed, nothing in this batch was saved
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            logger.exception("Database write batch failed")
+            results = [(future, None, e) for _job, _args, future in batch]
+
+        # only report results once they are committed
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
@@ -0,0 +1,116 @@
+"""
+Developed by Keagan B
+ClipMaker -- entity_cache.py
+
+Identity map for objects loaded from the database. Every database ID maps to a single live object for as long as
+anything references it, and the most recently used objects are kept alive even when nothing else does.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+import threading
+import weakref
+
+
+class EntityCache:
+    """
+    Identity map with an LRU of strong references & hit/miss counters
+    """
+
+    def __init__(self, name: str, capacity: int = 1024):
+        self.name = name
+        self.capacity = capacity
+
+        self.hits = 0
+        self.misses = 0
+
+        # every live object, dropped automatically once nothing references it
+        self._live: weakref.WeakValueDictionary[int, object] = weakref.WeakValueDictionary()
+        # recently used objects, kept alive by the cache itself
+        self._recent: OrderedDict[int, object] = OrderedDict()
+
+        self._lock = threading.RLock()
+
+    def get(self, db_id: int):
+        """
+        Finds a loaded object
+        :param db_id: Database ID of the object
+        :return: The live object, or None if it isn't loaded
+        """
+        with self._lock:
+            obj = self._live.get(db_id)
+
+            if obj is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._touch(db_id, obj)
+
+            return obj
+
+    def put(self, db_id: int, obj):
+        """
+        Adds an object to the cache. If an object with this ID is already loaded, that object is kept, since it
+        may hold edits that aren't written yet.
+        :param db_id: Database ID of the object
+        :param obj: Newly built object
+        :return: The live object for this ID
+        """
+        with self._lock:
+            existing = self._live.get(db_id)
+            if existing is not None:
+                obj = existing
+            else:
+                self._live[db_id] = obj
+
+            self._touch(db_id, obj)
+
+            return obj
+
+    def evict(self, db_id: int) -> None:
+        """
+        Drops an object from the cache
+        :param db_id: Database ID of the object
+        :return:
+        """
+        with self._lock:
+            self._live.pop(db_id, None)
+            self._recent.pop(db_id, None)
+
+    def values(self) -> list:
+        """
+        :return: Every live object in the cache
+        """
+        with self._lock:
+            return list(self._live.values())
+
+    def clear(self) -> None:
+        """
+        Drops every object & resets the counters
+        :return:
+        """
+        with self._lock:
+            self._live.clear()
+            self._recent.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        :return: Hit & miss counts, and the number of loaded objects
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "live": len(self._live), "recent": len(self._recent)}
+
+    def _touch(self, db_id: int, obj) -> None:
+        """
+        Marks an object as recently used, evicting the least recently used strong reference if over capacity
+        :param db_id: Database ID of the object
+        :param obj: The object
+        :return:
+        """
+        self._recent[db_id] = obj
+        self._recent.move_to_end(db_id)
+
+        if len(self._recent) > self.capacity:
+            self._recent.popitem(last=False)
@@ -0,0 +1,697 @@
+"""
+Developed by Keagan B
+ClipMaker -- export_queue.py
+
+Runs clip exports in the background. Jobs wait in a queue and are trimmed by a bounded pool of worker threads, each
+running one ffmpeg process at a time, so several exports run at once without blocking the UI. Jobs can be cancelled
+while they wait or run, and retried once they fail or are cancelled.
+
+Jobs are recorded in the database as they change, so jobs that were queued or running when the app closed are
+picked up again on the next start. Each job is fingerprinted from its source file, trim & precision, and jobs whose
+output was already written with the same fingerprint are skipped.
+
+ffmpeg reports its progress on stdout with -progress, which is read as it comes in to give each job a percent, speed
+& ETA. Reports are also written to PROGRESS_LOG as key=value lines, at most every PROGRESS_LOG_INTERVAL seconds per
+job, along with how every job ended, so encode speed can be compared across machines. The log is rotated once it
+reaches PROGRESS_LOG_MAX_BYTES.
+"""
+from __future__ import annotations
+
+from collections import deque
+from typing import Callable
+import logging.handlers
+import media_handler
+import db_handler
+import threading
+import logging
+import models
+import socket
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# progress reports go to their own file, not the console
+progress_logger = logging.getLogger(f"{__name__}.progress")
+progress_logger.propagate = False
+
+# where progress reports are logged
+PROGRESS_LOG = "./export_progress.log"
+
+# size the progress log is rotated at, & how many old logs are kept
+PROGRESS_LOG_MAX_BYTES = 5 * 1024 * 1024
+PROGRESS_LOG_BACKUPS = 3
+
+# min seconds between progress reports logged for a job. ffmpeg reports about twice a second
+PROGRESS_LOG_INTERVAL = 5.0
+
+# name of this machine, so logs from several can be told apart
+HOSTNAME = socket.gethostname()
+
+# threads given to each ffmpeg process. ffmpeg scales poorly past a few threads per encode,
+# so more processes with fewer threads each gets more out of the machine
+THREADS_PER_JOB = 4
+
+# max number of exports running at once
+MAX_WORKERS = max(1, (os.cpu_count() or 1) // THREADS_PER_JOB)
+
+# job states
+QUEUED = "Queued"
+RUNNING = "Exporting"
+DONE = "Done"
+SKIPPED = "Up to date"
+FAILED = "Failed"
+CANCELLED = "Cancelled"
+
+# error given to jobs whose output another job is writing
+BUSY_ERROR = "Another export is writing to this file"
+
+
+class ExportJob:
+    """
+    One clip being exported
+    """
+
+    def __init__(self, job_id: int, clip: models.Clip, output_path: str, start: int, end: int,
+                 precision: str = media_handler.FRAME_PRECISION):
+        self.job_id = job_id
+        self.clip_id = clip.db_id
+        self.name = clip.get_clip_name()
+
+        # ID of the job's export_jobs row
+        self.db_id: int | None = None
+
+        self.input_path = clip.path
+        self.output_path = output_path
+
+        # trim range, read when the job is queued so later edits don't change a running export
+        self.start = start
+        self.end = end
+
+        # how exact the cuts have to be, and the export mode picked to meet it once the job runs
+        self.precision = precision
+        self.mode = ""
+
+        # length of the trim, None if it runs to the end of a clip that hasn't been probed
+        trim_end = self.end if self.end > 0 else clip.media_info.duration_ms if clip.media_info is not None else None
+        self.duration_ms = trim_end - max(0, self.start) if trim_end is not None else None
+
+        # last progress reported by ffmpeg. progress is from 0 to 1, None if the trim length isn't known
+        self.progress: float | None = None
+        self.out_time_ms = 0
+        self.speed = 0.0
+        self.fps = 0.0
+        self.step = 0
+        self.step_count = 0
+
+        self.state = QUEUED
+        self.error = ""
+        self.attempts = 0
+
+        self.started_at = 0.0
+        self.finished_at = 0.0
+
+        # set once the job runs: the fingerprint of what it writes & the source's (mtime_ns, size)
+        self.fingerprint: str | None = None
+        self.source_state: tuple[int, int] | None = None
+
+        # (mtime_ns, size) of the output once written
+        self.output_state: tuple[int, int] | None = None
+
+        # (fingerprint, mtime_ns, size) of the last export written to output_path, if any
+        self.saved_output: tuple[str, int, int] | None = None
+
+        # ffmpeg process while running
+        self._process = None
+        self._cancelled = False
+
+        # when progress was last written to the progress log
+        self._logged_at = 0.0
+
+    def is_finished(self) -> bool:
+        """
+        :return: True if the job is done, skipped, failed or cancelled
+        """
+        return self.state in (DONE, SKIPPED, FAILED, CANCELLED)
+
+    def get_eta(self) -> float | None:
+        """
+        :return: Seconds until the job should be done, or None if it isn't running or its progress isn't known
+        """
+        if self.state != RUNNING or self.progress is None or self.progress <= 0:
+            return None
+
+        # assumes the rest of the job runs as fast as it has so far
+        elapsed = time.time() - self.started_at
+        return elapsed * (1 - self.progress) / self.progress
+
+
+class ExportQueue:
+    """
+    Queue of export jobs & the worker threads that run them
+    """
+
+    def __init__(self, on_update: Callable[[ExportJob], None], max_workers: int = MAX_WORKERS):
+        """
+        :param on_update: Called from a worker thread whenever a job changes state
+        :param max_workers: Max number of exports running at once
+        """
+        self.on_update = on_update
+
+        self.jobs: dict[int, ExportJob] = {}
+        self._queue: deque[ExportJob] = deque()
+        self._next_id = 1
+
+        self._condition = threading.Condition()
+        self._stopped = False
+
+        # set while the app closes, so jobs stopped by it are left to resume on the next start
+        self._closing = False
+
+        self._workers = [threading.Thread(target=self._run, name=f"ClipMaker export {index}", daemon=True)
+                         for index in range(max_workers)]
+
+        if not progress_logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(PROGRESS_LOG, maxBytes=PROGRESS_LOG_MAX_BYTES,
+                                                           backupCount=PROGRESS_LOG_BACKUPS)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+
+            progress_logger.addHandler(handler)
+            progress_logger.setLevel(logging.INFO)
+
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, clip: models.Clip, output_dir: str, precision: str = media_handler.FRAME_PRECISION) -> ExportJob:
+        """
+        Queues a clip to be exported
+        :param clip: Clip to export, with its trim points
+        :param output_dir: Directory to write the clip to
+        :param precision: How exact the cuts have to be
+        :return: The new job
+        """
+        return self.submit_all([clip], output_dir, precision)[0]
+
+    def submit_all(self, clips: list[models.Clip], output_dir: str,
+                   precision: str = media_handler.FRAME_PRECISION) -> list[ExportJob]:
+        """
+        Queues several clips to be exported, recording them all in one write
+        :param clips: Clips to export, with their trim points
+        :param output_dir: Directory to write the clips to
+        :param precision: How exact the cuts have to be
+        :return: The new jobs, in the same order
+        """
+        jobs = [self._make_job(clip, media_handler.get_output_path(clip.path, output_dir), clip.trimmed_start,
+                               clip.trimmed_end, precision) for clip in clips]
+
+        # record the jobs, so they can be resumed if the app closes before they're done
+        for job, db_id in zip(jobs, db_handler.add_export_jobs(jobs)):
+            job.db_id = db_id
+
+        self._enqueue(jobs)
+
+        return jobs
+
+    def resume(self) -> list[ExportJob]:
+        """
+        Queues the jobs that were queued or running when the app last closed
+        :return: The resumed jobs
+        """
+        saved = db_handler.get_unfinished_export_jobs()
+        clips = db_handler.get_clips_from_ids([clip_id for _db_id, clip_id, *_rest in saved])
+
+        jobs = []
+        for db_id, clip_id, start, end, precision, output_path in saved:
+            # the trim & output are kept as they were queued, the clip only gives its current path & name
+            job = self._make_job(clips[clip_id], output_path, start, end, precision)
+            job.db_id = db_id
+
+            jobs.append(job)
+
+        self._enqueue(jobs)
+
+        return jobs
+
+    def cancel(self, job_id: int) -> None:
+        """
+        Cancels a job. Waiting jobs are dropped, running jobs have their ffmpeg process stopped.
+        :param job_id: ID of the job
+        :return:
+        """
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None or job.is_finished():
+                return
+
+            job._cancelled = True
+
+            if job.state == QUEUED:
+                self._queue.remove(job)
+                job.state = CANCELLED
+                job.finished_at = time.time()
+            elif job._process is not None:
+                # the worker marks the job cancelled once the process exits
+                job._process.terminate()
+                return
+
+        if job.state == CANCELLED:
+            _log_finished(job)
+
+        self._save(job)
+        self.on_update(job)
+
+    def cancel_all(self) -> None:
+        """
+        Cancels every job that isn't finished
+        :return:
+        """
+        with self._condition:
+            job_ids = [job.job_id for job in self.jobs.values() if not job.is_finished()]
+
+        for job_id in job_ids:
+            self.cancel(job_id)
+
+    def retry(self, job_id: int) -> None:
+        """
+        Queues a failed or cancelled job again
+        :param job_id: ID of the job
+        :return:
+        """
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None or job.state not in (FAILED, CANCELLED):
+                return
+
+            error = self._get_refusal(job)
+            if error is not None:
+                job.error = error
+            else:
+                job.state = QUEUED
+                job.error = ""
+                job.finished_at = 0.0
+                job._cancelled = False
+
+                self._queue.append(job)
+                self._condition.notify()
+
+        if error is not None:
+            self.on_update(job)
+            return
+
+        self._save(job)
+        self.on_update(job)
+
+    def stop(self) -> None:
+        """
+        Stops every job & the workers. Stopped jobs are left unfinished in the database, to resume on the next start
+        :return:
+        """
+        with self._condition:
+            self._closing = True
+
+        self.cancel_all()
+
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+        for worker in self._workers:
+            worker.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while len(self._queue) == 0 and not self._stopped:
+                    self._condition.wait()
+
+                if self._stopped:
+                    return
+
+                job = self._queue.popleft()
+                job.state = RUNNING
+                job.attempts += 1
+                job.started_at = time.time()
+
+                # clear progress from earlier attempts
+                job.progress = 0.0 if job.duration_ms is not None else None
+                job.out_time_ms = 0
+                job.speed = 0.0
+                job.fps = 0.0
+
+            self._save(job)
+            self.on_update(job)
+
+            self._run_job(job)
+
+            job.finished_at = time.time()
+            if job.state in (DONE, SKIPPED):
+                job.progress = 1.0
+
+            _log_finished(job)
+
+            self._save(job)
+            self.on_update(job)
+
+    def _make_job(self, clip: models.Clip, output_path: str, start: int, end: int, precision: str) -> ExportJob:
+        """
+        :param clip: Clip to export
+        :param output_path: Path to write the clip to
+        :param start: Starting millisecond to trim from
+        :param end: Ending millisecond to trim to
+        :param precision: How exact the cuts have to be
+        :return: A new job with the next job ID
+        """
+        with self._condition:
+            job = ExportJob(self._next_id, clip, output_path, start, end, precision)
+            self._next_id += 1
+
+        return job
+
+    def _enqueue(self, jobs: list[ExportJob]) -> None:
+        """
+        Adds recorded jobs to the queue
+        :param jobs: Jobs to add
+        :return:
+        """
+        # what was last written to each output, to skip ones that are up to date
+        saved_outputs = db_handler.get_export_outputs([job.output_path for job in jobs])
+
+        refused = []
+        with self._condition:
+            for job in jobs:
+                job.saved_output = saved_outputs.get(job.output_path)
+
+                error = self._get_refusal(job)
+                if error is not None:
+                    job.state = FAILED
+                    job.error = error
+                    job.finished_at = time.time()
+
+                    refused.append(job)
+                else:
+                    self._queue.append(job)
+
+                self.jobs[job.job_id] = job
+
+            self._condition.notify_all()
+
+        for job in refused:
+            logger.warning("Not exporting %s to %s: %s", job.input_path, job.output_path, job.error)
+            _log_finished(job)
+
+            self._save(job)
+            self.on_update(job)
+
+    def _get_refusal(self, job: ExportJob) -> str | None:
+        """
+        Call with the lock held.
+        :param job: Job about to be queued
+        :return: Why the job can't be run, or None if it can
+        """
+        # an empty trim would be exported to the end of the clip
+        if not media_handler.is_trim_valid(job.start, job.end):
+            return media_handler.TRIM_ERROR
+
+        # two jobs writing one file would race, so only the first is run
+        if self._is_output_busy(job.output_path):
+            return BUSY_ERROR
+
+        return None
+
+    def _is_output_busy(self, output_path: str) -> bool:
+        """
+        Call with the lock held.
+        :param output_path: Path a job writes to
+        :return: True if a queued or running job writes to the path
+        """
+        return any(job.output_path == output_path and job.state in (QUEUED, RUNNING) for job in self.jobs.values())
+
+    def _save(self, job: ExportJob) -> None:
+        """
+        Records a job's state in the database, unless the app is closing
+        :param job: Job to save
+        :return:
+        """
+        if job.db_id is not None and not self._closing:
+            db_handler.update_export_job(job)
+
+    def _run_job(self, job: ExportJob) -> None:
+        """
+        Plans a job's export, runs its ffmpeg processes & records how it ended. The export is written to a temporary
+        file & renamed over the output once done.
+        :param job: Job to run
+        :return:
+        """
+        plan = None
+
+        # named after the job's row, so a resumed job replaces what it left behind before the app closed
+        temp_path = media_handler.get_temp_path(job.output_path, str(job.db_id) if job.db_id is not None
+                                                else f"-{job.job_id}")
+
+        try:
+            output_dir = os.path.dirname(job.output_path)
+            os.makedirs(output_dir, exist_ok=True)
+
+            stat = os.stat(job.input_path)
+            job.source_state = (stat.st_mtime_ns, stat.st_size)
+            job.fingerprint = media_handler.get_fingerprint(job.input_path, stat.st_mtime_ns, stat.st_size, job.start,
+                                                            job.end, job.precision)
+
+            if _is_up_to_date(job):
+                job.state = SKIPPED
+                return
+
+            plan = media_handler.plan_export(job.input_path, temp_path, job.start, job.end, job.precision,
+                                             THREADS_PER_JOB)
+            job.mode = plan.mode
+            self.on_update(job)
+
+            error = self._run_plan(job, plan)
+
+            if error is not None and plan.mode == media_handler.SMART_CUT and not job._cancelled:
+                # some streams can't be joined after a partial re-encode, so fall back to re-encoding it all
+                logger.info("Smart cut of %s failed, re-encoding instead: %s", job.input_path, error)
+                plan.cleanup()
+
+                plan = media_handler.ExportPlan(media_handler.REENCODE, [
+                    media_handler.build_trim(job.input_path, temp_path, job.start, job.end, THREADS_PER_JOB)
+                ])
+                job.mode = plan.mode
+                self.on_update(job)
+
+                error = self._run_plan(job, plan)
+
+            if error is None and not job._cancelled:
+                # swap the finished clip in, readers see the old output or the new one, never half of one
+                os.replace(temp_path, job.output_path)
+
+                stat = os.stat(job.output_path)
+                job.output_state = (stat.st_mtime_ns, stat.st_size)
+        except Exception as e:
+            logger.exception("Could not export %s", job.input_path)
+
+            job.state = FAILED
+            job.error = str(e)
+            return
+        finally:
+            if plan is not None:
+                plan.cleanup()
+
+            # don't leave half written clips behind
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+        if job._cancelled:
+            job.state = CANCELLED
+        elif error is not None:
+            job.state = FAILED
+            job.error = error
+
+            logger.warning("Export of %s failed: %s", job.input_path, job.error)
+        else:
+            job.state = DONE
+
+    def _run_plan(self, job: ExportJob, plan: media_handler.ExportPlan) -> str | None:
+        """
+        Runs a plan's ffmpeg processes one after another, stopping at the first that fails
+        :param job: Job the plan is for
+        :param plan: Plan to run
+        :return: Why ffmpeg failed, or None if every step worked or the job was cancelled
+        """
+        job.step_count = len(plan.steps)
+
+        if job.duration_ms is None and plan.step_lengths is not None:
+            # the plan probed a length the clip didn't have yet
+            job.duration_ms = max(plan.step_lengths)
+
+        # milliseconds of media each step writes, for weighting progress
+        if plan.step_lengths is not None:
+            step_lengths = plan.step_lengths
+        elif job.duration_ms is not None:
+            step_lengths = [job.duration_ms] * len(plan.steps)
+        else:
+            step_lengths = None
+
+        # write the files the steps read, now that the plan is running
+        plan.prepare()
+
+        for index, stream in enumerate(plan.steps):
+            job.step = index + 1
+
+            # progress reports go to stdout, the usual stats line is left off stderr
+            stream = stream.global_args("-progress", "pipe:1", "-nostats")
+
+            with self._condition:
+                if job._cancelled:
+                    return None
+
+                process = stream.run_async(pipe_stdout=True, pipe_stderr=True)
+                job._process = process
+
+            # stderr is drained on its own thread so ffmpeg can't block on a full pipe
+            stderr = []
+            stderr_thread = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+            stderr_thread.start()
+
+            try:
+                self._read_progress(job, process, step_lengths, index)
+
+                process.wait()
+                stderr_thread.join()
+                return_code = process.returncode
+            finally:
+                job._process = None
+
+            if job._cancelled:
+                return None
+
+            if return_code != 0:
+                # ffmpeg puts the reason on its last line
+                lines = b"".join(stderr).decode(errors="replace").strip().splitlines()
+                return lines[-1] if len(lines) > 0 else f"ffmpeg exited with code {return_code}"
+
+        return None
+
+    def _read_progress(self, job: ExportJob, process, step_lengths: list[int] | None, step_index: int) -> None:
+        """
+        Reads ffmpeg's progress reports until it closes stdout, updating the job after each one
+        :param job: Job being run
+        :param process: ffmpeg process, started with -progress pipe:1
+        :param step_lengths: Milliseconds of media each of the plan's steps writes, None if not known
+        :param step_index: Index of the step being run
+        :return:
+        """
+        report = {}
+
+        for line in process.stdout:
+            key, _, value = line.decode(errors="replace").strip().partition("=")
+            report[key] = value
+
+            # each report ends with a progress line
+            if key != "progress":
+                continue
+
+            out_time_ms = _parse_out_time(report)
+            if out_time_ms is not None:
+                job.out_time_ms = out_time_ms
+
+            # copying audio only doesn't report fps
+            if "speed" in report:
+                job.speed = _to_float(report["speed"].rstrip("x"))
+            if "fps" in report:
+                job.fps = _to_float(report["fps"])
+
+            if step_lengths is not None:
+                total = sum(step_lengths)
+                done = sum(step_lengths[:step_index]) + min(job.out_time_ms, step_lengths[step_index])
+
+                job.progress = min(1.0, done / total) if total > 0 else None
+
+            _log_progress(job)
+            self.on_update(job)
+
+            report = {}
+
+
+def _is_up_to_date(job: ExportJob) -> bool:
+    """
+    :param job: Job with its fingerprint set
+    :return: True if the job's output was written by an export with the same fingerprint & hasn't changed since
+    """
+    if job.saved_output is None or job.saved_output[0] != job.fingerprint:
+        return False
+
+    try:
+        stat = os.stat(job.output_path)
+    except OSError:
+        return False
+
+    if (stat.st_mtime_ns, stat.st_size) != job.saved_output[1:]:
+        return False
+
+    job.output_state = (stat.st_mtime_ns, stat.st_size)
+    return True
+
+
+def _parse_out_time(report: dict[str, str]) -> int | None:
+    """
+    :param report: One ffmpeg progress report
+    :return: Milliseconds of output written, or None if ffmpeg hasn't written any yet
+    """
+    # out_time_us is in microseconds, as is out_time_ms despite its name
+    for key in ("out_time_us", "out_time_ms"):
+        value = report.get(key, "")
+        if value.lstrip("-").isdigit():
+            return max(0, int(value) // 1000)
+
+    return None
+
+
+def _to_float(value: str) -> float:
+    """
+    :param value: Number from a progress report
+    :return: The number, or 0 if ffmpeg reported N/A
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def _log_progress(job: ExportJob) -> None:
+    """
+    Writes a job's latest progress report to the progress log, unless one was written in the last
+    PROGRESS_LOG_INTERVAL seconds
+    :param job: Job that reported progress
+    :return:
+    """
+    now = time.time()
+    if now - job._logged_at < PROGRESS_LOG_INTERVAL:
+        return
+
+    job._logged_at = now
+    progress = f"{job.progress * 100:.1f}" if job.progress is not None else "NA"
+
+    progress_logger.info("host=%s event=progress job=%d attempt=%d mode=%s step=%d/%d out_time_ms=%d "
+                         "duration_ms=%s percent=%s speed=%.3f fps=%.2f elapsed=%.2f", HOSTNAME, job.job_id,
+                         job.attempts, job.mode.replace(" ", "_"), job.step, job.step_count, job.out_time_ms,
+                         job.duration_ms if job.duration_ms is not None else "NA", progress, job.speed, job.fps,
+                         now - job.started_at)
+
+
+def _log_finished(job: ExportJob) -> None:
+    """
+    Writes how a job ended to the progress log, with how much faster than real time it ran
+    :param job: Finished job
+    :return:
+    """
+    # jobs cancelled or refused before they started never ran
+    elapsed = job.finished_at - job.started_at if job.started_at else 0.0
+    realtime = job.duration_ms / 1000 / elapsed if job.duration_ms is not None and elapsed > 0 else 0.0
+
+    progress_logger.info("host=%s event=%s job=%d attempt=%d mode=%s duration_ms=%s elapsed=%.2f realtime=%.3f "
+                         "path=%s", HOSTNAME, job.state.lower().replace(" ", "_"), job.job_id, job.attempts,
+                         job.mode.replace(" ", "_") or "none", job.duration_ms if job.duration_ms is not None else "NA",
+                         elapsed, realtime if job.state == DONE else 0.0, job.input_path.replace(" ", "%20"))
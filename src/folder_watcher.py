@@ -0,0 +1,296 @@
+"""
+Developed by Keagan B
+ClipMaker -- folder_watcher.py
+
+Watches clip folder directories for added, removed & renamed files. Uses inotify on Linux and falls back to
+polling directory mtimes elsewhere. Changes are collected on a background thread and picked up in batches with
+drain(), so bursts of events turn into a single update.
+"""
+from __future__ import annotations
+
+import ctypes.util
+import threading
+import logging
+import ctypes
+import select
+import struct
+import errno
+import time
+import sys
+import os
+
+logger = logging.getLogger(__name__)
+
+# seconds without new events before a batch of changes is handed out
+SETTLE_DELAY = 0.5
+
+# longest a batch is held back during a constant stream of events, in seconds
+MAX_DELAY = 2.0
+
+# seconds between directory sweeps when polling
+POLL_INTERVAL = 2.0
+
+# inotify event flags, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+              | IN_ONLYDIR)
+
+# wd, mask, cookie, name length
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class FolderWatcher(threading.Thread):
+    """
+    Base watcher thread. Keeps the set of changed directories until they are drained.
+    """
+
+    def __init__(self):
+        threading.Thread.__init__(self, name="ClipMaker folder watcher", daemon=True)
+
+        # directories being watched, mapped to the mtime_ns they had when last scanned
+        self.dirs: dict[str, int] = {}
+
+        self._changed: set[str] = set()
+        self._first_change = 0.0
+        self._last_change = 0.0
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def set_dirs(self, dirs: dict[str, int]) -> None:
+        """
+        Replaces the watched directories. Directories that changed since their given mtime are reported straight away.
+        :param dirs: Directory path to the mtime_ns it had when last scanned
+        :return:
+        """
+        with self._lock:
+            old_dirs = self.dirs
+            self.dirs = dict(dirs)
+
+        for path in old_dirs.keys() - dirs.keys():
+            self._unwatch(path)
+
+        for path in dirs.keys() - old_dirs.keys():
+            self._watch(path)
+
+        # catch anything that changed between the scan & the watch being added
+        self._mark([path for path, mtime_ns in dirs.items() if _get_mtime(path) != mtime_ns])
+
+    def drain(self) -> set[str]:
+        """
+        Hands out the directories that changed, once events have settled
+        :return: Set of changed directory paths, empty if there are none or more events are still arriving
+        """
+        with self._lock:
+            if len(self._changed) == 0:
+                return set()
+
+            now = time.monotonic()
+            if now - self._last_change < SETTLE_DELAY and now - self._first_change < MAX_DELAY:
+                return set()
+
+            changed = self._changed
+            self._changed = set()
+
+            return changed
+
+    def stop(self) -> None:
+        """
+        Stops the watcher thread
+        :return:
+        """
+        self._stopped.set()
+
+        if self.is_alive():
+            self.join()
+
+    def _mark(self, paths) -> None:
+        """
+        Records directories as changed
+        :param paths: Changed directory paths
+        :return:
+        """
+        paths = set(paths)
+        if len(paths) == 0:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if len(self._changed) == 0:
+                self._first_change = now
+
+            self._last_change = now
+            self._changed.update(paths)
+
+    def _watch(self, path: str) -> None:
+        """
+        Starts watching a directory
+        :param path: Directory path
+        :return:
+        """
+
+    def _unwatch(self, path: str) -> None:
+        """
+        Stops watching a directory
+        :param path: Directory path
+        :return:
+        """
+
+
+class PollingWatcher(FolderWatcher):
+    """
+    Watcher that compares directory mtimes every POLL_INTERVAL seconds
+    """
+
+    def run(self) -> None:
+        while not self._stopped.wait(POLL_INTERVAL):
+            with self._lock:
+                dirs = list(self.dirs.items())
+
+            changed = []
+            for path, mtime_ns in dirs:
+                current = _get_mtime(path)
+                if current != mtime_ns:
+                    changed.append(path)
+
+                    # only report each change once
+                    with self._lock:
+                        if path in self.dirs:
+                            self.dirs[path] = current
+
+            self._mark(changed)
+
+
+class InotifyWatcher(FolderWatcher):
+    """
+    Watcher built on Linux's inotify, through libc
+    """
+
+    def __init__(self, libc: ctypes.CDLL):
+        FolderWatcher.__init__(self)
+
+        self._libc = libc
+
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        # watch descriptor -> directory path, and back
+        self._paths: dict[int, str] = {}
+        self._descriptors: dict[str, int] = {}
+
+    def run(self) -> None:
+        try:
+            while not self._stopped.is_set():
+                # wake up regularly to check for the stop signal
+                readable, _, _ = select.select([self._fd], [], [], 0.5)
+                if len(readable) == 0:
+                    continue
+
+                try:
+                    data = os.read(self._fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+
+                self._mark(self._parse_events(data))
+        finally:
+            os.close(self._fd)
+
+    def _parse_events(self, data: bytes) -> set[str]:
+        """
+        Turns a buffer of inotify events into the directories they happened in
+        :param data: Bytes read from the inotify file descriptor
+        :return: Set of changed directory paths
+        """
+        changed = set()
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # events were dropped, so anything could have changed
+                with self._lock:
+                    changed.update(self.dirs)
+                continue
+
+            with self._lock:
+                path = self._paths.get(wd)
+
+                if mask & IN_IGNORED and path is not None:
+                    # the directory is gone, or was unwatched
+                    del self._paths[wd]
+
+                    # it may have been watched again since, under a new descriptor
+                    if self._descriptors.get(path) == wd:
+                        del self._descriptors[path]
+
+            if path is not None:
+                changed.add(path)
+
+        return changed
+
+    def _watch(self, path: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                logger.warning("Could not watch %s, the inotify watch limit was reached. "
+                               "Raise fs.inotify.max_user_watches to watch more folders", path)
+            elif error != errno.ENOENT:
+                logger.warning("Could not watch %s: %s", path, os.strerror(error))
+            return
+
+        with self._lock:
+            self._paths[wd] = path
+            self._descriptors[path] = wd
+
+    def _unwatch(self, path: str) -> None:
+        with self._lock:
+            wd = self._descriptors.pop(path, None)
+
+        if wd is not None:
+            # the IN_IGNORED event this causes clears the descriptor
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+
+def create_watcher() -> FolderWatcher:
+    """
+    Creates the best watcher available on this system
+    :return: An InotifyWatcher on Linux, otherwise a PollingWatcher
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            return InotifyWatcher(libc)
+        except (OSError, AttributeError) as e:
+            logger.warning("inotify is not available, polling folders for changes instead: %s", e)
+
+    return PollingWatcher()
+
+
+def _get_mtime(path: str) -> int | None:
+    """
+    :param path: Directory path
+    :return: The directory's mtime_ns, or None if it can't be read
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
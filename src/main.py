@@ -9,22 +9,35 @@ TODO:
 UI Scaling
 Previous/Next buttons
 Restart video after reaching end
-Subfolder support
 Start and end at clipped times
-Exporting status bar
 Fix export trimming
 Removing tag refreshes UI, not just tag list
 Tag menu doesn't update following tag deletion
 """
 import os
+import logging
+import time
 import db_handler
+import db_profiler
 import ui
 
 
 def main():
+    # used to log how long the window takes to become usable
+    start_time = time.perf_counter()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+
+    # opt-in query profiling, must be turned on before connecting
+    if os.environ.get("CLIPMAKER_PROFILE_DB"):
+        db_profiler.enable(slow_query_ms=float(os.environ.get("CLIPMAKER_SLOW_QUERY_MS", db_profiler.SLOW_QUERY_MS)))
+
     # connect to database
     db = db_handler.get_database(should_wipe=False)
 
+    # move writes off the UI thread
+    db_handler.start_writer()
+
     # set UI database
     ui.DB_OBJ = db
 
@@ -38,7 +51,7 @@ def main():
         ui.VIDEO_EXTENSIONS = extensions.split("\n")
 
     # create UI
-    ui_root = ui.create_ui()
+    ui_root = ui.create_ui(start_time)
 
     # start main UI loop
     ui_root.mainloop()
@@ -3,97 +3,372 @@ Developed by Keagan B
 ClipMaker -- media_handler.py
 
 Handles the trimming of individual clips and entire folders.
+
+Trims are exported in the cheapest way that meets the precision asked for:
+- stream copy: packets are copied as is, so cuts snap to the keyframe before the start. Fastest, no quality loss
+- smart cut: only the frames from the start up to the next keyframe are re-encoded, the rest is copied
+- re-encode: the whole trim is decoded & encoded again
+
+Exports are written to a temporary file next to the output and renamed over it once done, so an existing output is
+never left half written.
 """
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+import hashlib
 import os.path
 
-import tkinter as tk
 import db_handler
 import pathlib
 import ffmpeg
 
+if TYPE_CHECKING:
+    # only needed for hints, export_queue imports this module
+    import export_queue
+
+# export modes, cheapest first
+COPY = "stream copy"
+SMART_CUT = "smart cut"
+REENCODE = "re-encode"
+
+# how exact cuts have to be
+KEYFRAME_PRECISION = "keyframe"
+FRAME_PRECISION = "frame"
+
+# part of every export fingerprint. Bump it when the export commands change, so older outputs are made again
+EXPORT_VERSION = 1
+
+# video codecs smart cut can re-encode the start of, and the encoder used for each
+SMART_CUT_ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+
+# a start this close to a keyframe counts as being on it, in milliseconds
+KEYFRAME_TOLERANCE_MS = 5
+
+# how far past the start to look for the next keyframe, in milliseconds
+KEYFRAME_SEARCH_MS = 20000
+
+# error given to trims that end at or before their start, which ffmpeg would export to the end of the clip
+TRIM_ERROR = "The trim ends before it starts"
+
+
+class ExportPlan:
+    """
+    The ffmpeg commands that export one clip, run in order
+    """
+
+    def __init__(self, mode: str, steps: list, temp_paths: list[str] | None = None,
+                 step_lengths: list[int] | None = None, concat_lists: dict[str, list[str]] | None = None):
+        self.mode = mode
+        self.steps = steps
+
+        # files the steps pass between each other, removed once the export is over
+        self.temp_paths = temp_paths or []
+
+        # milliseconds of media each step writes, used to weight progress. None if every step writes the whole trim
+        self.step_lengths = step_lengths
+
+        # concat list paths the steps read, mapped to the files they list. Written by prepare, not while planning
+        self.concat_lists = concat_lists or {}
+
+    def prepare(self) -> None:
+        """
+        Writes the files the steps read. Call right before running the steps
+        :return:
+        """
+        for list_path, paths in self.concat_lists.items():
+            with open(list_path, "w") as f:
+                for path in paths:
+                    # concat list paths are quoted, with quotes escaped
+                    escaped_path = os.path.abspath(path).replace("'", "'\\''")
+                    f.write(f"file '{escaped_path}'\n")
+
+    def cleanup(self) -> None:
+        """
+        Removes the plan's temporary files
+        :return:
+        """
+        for path in self.temp_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
 
 def trim_clip(input_path: str, output_dir: str, start: int, end: int) -> None:
     """
-    Trim a clip down to the chosen start/end size
+    Trim a clip down to the chosen start/end size. Blocks until ffmpeg is done, see export_queue for exporting in
+    the background.
     :param input_path: Path to input clip
     :param output_dir: Path to the output directory
     :param start: Starting millisecond to trim from
     :param end: Ending millisecond to trim to
     :return:
     """
+    output_loc = get_output_path(input_path, output_dir)
+    temp_loc = get_temp_path(output_loc)
 
-    # get start in seconds
-    start = start // 1000
+    # run commands, only replacing the old output once the new one is done
+    try:
+        build_trim(input_path, temp_loc, start, end).run()
+        os.replace(temp_loc, output_loc)
+    finally:
+        if os.path.exists(temp_loc):
+            os.remove(temp_loc)
 
-    # get end in seconds
-    if end < 0:
-        end = end // 1000
+
+def get_output_path(input_path: str, output_dir: str) -> str:
+    """
+    :param input_path: Path to input clip
+    :param output_dir: Path to the output directory
+    :return: Absolute path the trimmed clip is written to
+    """
+    return str(pathlib.Path(output_dir).joinpath(pathlib.Path(input_path).name).absolute())
+
+
+def get_temp_path(output_loc: str, tag: str = "") -> str:
+    """
+    :param output_loc: Path a clip is exported to
+    :param tag: Added to the name, so exports to the same path never share a temporary file
+    :return: Path the clip is written to before being renamed over output_loc. Keeps the extension, since ffmpeg
+    picks the format from it
+    """
+    base, extension = os.path.splitext(output_loc)
+
+    return f"{base}.part{tag}{extension}"
+
+
+def get_fingerprint(input_path: str, mtime_ns: int, size: int, start: int, end: int, precision: str) -> str:
+    """
+    :param input_path: Path to input clip
+    :param mtime_ns: mtime of the input file
+    :param size: Size of the input file in bytes
+    :param start: Starting millisecond to trim from
+    :param end: Ending millisecond to trim to
+    :param precision: How exact the cuts have to be
+    :return: Hash of everything that decides what an export writes. Equal fingerprints make equal outputs
+    """
+    return hashlib.sha1(f"{input_path}\0{mtime_ns}\0{size}\0{start}\0{end}\0{precision}\0"
+                        f"{EXPORT_VERSION}".encode()).hexdigest()
+
+
+def build_trim(input_path: str, output_loc: str, start: int, end: int, threads: int = 0):
+    """
+    Builds the ffmpeg command that re-encodes a trim, without running it. The input is seeked to the start, so only
+    the frames from the keyframe before it are decoded, and frames before the start are dropped, so the cut is exact.
+    :param input_path: Path to input clip
+    :param output_loc: Path to write the trimmed clip to
+    :param start: Starting millisecond to trim from
+    :param end: Ending millisecond to trim to, -1 for the end of the clip
+    :param threads: Max threads ffmpeg should use, 0 lets ffmpeg decide
+    :return: ffmpeg output stream, ready to run
+    """
+    start = max(0, start)
+
+    if not is_trim_valid(start, end):
+        raise ValueError(TRIM_ERROR)
 
     # get input path
     input_path = f"{str(pathlib.Path(input_path).absolute())}"
 
-    # get output file name
-    output_loc = f"{str(pathlib.Path(output_dir).joinpath(pathlib.Path(input_path).name).absolute())}"
+    # seek on the input side, before -i
+    input_args = {"ss": _to_seconds(start)} if start > 0 else {}
 
-    if os.path.exists(output_loc):
-        os.remove(output_loc)
+    # trim to the length on the output side, counted from the start
+    output_args = {"t": _to_seconds(end - start)} if end > start else {}
 
     # grab input file
-    input_stream = ffmpeg.input(input_path)
+    input_stream = ffmpeg.input(input_path, **input_args)
 
-    # get video and audio streams
-    video = input_stream.video
-    audio = input_stream.audio
+    # set video output location and input streams
+    return ffmpeg.output(input_stream.video, input_stream.audio, output_loc, threads=threads,
+                         **output_args).overwrite_output()
 
-    # trim input streams
-    if end > 0:
-        video = video.trim(start=start, end=end)
-    else:
-        video = video.trim(start=start)
 
-    # trim audio stream
-    if end > 0:
-        audio = audio.filter('atrim', start=start, end=end)
-    else:
-        audio = audio.filter('atrim', start=start)
+def plan_export(input_path: str, output_loc: str, start: int, end: int, precision: str = FRAME_PRECISION,
+                threads: int = 0) -> ExportPlan:
+    """
+    Picks the cheapest way to export a trim that meets the precision asked for. Probes the clip, so call it off the
+    UI thread.
+    :param input_path: Path to input clip
+    :param output_loc: Path to write the trimmed clip to
+    :param start: Starting millisecond to trim from
+    :param end: Ending millisecond to trim to, -1 for the end of the clip
+    :param precision: KEYFRAME_PRECISION lets the start snap back to a keyframe, FRAME_PRECISION doesn't
+    :param threads: Max threads ffmpeg should use for encoding, 0 lets ffmpeg decide
+    :return: ExportPlan for the trim. Nothing is written until it is run
+    """
+    start = max(0, start)
 
-    # set video output location and input streams
-    out = ffmpeg.output(video, audio, output_loc)
+    if not is_trim_valid(start, end):
+        raise ValueError(TRIM_ERROR)
+
+    # nothing to cut, or cuts are allowed to snap to keyframes
+    if start == 0 or precision == KEYFRAME_PRECISION:
+        return ExportPlan(COPY, [build_copy(input_path, output_loc, start, end)])
+
+    try:
+        data = ffmpeg.probe(input_path)
+        streams = data.get("streams", [])
+
+        # keyframe times are read from the stream, which may not start at 0
+        start_time = data.get("format", {}).get("start_time")
+        offset = round(float(start_time) * 1000) if start_time not in (None, "N/A") else 0
+
+        keyframe = find_keyframe(input_path, start, offset)
+    except ffmpeg.Error:
+        return ExportPlan(REENCODE, [build_trim(input_path, output_loc, start, end, threads)])
+
+    video = next((stream for stream in streams if stream.get("codec_type") == "video"), None)
+    has_audio = any(stream.get("codec_type") == "audio" for stream in streams)
+
+    if keyframe is not None and keyframe - start <= KEYFRAME_TOLERANCE_MS:
+        # the start is already on a keyframe, so a copy from it is exact. Seek just past the keyframe, input seeking
+        # lands on the keyframe at or before the given time
+        return ExportPlan(COPY, [build_copy(input_path, output_loc, keyframe + 1, end)])
+
+    if (video is not None and video.get("codec_name") in SMART_CUT_ENCODERS and keyframe is not None
+            and (end < 0 or keyframe < end)):
+        plan = build_smart_cut(input_path, output_loc, start, end, keyframe, video, has_audio, threads)
+
+        # each step writes a different part of the trim, so progress is weighted by how much each covers
+        duration = data.get("format", {}).get("duration")
+        if end > 0 or duration not in (None, "N/A"):
+            length = (end if end > 0 else round(float(duration) * 1000)) - start
+            plan.step_lengths = [keyframe - start, length - (keyframe - start), length]
 
-    # run commands
-    out.run()
+        return plan
 
+    # short trims with no keyframe inside, or codecs smart cut can't match
+    return ExportPlan(REENCODE, [build_trim(input_path, output_loc, start, end, threads)])
 
-def export_folder(clip_ids: list[int], output_dir: str) -> None:
+
+def build_copy(input_path: str, output_loc: str, start: int, end: int):
     """
-    Loops through a list of clips and
-    :param clip_ids: list of clip ids
-    :param output_dir: Directory to output videos to
-    :return:
+    Builds an ffmpeg command that copies a trim without re-encoding. The start snaps back to the keyframe before it.
+    :param input_path: Path to input clip
+    :param output_loc: Path to write the trimmed clip to
+    :param start: Starting millisecond to trim from
+    :param end: Ending millisecond to trim to, -1 for the end of the clip
+    :return: ffmpeg output stream, ready to run
+    """
+    input_args = {"ss": _to_seconds(start)} if start > 0 else {}
+    output_args = {"t": _to_seconds(end - start)} if end > start else {}
+
+    # seek on the input, so nothing before the start is read
+    return (
+        ffmpeg.input(input_path, **input_args)
+        .output(output_loc, c="copy", avoid_negative_ts="make_zero", **output_args)
+        .overwrite_output()
+    )
+
+
+def build_smart_cut(input_path: str, output_loc: str, start: int, end: int, keyframe: int, video: dict,
+                    has_audio: bool, threads: int = 0) -> ExportPlan:
+    """
+    Builds the ffmpeg commands for a smart cut. The video from the start to the next keyframe is re-encoded with
+    settings matching the source, the video from that keyframe on is copied, and the two are joined with the audio
+    copied over from the start.
+    :param input_path: Path to input clip
+    :param output_loc: Path to write the trimmed clip to
+    :param start: Starting millisecond to trim from
+    :param end: Ending millisecond to trim to, -1 for the end of the clip
+    :param keyframe: Millisecond of the first keyframe after the start
+    :param video: ffprobe stream info of the clip's video
+    :param has_audio: Does the clip have audio?
+    :param threads: Max threads ffmpeg should use for encoding, 0 lets ffmpeg decide
+    :return: ExportPlan for the smart cut
     """
+    # MPEG-TS keeps codec settings in the stream itself, so parts encoded separately can be joined
+    head_path = f"{output_loc}.head.ts"
+    body_path = f"{output_loc}.body.ts"
+    list_path = f"{output_loc}.parts.txt"
+
+    encode_args = {"vcodec": SMART_CUT_ENCODERS[video["codec_name"]], "threads": threads}
+    if "pix_fmt" in video:
+        encode_args["pix_fmt"] = video["pix_fmt"]
+
+    head = (
+        ffmpeg.input(input_path, ss=_to_seconds(start))["v:0"]
+        .output(head_path, t=_to_seconds(keyframe - start), f="mpegts", **encode_args)
+        .overwrite_output()
+    )
+
+    # seek just past the keyframe, input seeking lands on the keyframe at or before the given time
+    body_args = {"t": _to_seconds(end - keyframe)} if end > 0 else {}
+    body = (
+        ffmpeg.input(input_path, ss=_to_seconds(keyframe + 1))["v:0"]
+        .output(body_path, vcodec="copy", f="mpegts", **body_args)
+        .overwrite_output()
+    )
+
+    # the list is written when the plan is run, after the head & body are planned
+    joined_video = ffmpeg.input(list_path, f="concat", safe=0)["v"]
 
-    # loop through clip ids
-    for clip_id in clip_ids:
-        # get clip from database
-        clip = db_handler.get_clip_from_id(clip_id)
-        # trim the clip
-        trim_clip(clip.path, output_dir, clip.trimmed_start, clip.trimmed_end)
+    audio_args = {"t": _to_seconds(end - start)} if end > start else {}
+    streams = [joined_video]
+    if has_audio:
+        streams.append(ffmpeg.input(input_path, ss=_to_seconds(start), **audio_args)["a"])
 
+    # copied audio would start from the keyframe before the seek, so drop what comes before it to keep it in sync.
+    # The video already starts at 0, so timestamps are left for the muxer
+    join = ffmpeg.output(*streams, output_loc, c="copy", copypriorss=0).overwrite_output()
 
-def create_export_ui():
-    # create a popup
-    popup = tk.Toplevel()
+    return ExportPlan(SMART_CUT, [head, body, join], [head_path, body_path, list_path],
+                      concat_lists={list_path: [head_path, body_path]})
 
-    # alert label
-    label = tk.Label(popup, text="Exporting. This may take a few moments.")
 
-    # close button
-    close_button = tk.Button(popup, text="close", command=popup.destroy)
+def is_trim_valid(start: int, end: int) -> bool:
+    """
+    :param start: Starting millisecond to trim from
+    :param end: Ending millisecond to trim to, -1 for the end of the clip
+    :return: False if the trim ends at or before its start
+    """
+    return end <= 0 or end > max(0, start)
 
-    popup.grid()
 
-    label.grid(row=0, column=0)
-    close_button.grid(row=1, column=0)
+def find_keyframe(input_path: str, start: int, offset: int = 0) -> int | None:
+    """
+    Finds the first video keyframe at or after a time, only reading the part of the clip after it
+    :param input_path: Path to input clip
+    :param start: Millisecond to search from
+    :param offset: Start time of the clip in milliseconds, as probed from its format. Frame times are read from the
+    stream, while seeks & trims are from the start of the clip
+    :return: Millisecond of the keyframe from the start of the clip, or None if there isn't one within
+    KEYFRAME_SEARCH_MS
+    """
+    data = ffmpeg.probe(input_path, select_streams="v:0", skip_frame="nokey",
+                        show_entries="frame=pts_time,best_effort_timestamp_time",
+                        read_intervals=f"{_to_seconds(max(0, start - KEYFRAME_TOLERANCE_MS) + offset)}%+"
+                                       f"{_to_seconds(KEYFRAME_SEARCH_MS)}")
 
-    popup.update()
+    times = []
+    for frame in data.get("frames", []):
+        time = frame.get("pts_time", frame.get("best_effort_timestamp_time"))
+        if time not in (None, "N/A"):
+            times.append(round(float(time) * 1000) - offset)
 
+    return min((time for time in times if time >= start - KEYFRAME_TOLERANCE_MS), default=None)
+
+
+def export_folder(clip_ids: list[int], output_dir: str, jobs: export_queue.ExportQueue,
+                  precision: str = FRAME_PRECISION) -> list[export_queue.ExportJob]:
+    """
+    Queues a list of clips to be trimmed & exported in the background
+    :param clip_ids: list of clip ids
+    :param output_dir: Directory to output videos to
+    :param jobs: Queue to add the exports to
+    :param precision: How exact the cuts have to be
+    :return: The queued jobs
+    """
+    # load every clip at once
+    clips = db_handler.get_clips_from_ids(clip_ids)
+
+    return jobs.submit_all([clips[clip_id] for clip_id in clip_ids if clip_id in clips], output_dir, precision)
+
+
+def _to_seconds(milliseconds: int) -> str:
+    """
+    :param milliseconds: Millisecond count
+    :return: Seconds as ffmpeg takes them, to the millisecond
+    """
+    return f"{milliseconds / 1000:.3f}"
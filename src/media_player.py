@@ -10,6 +10,8 @@ from __future__ import annotations
 
 import tkinter as tk
 from tkinter import ttk
+import sprite_sheets
+import waveforms
 import utils
 import vlc
 
@@ -129,17 +131,29 @@ class MediaPlayer(tk.Frame):
 
     def move_slider(self, _event) -> None:
         """
-        Event handler for slider movement
+        Event handler for slider movement. Dragging only moves the preview, the player seeks on release.
         :param _event: Unused event information
         :return:
         """
         if self.player:
             self._is_sliding = True
 
+            if self.parent.media_slider.is_dragging:
+                return
+
             time = self.parent.media_slider.get()
 
             self._tick_s = self.after_idle(self._set_time, time * TICK_INCREMENT_MS)
 
+    def release_slider(self, value: int) -> None:
+        """
+        Event handler for the slider being let go
+        :param value: Slider value it was let go at
+        :return:
+        """
+        if self.player:
+            self._set_time(value * TICK_INCREMENT_MS)
+
     def handle_tick(self):
         # ensure player exists
         if self.player:
@@ -190,7 +204,7 @@ class MediaPlayer(tk.Frame):
                 # check if variable is unset
                 if end_var.get() == "-1":
                     # set correct max length
-                    end_var.set(utils.get_time_from_milliseconds(self.player.get_length()))
+                    end_var.set(utils.get_time_from_milliseconds(self.player.get_length(), True))
 
             # check if canvas has been resized
             if self.video_canvas.winfo_width() != self.player.video_get_width(0) + 4:
@@ -224,13 +238,28 @@ class MediaPlayer(tk.Frame):
 class MediaSlider(tk.Scale):
     _var = None
 
-    def __init__(self, frame, to=1, **kwargs):
+    def __init__(self, frame, to=1, on_release=None, **kwargs):
         """
-        Creates a custom media slider object
+        Creates a custom media slider object. Hovering or dragging shows a preview frame once a sprite sheet is set.
         :param frame: Parent frame
         :param to: Max size of scale
+        :param on_release: Called with the slider's value when it is let go after a drag
         :param kwargs: Other arguments for the tk.Scale object
         """
+        # show the preview before handing changes on
+        self._command = kwargs.pop("command", None)
+        kwargs["command"] = self._on_change
+
+        self.on_release = on_release
+        self.is_dragging = False
+
+        # scrub preview state
+        self._sheet: sprite_sheets.SpriteSheet | None = None
+        self._sheet_image: tk.PhotoImage | None = None
+        self._preview: tk.Toplevel | None = None
+        self._preview_label: tk.Label | None = None
+        self._preview_image: tk.PhotoImage | None = None
+
         if isinstance(to, int):
             from_val, var = 0, tk.IntVar()
         else:
@@ -253,6 +282,11 @@ class MediaSlider(tk.Scale):
 
         self._var = var
 
+        self.bind("<ButtonPress-1>", self._press, add="+")
+        self.bind("<ButtonRelease-1>", self._release, add="+")
+        self.bind("<Motion>", self._hover, add="+")
+        self.bind("<Leave>", lambda _event: self.hide_preview(), add="+")
+
     def set(self, value):
         """
         Set the value of the slider
@@ -261,3 +295,238 @@ class MediaSlider(tk.Scale):
         """
         self._var.set(value)
         tk.Scale.set(self, value)
+
+    def set_preview(self, sheet: sprite_sheets.SpriteSheet | None) -> None:
+        """
+        Sets the sprite sheet previews are taken from. The whole sheet is loaded, so previews come from memory.
+        :param sheet: Sheet of the loaded clip, or None to turn previews off
+        :return:
+        """
+        self.hide_preview()
+
+        self._sheet = sheet
+        self._sheet_image = None
+
+        if sheet is not None:
+            try:
+                self._sheet_image = tk.PhotoImage(file=sheet.path)
+            except tk.TclError:
+                # evicted from the cache since it was built
+                self._sheet = None
+
+    def show_preview(self, value: int) -> None:
+        """
+        Shows the frame at a slider value above the slider
+        :param value: Slider value to preview
+        :return:
+        """
+        if self._sheet_image is None:
+            return
+
+        if self._preview is None:
+            # borderless popup that follows the cursor
+            self._preview = tk.Toplevel(self)
+            self._preview.overrideredirect(True)
+
+            self._preview_image = tk.PhotoImage(width=sprite_sheets.TILE_WIDTH, height=sprite_sheets.TILE_HEIGHT)
+            self._preview_label = tk.Label(self._preview, image=self._preview_image, compound=tk.TOP)
+            self._preview_label.pack()
+
+        milliseconds = value * TICK_INCREMENT_MS
+        x, y = self._sheet.get_tile_position(milliseconds)
+
+        # copy the frame into the preview image in place, rather than making a new image every move
+        self.tk.call(self._preview_image, "copy", self._sheet_image, "-from", x, y, x + sprite_sheets.TILE_WIDTH,
+                     y + sprite_sheets.TILE_HEIGHT, "-to", 0, 0)
+        self._preview_label.configure(text=utils.get_time_from_milliseconds(milliseconds))
+
+        # center the preview over the slider's position for the value
+        slider_x = self.coords(value)[0]
+        self._preview.geometry(f"+{self.winfo_rootx() + slider_x - sprite_sheets.TILE_WIDTH // 2}"
+                               f"+{self.winfo_rooty() - sprite_sheets.TILE_HEIGHT - 30}")
+        self._preview.deiconify()
+        self._preview.lift()
+
+    def hide_preview(self) -> None:
+        """
+        Hides the preview popup
+        :return:
+        """
+        if self._preview is not None and not self.is_dragging:
+            self._preview.withdraw()
+
+    def _on_change(self, value: str) -> None:
+        """
+        Slider value change handler
+        :param value: New slider value
+        :return:
+        """
+        if self.is_dragging:
+            self.show_preview(int(float(value)))
+
+        if self._command is not None:
+            self._command(value)
+
+    def _press(self, _event) -> None:
+        self.is_dragging = True
+
+    def _release(self, _event) -> None:
+        if not self.is_dragging:
+            return
+
+        self.is_dragging = False
+        self.hide_preview()
+
+        if self.on_release is not None:
+            self.on_release(self.get())
+
+    def _hover(self, event) -> None:
+        if not self.is_dragging:
+            # preview wherever the cursor is, without moving the slider
+            self.show_preview(int(float(self.tk.call(self._w, "get", event.x, event.y))))
+
+
+class WaveformCanvas(tk.Canvas):
+    """
+    Draws a clip's audio waveform with its trim points. Left click picks the start, right click picks the end,
+    and the mouse wheel zooms in around the cursor.
+    """
+
+    def __init__(self, frame, on_pick_start=None, on_pick_end=None, **kwargs):
+        """
+        :param frame: Parent frame
+        :param on_pick_start: Called with the clicked time in milliseconds on a left click
+        :param on_pick_end: Called with the clicked time in milliseconds on a right click
+        :param kwargs: Other arguments for the tk.Canvas object
+        """
+        config = {"height": 48, "background": "black", "highlightthickness": 0}
+        config.update(kwargs)
+
+        tk.Canvas.__init__(self, frame, **config)
+
+        self.on_pick_start = on_pick_start
+        self.on_pick_end = on_pick_end
+
+        self._waveform: waveforms.Waveform | None = None
+
+        # time range in view, in milliseconds
+        self._view_start = 0.0
+        self._view_end = 0.0
+
+        # trim points, -1 for unset
+        self._start_ms = -1
+        self._end_ms = -1
+
+        self.bind("<Configure>", lambda _event: self.redraw())
+        self.bind("<Button-1>", self._pick_start)
+        self.bind("<Button-3>", self._pick_end)
+        self.bind("<MouseWheel>", self._zoom)
+        self.bind("<Button-4>", self._zoom)
+        self.bind("<Button-5>", self._zoom)
+
+    def set_waveform(self, waveform: waveforms.Waveform | None) -> None:
+        """
+        Shows a waveform, zoomed all the way out
+        :param waveform: Waveform of the loaded clip, or None to clear it
+        :return:
+        """
+        self._waveform = waveform
+        self._view_start = 0.0
+        self._view_end = 0.0 if waveform is None else waveform.get_duration_ms()
+
+        self.redraw()
+
+    def set_markers(self, start_ms: int, end_ms: int) -> None:
+        """
+        Moves the trim point markers
+        :param start_ms: Trimmed start, or -1 if unset
+        :param end_ms: Trimmed end, or -1 if unset
+        :return:
+        """
+        self._start_ms = start_ms
+        self._end_ms = end_ms
+
+        self._draw_markers()
+
+    def redraw(self) -> None:
+        """
+        Redraws the waveform, reading only the peaks in view
+        :return:
+        """
+        self.delete("wave")
+
+        width = self.winfo_width()
+        height = self.winfo_height()
+
+        if self._waveform is not None and self._view_end > self._view_start and width > 1:
+            peaks = self._waveform.get_peaks(self._view_start, self._view_end, width)
+            middle = height / 2
+            scale = middle / 32768
+
+            # one vertical line per column, from the lowest to the highest sample
+            column_width = width / max(1, len(peaks))
+            for index, (low, high) in enumerate(peaks.tolist()):
+                x = index * column_width
+                self.create_line(x, middle - high * scale, x, middle - low * scale + 1, fill="#4caf50",
+                                 tags="wave")
+
+        self._draw_markers()
+
+    def _draw_markers(self) -> None:
+        """
+        Draws the trim points over the waveform
+        :return:
+        """
+        self.delete("marker")
+
+        height = self.winfo_height()
+
+        for milliseconds, color in ((self._start_ms, "#2196f3"), (self._end_ms, "#f44336")):
+            x = self._get_x(milliseconds)
+            if milliseconds >= 0 and x is not None:
+                self.create_line(x, 0, x, height, fill=color, width=2, tags="marker")
+
+    def _get_x(self, milliseconds: float) -> float | None:
+        """
+        :param milliseconds: Time in the clip
+        :return: x position of the time, or None if it's out of view
+        """
+        if self._view_end <= self._view_start or not self._view_start <= milliseconds <= self._view_end:
+            return None
+
+        return (milliseconds - self._view_start) / (self._view_end - self._view_start) * self.winfo_width()
+
+    def _get_time(self, x: int) -> int:
+        """
+        :param x: x position on the canvas
+        :return: Time at that position, in milliseconds
+        """
+        fraction = min(1.0, max(0.0, x / max(1, self.winfo_width())))
+
+        return int(self._view_start + fraction * (self._view_end - self._view_start))
+
+    def _pick_start(self, event) -> None:
+        if self._waveform is not None and self.on_pick_start is not None:
+            self.on_pick_start(self._get_time(event.x))
+
+    def _pick_end(self, event) -> None:
+        if self._waveform is not None and self.on_pick_end is not None:
+            self.on_pick_end(self._get_time(event.x))
+
+    def _zoom(self, event) -> None:
+        if self._waveform is None:
+            return
+
+        # wheel up zooms in, keeping the time under the cursor in place
+        zoom_in = event.num == 4 or getattr(event, "delta", 0) > 0
+        factor = 0.5 if zoom_in else 2.0
+
+        duration = self._waveform.get_duration_ms()
+        anchor = self._get_time(event.x)
+        span = min(duration, max(self._waveform.get_bucket_ms(0) * 50, (self._view_end - self._view_start) * factor))
+
+        fraction = event.x / max(1, self.winfo_width())
+        self._view_start = min(max(0.0, anchor - span * fraction), duration - span)
+        self._view_end = self._view_start + span
+
+        self.redraw()
@@ -0,0 +1,210 @@
+"""
+Developed by Keagan B
+ClipMaker -- media_probe.py
+
+Reads duration, resolution, frame rate, codecs & bit rate from clip files with ffprobe. Each ffprobe is its own
+process, so probes are started from a bounded thread pool, and files are only probed again when their size or mtime
+changes.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+import subprocess
+import threading
+import logging
+import models
+import json
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# max number of ffprobe processes running at once
+MAX_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+
+# number of results handed to the batch callback at a time
+BATCH_SIZE = 50
+
+# seconds before a single probe is given up on
+PROBE_TIMEOUT = 30
+
+# seconds between checks for a stop while waiting on ffprobe
+STOP_CHECK_INTERVAL = 0.25
+
+
+def probe_file(path: str, stop_event: threading.Event | None = None) -> models.MediaInfo | None:
+    """
+    Runs ffprobe on a file. Runs in the thread pool.
+    :param path: Path of the file to probe
+    :param stop_event: Kills ffprobe when set
+    :return: MediaInfo of the file, or None if ffprobe couldn't read it or was stopped
+    :raises FileNotFoundError: If ffprobe isn't installed
+    """
+    # ffprobe is started directly so a stuck probe can be killed
+    try:
+        process = subprocess.Popen(["ffprobe", "-show_format", "-show_streams", "-of", "json", path],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        return None
+
+    deadline = time.monotonic() + PROBE_TIMEOUT
+    while True:
+        try:
+            output, _ = process.communicate(timeout=STOP_CHECK_INTERVAL)
+            break
+        except subprocess.TimeoutExpired:
+            stopped = stop_event is not None and stop_event.is_set()
+            if not stopped and time.monotonic() < deadline:
+                continue
+
+            process.kill()
+            process.communicate()
+
+            # timed out probes are stored as unreadable, so they aren't retried until the file changes
+            return None
+
+    if process.returncode != 0:
+        return None
+
+    try:
+        data = json.loads(output)
+    except ValueError:
+        return None
+
+    return build_media_info(data)
+
+
+def build_media_info(data: dict) -> models.MediaInfo:
+    """
+    Picks the values ClipMaker uses out of ffprobe's output
+    :param data: Parsed JSON output of ffprobe -show_format -show_streams
+    :return: MediaInfo built from the first video & audio streams
+    """
+    file_format = data.get("format", {})
+    streams = data.get("streams", [])
+
+    video = next((stream for stream in streams if stream.get("codec_type") == "video"), {})
+    audio = next((stream for stream in streams if stream.get("codec_type") == "audio"), {})
+
+    duration = _to_float(file_format.get("duration", video.get("duration")))
+
+    return models.MediaInfo(
+        duration_ms=None if duration is None else round(duration * 1000),
+        width=_to_int(video.get("width")),
+        height=_to_int(video.get("height")),
+        fps=_parse_frame_rate(video.get("avg_frame_rate")) or _parse_frame_rate(video.get("r_frame_rate")),
+        video_codec=video.get("codec_name"),
+        audio_codec=audio.get("codec_name"),
+        bit_rate=_to_int(file_format.get("bit_rate")),
+        file_size=_to_int(file_format.get("size"))
+    )
+
+
+def probe_files(clips: dict[int, tuple[str, tuple[int, int] | None]],
+                on_batch: Callable[[dict[int, tuple[tuple[int, int], models.MediaInfo | None]]], None],
+                stop_event: threading.Event | None = None) -> int:
+    """
+    Probes every clip whose file changed since it was last probed. Blocks until done, so call it from a worker thread.
+    :param clips: Clip ID to the clip's path & the (mtime_ns, size) its file had when last probed
+    :param on_batch: Called with each batch of up to BATCH_SIZE results, as clip ID to the (mtime_ns, size) the file
+    had when probed & its MediaInfo
+    :param stop_event: Stops probing early when set
+    :return: Number of files that were probed
+    """
+    # only probe files whose state changed, statting is far cheaper than starting ffprobe
+    changed = {}
+    for clip_id, (path, probed_state) in clips.items():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+
+        file_state = (stat.st_mtime_ns, stat.st_size)
+        if file_state != probed_state:
+            changed[clip_id] = (path, file_state)
+
+    if len(changed) == 0:
+        return 0
+
+    probed = 0
+    batch = {}
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(changed)), thread_name_prefix="ClipMaker probe") as pool:
+        futures = {pool.submit(probe_file, path, stop_event): clip_id
+                   for clip_id, (path, _file_state) in changed.items()}
+
+        try:
+            for future in as_completed(futures):
+                clip_id = futures[future]
+
+                try:
+                    media_info = future.result()
+                except FileNotFoundError:
+                    # ffprobe isn't installed, nothing else will work either
+                    raise
+                except Exception:
+                    # left unprobed, so it's tried again on the next pass
+                    logger.exception("Could not probe %s", changed[clip_id][0])
+                    continue
+
+                # checked after the result, since stopped probes come back as None & mustn't be saved
+                if stop_event is not None and stop_event.is_set():
+                    break
+
+                batch[clip_id] = (changed[clip_id][1], media_info)
+                probed += 1
+
+                if len(batch) >= BATCH_SIZE:
+                    on_batch(batch)
+                    batch = {}
+        finally:
+            # drop probes that haven't started, running ones are killed by the stop event
+            pool.shutdown(wait=True, cancel_futures=True)
+
+            # keep what was probed, even if probing stopped early
+            if len(batch) > 0:
+                on_batch(batch)
+
+    return probed
+
+
+def _parse_frame_rate(value: str | None) -> float | None:
+    """
+    :param value: Frame rate as ffprobe writes it, like "30000/1001"
+    :return: Frames per second rounded to 3 places, or None if unknown
+    """
+    if value is None:
+        return None
+
+    numerator, _, denominator = value.partition("/")
+
+    try:
+        fps = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+    return round(fps, 3) if fps > 0 else None
+
+
+def _to_int(value) -> int | None:
+    """
+    :param value: Number or numeric string from ffprobe
+    :return: The value as an int, or None if missing or not a number
+    """
+    number = _to_float(value)
+
+    return None if number is None else int(number)
+
+
+def _to_float(value) -> float | None:
+    """
+    :param value: Number or numeric string from ffprobe
+    :return: The value as a float, or None if missing or not a number
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
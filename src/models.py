@@ -5,6 +5,8 @@ ClipMaker -- models.py
 All class objects used in the application
 
 """
+from __future__ import annotations
+
 import os
 
 
@@ -47,6 +49,9 @@ class Clip:
 
         self.tags: list[Tag] = []
 
+        # details read from the file by ffprobe, None until the clip has been probed
+        self.media_info: MediaInfo | None = None
+
     def get_clip_name(self) -> str:
         """
         :return: The custom name of this clip if set, or the file name
@@ -62,6 +67,45 @@ class Clip:
         pass
 
 
+class MediaInfo:
+    """
+    Details about a clip's file, as read by ffprobe. Any value can be None if the file doesn't have it.
+    """
+
+    def __init__(self, duration_ms: int | None = None, width: int | None = None, height: int | None = None,
+                 fps: float | None = None, video_codec: str | None = None, audio_codec: str | None = None,
+                 bit_rate: int | None = None, file_size: int | None = None):
+        self.duration_ms = duration_ms
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.video_codec = video_codec
+        self.audio_codec = audio_codec
+        self.bit_rate = bit_rate
+        self.file_size = file_size
+
+    def get_summary(self) -> str:
+        """
+        :return: Resolution, frame rate, codecs & bit rate in a short line, skipping anything unknown
+        """
+        parts = []
+
+        if self.width is not None and self.height is not None:
+            parts.append(f"{self.width}x{self.height}")
+
+        if self.fps is not None:
+            parts.append(f"{self.fps:g} fps")
+
+        codecs = "/".join(codec for codec in (self.video_codec, self.audio_codec) if codec is not None)
+        if codecs != "":
+            parts.append(codecs)
+
+        if self.bit_rate is not None:
+            parts.append(f"{self.bit_rate / 1_000_000:.1f} Mbps")
+
+        return ", ".join(parts)
+
+
 class TagSection:
     """
     A tag "section" - a grouping of tags that share some similar quality.
@@ -0,0 +1,342 @@
+"""
+Developed by Keagan B
+ClipMaker -- scanner.py
+
+Finds video files inside clip folders. Each folder is walked with os.scandir on a thread pool, and found paths are
+handed back in batches so they can be saved while the scan is still running.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable
+import logging
+import models
+import os
+
+logger = logging.getLogger(__name__)
+
+# number of paths handed to the batch callback at a time
+BATCH_SIZE = 1000
+
+# max number of folders scanned at once
+MAX_WORKERS = 8
+
+# number of paths checked per task when looking for missing files
+CHECK_CHUNK_SIZE = 1000
+
+
+def build_extension_set(extensions: list[str]) -> frozenset[str]:
+    """
+    Builds the set of file suffixes to match
+    :param extensions: Video extensions, with or without the leading dot
+    :return: Lowercase suffixes, each starting with a dot
+    """
+    return frozenset(f".{extension.strip().lstrip('.').lower()}" for extension in extensions if extension.strip())
+
+
+def is_video_file(name: str, extensions: frozenset[str]) -> bool:
+    """
+    Checks a file name against a set of suffixes, ignoring case
+    :param name: File name or path
+    :param extensions: Set built with build_extension_set
+    :return: True if the file has a video extension
+    """
+    return os.path.splitext(name)[1].lower() in extensions
+
+
+class ScanResult:
+    """
+    What a scan of one clip folder found, compared to the last scan
+    """
+
+    def __init__(self):
+        # every video file in the folder, in listing order
+        self.paths: list[str] = []
+
+        # new & changed files, mapped to their (mtime_ns, size)
+        self.added: dict[str, tuple[int, int]] = {}
+        self.modified: dict[str, tuple[int, int]] = {}
+
+        # files that were there last scan but are gone now
+        self.removed: list[str] = []
+
+        # mtime_ns of every directory that was scanned
+        self.dirs: dict[str, int] = {}
+
+        # number of directories whose listing was reused because they hadn't changed
+        self.skipped_dirs = 0
+
+    def has_changes(self) -> bool:
+        """
+        :return: True if any files were added, modified or removed
+        """
+        return len(self.added) > 0 or len(self.modified) > 0 or len(self.removed) > 0
+
+    def needs_saving(self, previous_dirs: dict[str, int]) -> bool:
+        """
+        :param previous_dirs: Directory mtimes from the last scan
+        :return: True if any files or directories changed since the last scan
+        """
+        return (self.has_changes() or len(self.changed_dirs(previous_dirs)) > 0
+                or len(self.removed_dirs(previous_dirs)) > 0)
+
+    def changed_dirs(self, previous_dirs: dict[str, int]) -> dict[str, int]:
+        """
+        :param previous_dirs: Directory mtimes from the last scan
+        :return: New & changed directories, mapped to their mtime_ns
+        """
+        return {path: mtime_ns for path, mtime_ns in self.dirs.items() if previous_dirs.get(path) != mtime_ns}
+
+    def removed_dirs(self, previous_dirs: dict[str, int]) -> list[str]:
+        """
+        :param previous_dirs: Directory mtimes from the last scan
+        :return: Directories that were scanned last time but not this time
+        """
+        return [path for path in previous_dirs if path not in self.dirs]
+
+
+def scan_folder(path: str, include_subdirs: bool, extensions: frozenset[str], known_dirs: dict[str, int] | None = None,
+                known_files: dict[str, dict[str, tuple[int, int]]] | None = None,
+                on_batch: Callable[[list[str]], None] | None = None,
+                force_dirs: set[str] | None = None) -> ScanResult:
+    """
+    Walks a folder looking for video files. Directories whose mtime matches the last scan are not listed again, their
+    stored files & subdirectories are reused instead. A directory's mtime only changes when entries are added, removed
+    or renamed in it, so files edited in place inside an unchanged directory are only reported as modified when the
+    directory is in force_dirs.
+    :param path: Folder to scan
+    :param include_subdirs: Should subfolders be scanned too?
+    :param extensions: Set built with build_extension_set
+    :param known_dirs: Directory path to mtime_ns from the last scan of this folder
+    :param known_files: Directory path to the files found in it last scan, each mapped to their (mtime_ns, size)
+    :param on_batch: Called with each batch of up to BATCH_SIZE added paths as they are found
+    :param force_dirs: Directories to list again even if their mtime hasn't changed, such as ones files were written in
+    :return: ScanResult of the folder
+    """
+    known_dirs = known_dirs or {}
+    known_files = known_files or {}
+    force_dirs = force_dirs or set()
+
+    result = ScanResult()
+    batch = []
+
+    # subdirectories of each known directory, for walking unchanged directories without listing them
+    known_subdirs = _group_subdirs(path, known_dirs) if include_subdirs else {}
+
+    pending_dirs = [path]
+
+    while len(pending_dirs) > 0:
+        current_dir = pending_dirs.pop()
+
+        try:
+            dir_mtime = os.stat(current_dir).st_mtime_ns
+        except OSError as e:
+            # skip folders that have been removed or can't be read
+            logger.warning("Could not scan %s: %s", current_dir, e)
+            continue
+
+        previous_files = known_files.get(current_dir, {})
+
+        if known_dirs.get(current_dir) == dir_mtime and current_dir not in force_dirs:
+            # nothing was added or removed here since the last scan
+            result.dirs[current_dir] = dir_mtime
+            result.paths.extend(previous_files)
+            result.skipped_dirs += 1
+
+            pending_dirs.extend(reversed(known_subdirs.get(current_dir, [])))
+            continue
+
+        try:
+            with os.scandir(current_dir) as entries:
+                # sort so clips are listed in a stable order
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning("Could not scan %s: %s", current_dir, e)
+            continue
+
+        result.dirs[current_dir] = dir_mtime
+
+        subdirs = []
+        found = set()
+        for entry in entries:
+            try:
+                if entry.is_file() and is_video_file(entry.name, extensions):
+                    stat = entry.stat()
+                    file_state = (stat.st_mtime_ns, stat.st_size)
+                    previous_state = previous_files.get(entry.path)
+
+                    if previous_state is None:
+                        result.added[entry.path] = file_state
+                        batch.append(entry.path)
+                    elif previous_state != file_state:
+                        result.modified[entry.path] = file_state
+
+                    result.paths.append(entry.path)
+                    found.add(entry.path)
+                elif include_subdirs and entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+            except OSError:
+                continue
+
+            if on_batch is not None and len(batch) >= BATCH_SIZE:
+                on_batch(batch)
+                batch = []
+
+        result.removed.extend(file_path for file_path in previous_files if file_path not in found)
+
+        # walk subfolders in name order
+        pending_dirs.extend(reversed(subdirs))
+
+    # files in directories that no longer exist, or are no longer scanned, are gone too
+    for dir_path, files in known_files.items():
+        if dir_path not in result.dirs:
+            result.removed.extend(files)
+
+    if on_batch is not None and len(batch) > 0:
+        on_batch(batch)
+
+    return result
+
+
+def known_paths(path: str, include_subdirs: bool, known_dirs: dict[str, int],
+                known_files: dict[str, dict[str, tuple[int, int]]]) -> list[str]:
+    """
+    Lists a folder's video files from the stored scan state alone, in the same order a scan would, without
+    touching the disk
+    :param path: Folder to list
+    :param include_subdirs: Should subfolders be listed too?
+    :param known_dirs: Directory path to mtime_ns from the last scan of this folder
+    :param known_files: Directory path to the files found in it last scan
+    :return: List of file paths
+    """
+    paths = []
+
+    known_subdirs = _group_subdirs(path, known_dirs) if include_subdirs else {}
+    pending_dirs = [path]
+
+    while len(pending_dirs) > 0:
+        current_dir = pending_dirs.pop()
+
+        if current_dir in known_dirs:
+            paths.extend(known_files.get(current_dir, {}))
+            pending_dirs.extend(reversed(known_subdirs.get(current_dir, [])))
+
+    return paths
+
+
+def scan_folders(clip_folders: list[models.ClipFolder], extensions: frozenset[str],
+                 known_dirs: dict[int, dict[str, int]] | None = None,
+                 known_files: dict[str, dict[str, tuple[int, int]]] | None = None,
+                 on_batch: Callable[[models.ClipFolder, list[str]], None] | None = None,
+                 force_dirs: set[str] | None = None) -> dict[int, ScanResult]:
+    """
+    Scans several clip folders at once
+    :param clip_folders: Folders to scan. Subfolders are included based on each folder's include_subdirs
+    :param extensions: Set built with build_extension_set
+    :param known_dirs: Folder ID to the directory mtimes from that folder's last scan
+    :param known_files: Directory path to the files found in it last scan, shared by every folder
+    :param on_batch: Called from the worker threads with each folder & batch of added paths as they are found
+    :param force_dirs: Directories to list again even if their mtime hasn't changed, see scan_folder
+    :return: A dict of folder ID to the ScanResult of that folder
+    """
+    known_dirs = known_dirs or {}
+    known_files = known_files or {}
+
+    def scan(clip_folder: models.ClipFolder) -> ScanResult:
+        return scan_folder(clip_folder.path, clip_folder.include_subdirs, extensions,
+                           known_dirs.get(clip_folder.db_id),
+                           # only pass the files in this folder's tree, so files elsewhere aren't reported as removed
+                           {dir_path: files for dir_path, files in known_files.items()
+                            if is_within(dir_path, clip_folder.path, clip_folder.include_subdirs)},
+                           None if on_batch is None else partial(on_batch, clip_folder), force_dirs)
+
+    if len(clip_folders) == 0:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(clip_folders)),
+                            thread_name_prefix="ClipMaker scanner") as pool:
+        futures = {clip_folder.db_id: pool.submit(scan, clip_folder) for clip_folder in clip_folders}
+
+        # re-raise any error from the workers
+        return {db_id: future.result() for db_id, future in futures.items()}
+
+
+def find_missing(paths: dict[int, str]) -> set[int]:
+    """
+    Checks which files no longer exist. Checks run on a thread pool, which mostly pays off on network drives.
+    :param paths: Clip ID to the path of its file
+    :return: IDs of the clips whose file can't be found
+    """
+    items = list(paths.items())
+    chunks = [items[index:index + CHECK_CHUNK_SIZE] for index in range(0, len(items), CHECK_CHUNK_SIZE)]
+
+    def check(chunk: list[tuple[int, str]]) -> list[int]:
+        return [db_id for db_id, path in chunk if not os.path.isfile(path)]
+
+    missing = set()
+    if len(chunks) == 0:
+        return missing
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(chunks)), thread_name_prefix="ClipMaker checker") as pool:
+        for chunk_missing in pool.map(check, chunks):
+            missing.update(chunk_missing)
+
+    return missing
+
+
+def is_within(path: str, folder: str, include_subdirs: bool) -> bool:
+    """
+    Checks if a directory is scanned as part of a folder
+    :param path: Directory to check
+    :param folder: Root of the folder
+    :param include_subdirs: Are subfolders of the root scanned?
+    :return: True if the directory is the root, or a subfolder of it when subfolders are included
+    """
+    if path == folder:
+        return True
+
+    return include_subdirs and path.startswith(os.path.join(folder, ""))
+
+
+def update_known_files(known_files: dict[str, dict[str, tuple[int, int]]], result: ScanResult) -> None:
+    """
+    Applies a scan result to an in-memory copy of the file state, so later scans can be compared against it
+    :param known_files: Directory path to the files found in it, each mapped to their (mtime_ns, size)
+    :param result: Result of a scan made against known_files
+    :return:
+    """
+    touched_dirs = set()
+
+    for path in result.removed:
+        dir_path = path.rpartition(os.sep)[0]
+        known_files.get(dir_path, {}).pop(path, None)
+        touched_dirs.add(dir_path)
+
+    for path, file_state in (result.added | result.modified).items():
+        dir_path = path.rpartition(os.sep)[0]
+        known_files.setdefault(dir_path, {})[path] = file_state
+        touched_dirs.add(dir_path)
+
+    # keep files in listing order
+    for dir_path in touched_dirs:
+        if len(known_files.get(dir_path, {})) == 0:
+            known_files.pop(dir_path, None)
+        else:
+            known_files[dir_path] = dict(sorted(known_files[dir_path].items()))
+
+
+def _group_subdirs(path: str, known_dirs: dict[str, int]) -> dict[str, list[str]]:
+    """
+    Groups known directories under their parents
+    :param path: Root of the folder
+    :param known_dirs: Directory path to mtime_ns from the last scan of the folder
+    :return: Directory path to its known subdirectories, in name order
+    """
+    known_subdirs: dict[str, list[str]] = {}
+
+    for dir_path in sorted(known_dirs):
+        if dir_path != path:
+            known_subdirs.setdefault(os.path.dirname(dir_path), []).append(dir_path)
+
+    return known_subdirs
@@ -0,0 +1,214 @@
+"""
+Developed by Keagan B
+ClipMaker -- sprite_sheets.py
+
+Builds scrub preview sprite sheets: small frames taken at fixed intervals through a clip, tiled into one image by a
+single ffmpeg pass. Sheets are kept in the thumbnail cache, and their layout comes from the clip's probed length.
+"""
+from __future__ import annotations
+
+from typing import Callable
+import subprocess
+import threading
+import thumbnails
+import hashlib
+import logging
+import ffmpeg
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+# size of each frame on the sheet, in pixels
+TILE_WIDTH = 160
+TILE_HEIGHT = 90
+
+# frames per row of the sheet
+COLUMNS = 10
+
+# most frames on one sheet, longer clips get a longer interval instead
+MAX_FRAMES = 100
+
+# shortest gap between frames, in milliseconds
+MIN_INTERVAL_MS = 1000
+
+# seconds before building a sheet is given up on
+GENERATE_TIMEOUT = 120
+
+
+class SpriteSheet:
+    """
+    A built sprite sheet & where each frame is on it
+    """
+
+    def __init__(self, path: str, interval_ms: int, frame_count: int):
+        self.path = path
+        self.interval_ms = interval_ms
+        self.frame_count = frame_count
+
+    def get_tile_position(self, milliseconds: int) -> tuple[int, int]:
+        """
+        :param milliseconds: Time in the clip
+        :return: Top left corner of the frame closest before that time, in pixels on the sheet
+        """
+        index = max(0, min(self.frame_count - 1, milliseconds // self.interval_ms))
+
+        return (index % COLUMNS) * TILE_WIDTH, (index // COLUMNS) * TILE_HEIGHT
+
+
+class SpriteSheetGenerator(threading.Thread):
+    """
+    Builds sprite sheets one at a time on a background thread. Only the latest request is kept, since only the
+    selected clip's sheet is shown.
+    """
+
+    def __init__(self, cache: thumbnails.ThumbnailCache, on_done: Callable[[int, SpriteSheet | None], None]):
+        """
+        :param cache: Cache to read & store sheets in
+        :param on_done: Called from the thread with the clip ID & its sheet, or None if one couldn't be built
+        """
+        threading.Thread.__init__(self, name="ClipMaker sprite sheets", daemon=True)
+
+        self.cache = cache
+        self.on_done = on_done
+
+        self._request: tuple[int, str, int] | None = None
+        self._condition = threading.Condition()
+        self._stopped = False
+
+        # only warn about a missing ffmpeg once
+        self._warned = False
+
+    def request(self, clip_id: int, path: str, duration_ms: int) -> None:
+        """
+        Asks for a clip's sheet, replacing any request that hasn't started
+        :param clip_id: ID of the clip
+        :param path: Path of the clip's file
+        :param duration_ms: Length of the clip
+        :return:
+        """
+        with self._condition:
+            self._request = (clip_id, path, duration_ms)
+            self._condition.notify()
+
+    def stop(self) -> None:
+        """
+        Stops the thread once the current sheet is done
+        :return:
+        """
+        with self._condition:
+            self._stopped = True
+            self._request = None
+            self._condition.notify()
+
+        if self.is_alive():
+            self.join()
+
+    def run(self) -> None:
+        while True:
+            with self._condition:
+                while self._request is None and not self._stopped:
+                    self._condition.wait()
+
+                if self._stopped:
+                    return
+
+                clip_id, path, duration_ms = self._request
+                self._request = None
+
+            try:
+                sheet = self._make_sheet(path, duration_ms)
+            except FileNotFoundError:
+                if not self._warned:
+                    logger.warning("ffmpeg could not be found, scrub previews won't be shown until it is installed")
+                    self._warned = True
+                sheet = None
+            except Exception:
+                logger.exception("Could not build a sprite sheet for %s", path)
+                sheet = None
+
+            self.on_done(clip_id, sheet)
+
+    def _make_sheet(self, path: str, duration_ms: int) -> SpriteSheet | None:
+        """
+        Finds a clip's sheet in the cache, or builds it with ffmpeg
+        :param path: Path of the clip's file
+        :param duration_ms: Length of the clip
+        :return: The clip's SpriteSheet, or None if the clip couldn't be read
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        interval_ms, frame_count = get_layout(duration_ms)
+        key = get_key(path, stat.st_mtime_ns, stat.st_size, interval_ms)
+
+        sheet_path = self.cache.get(key)
+        if sheet_path is None:
+            data = generate(path, interval_ms, frame_count)
+            if data is None:
+                return None
+
+            sheet_path = self.cache.put(key, data)
+
+        return SpriteSheet(sheet_path, interval_ms, frame_count)
+
+
+def get_layout(duration_ms: int) -> tuple[int, int]:
+    """
+    :param duration_ms: Length of the clip
+    :return: Milliseconds between frames & the number of frames on the clip's sheet
+    """
+    interval_ms = max(MIN_INTERVAL_MS, math.ceil(duration_ms / MAX_FRAMES))
+
+    return interval_ms, max(1, math.ceil(duration_ms / interval_ms))
+
+
+def get_key(path: str, mtime_ns: int, size: int, interval_ms: int) -> str:
+    """
+    :param path: Path of the clip's file
+    :param mtime_ns: mtime of the file
+    :param size: Size of the file in bytes
+    :param interval_ms: Milliseconds between frames
+    :return: Cache key of the file's sheet
+    """
+    return hashlib.sha1(f"{path}\0{mtime_ns}\0{size}\0sprites {interval_ms} {COLUMNS} "
+                        f"{TILE_WIDTH}x{TILE_HEIGHT}".encode()).hexdigest()
+
+
+def generate(path: str, interval_ms: int, frame_count: int) -> bytes | None:
+    """
+    Builds a sheet in one ffmpeg pass. Only keyframes are decoded, which is far faster on long clips and close
+    enough for a preview.
+    :param path: Path of the clip's file
+    :param interval_ms: Milliseconds between frames
+    :param frame_count: Number of frames on the sheet
+    :return: PNG data of the sheet, or None if ffmpeg failed
+    """
+    rows = math.ceil(frame_count / COLUMNS)
+
+    process = (
+        ffmpeg.input(path, skip_frame="nokey")
+        .filter("fps", fps=f"1000/{interval_ms}")
+        .filter("scale", TILE_WIDTH, TILE_HEIGHT, force_original_aspect_ratio="decrease")
+        .filter("pad", TILE_WIDTH, TILE_HEIGHT, "(ow-iw)/2", "(oh-ih)/2")
+        .filter("tile", f"{COLUMNS}x{rows}")
+        .output("pipe:", vframes=1, format="image2", vcodec="png")
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
+
+    try:
+        data, stderr = process.communicate(timeout=GENERATE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+
+        logger.warning("Gave up on a sprite sheet for %s after %d seconds", path, GENERATE_TIMEOUT)
+        return None
+
+    if process.returncode != 0:
+        logger.debug("ffmpeg could not read %s: %s", path, stderr.decode(errors="replace"))
+        return None
+
+    return data if len(data) > 0 else None
@@ -0,0 +1,153 @@
+"""
+Developed by Keagan B
+ClipMaker -- tag_index.py
+
+In-memory inverted index from tags to the clips they are on. Each tag keeps a bitset (a Python int) where
+bit N is set when the clip with database ID N has the tag, so filters are evaluated as bitwise ANDs.
+"""
+from __future__ import annotations
+
+# bit positions set in every possible byte value, used to turn bitsets back into IDs
+_BYTE_BITS: list[tuple[int, ...]] = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+class TagIndex:
+    """
+    Keeps a clip bitset for every tag
+    """
+
+    def __init__(self):
+        self.bitsets: dict[int, int] = {}
+
+    def build(self, rows: list) -> None:
+        """
+        Rebuilds the index from scratch
+        :param rows: (clip_id, tag_id) pairs, typically every row of clip_to_tags
+        :return:
+        """
+        # group clip ids by tag first, then set all bits for a tag in one go
+        tag_clips: dict[int, list[int]] = {}
+        for clip_id, tag_id in rows:
+            tag_clips.setdefault(tag_id, []).append(clip_id)
+
+        self.bitsets = {tag_id: _bits_from_ids(clip_ids) for tag_id, clip_ids in tag_clips.items()}
+
+    def add(self, clip_id: int, tag_id: int) -> None:
+        """
+        Marks a tag as being on a clip
+        :param clip_id: ID of clip
+        :param tag_id: ID of tag
+        :return:
+        """
+        self.bitsets[tag_id] = self.bitsets.get(tag_id, 0) | (1 << clip_id)
+
+    def remove(self, clip_id: int, tag_id: int) -> None:
+        """
+        Marks a tag as no longer being on a clip
+        :param clip_id: ID of clip
+        :param tag_id: ID of tag
+        :return:
+        """
+        if tag_id in self.bitsets:
+            self.bitsets[tag_id] &= ~(1 << clip_id)
+
+    def remove_tag(self, tag_id: int) -> None:
+        """
+        Drops a tag from the index
+        :param tag_id: ID of tag
+        :return:
+        """
+        self.bitsets.pop(tag_id, None)
+
+    def remove_clips(self, clip_ids: list[int]) -> None:
+        """
+        Clears clips from every tag in the index
+        :param clip_ids: IDs of the clips to clear
+        :return:
+        """
+        mask = ~_bits_from_ids(clip_ids)
+
+        for tag_id in self.bitsets:
+            self.bitsets[tag_id] &= mask
+
+    def match(self, tag_ids: list[int]) -> int:
+        """
+        Finds the clips that have every tag in a list
+        :param tag_ids: IDs of the tags to match. Must not be empty
+        :return: Bitset of matching clips
+        """
+        # start with the rarest tag so the running result shrinks as fast as possible
+        bitsets = sorted((self.bitsets.get(tag_id, 0) for tag_id in tag_ids), key=int.bit_count)
+
+        result = bitsets[0]
+        for bits in bitsets[1:]:
+            if result == 0:
+                break
+
+            result &= bits
+
+        return result
+
+    def match_ids(self, tag_ids: list[int]) -> ClipBitset:
+        """
+        Finds the clips that have every tag in a list
+        :param tag_ids: IDs of the tags to match. Must not be empty
+        :return: ClipBitset of matching clip IDs
+        """
+        return ClipBitset(self.match(tag_ids))
+
+
+class ClipBitset:
+    """
+    Read-only view of a bitset that supports fast `in` checks by clip ID
+    """
+
+    def __init__(self, bits: int):
+        self.bits = bits
+
+        # byte lookups are O(1), unlike shifting the full int for every check
+        self._data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+    def __contains__(self, db_id: int) -> bool:
+        index = db_id >> 3
+        return index < len(self._data) and bool(self._data[index] >> (db_id & 7) & 1)
+
+    def __iter__(self):
+        return iter(sorted(ids_from_bits(self.bits)))
+
+    def __len__(self) -> int:
+        return self.bits.bit_count()
+
+
+def ids_from_bits(bits: int) -> set[int]:
+    """
+    Converts a bitset into the set of IDs it contains
+    :param bits: Bitset to convert
+    :return: Set of IDs whose bits are set
+    """
+    ids = set()
+
+    # walk the bitset a byte at a time, skipping empty bytes
+    for offset, value in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, "little")):
+        if value:
+            base = offset * 8
+            ids.update(base + bit for bit in _BYTE_BITS[value])
+
+    return ids
+
+
+def _bits_from_ids(ids: list[int]) -> int:
+    """
+    Converts a list of IDs into a bitset
+    :param ids: IDs to set
+    :return: Bitset with each ID's bit set
+    """
+    if len(ids) == 0:
+        return 0
+
+    # build the bitset as a byte array, which is far cheaper than OR-ing one shifted int per ID
+    data = bytearray(max(ids) // 8 + 1)
+    for db_id in ids:
+        data[db_id >> 3] |= 1 << (db_id & 7)
+
+    return int.from_bytes(data, "little")
@@ -0,0 +1,390 @@
+"""
+Developed by Keagan B
+ClipMaker -- thumbnails.py
+
+Extracts a representative frame from each clip with ffmpeg and keeps it in a size bounded, least recently used
+cache on disk. Thumbnails are named after a hash of the clip's path, size & mtime, so a changed file gets a new
+thumbnail and stale ones age out of the cache on their own.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Callable
+import subprocess
+import threading
+import hashlib
+import logging
+import ffmpeg
+import heapq
+import os
+
+logger = logging.getLogger(__name__)
+
+# thumbnail size in pixels. The clip tree shows them at a quarter of this
+THUMBNAIL_WIDTH = 160
+THUMBNAIL_HEIGHT = 90
+
+# where thumbnails are stored, and how many bytes they can take up
+CACHE_DIR = "./thumbnails"
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# max number of ffmpeg processes running at once
+MAX_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+
+# how far into the clip frames are picked from, as a fraction of its length
+FRAME_POSITION = 0.1
+
+# number of frames ffmpeg's thumbnail filter picks the most representative frame from
+SAMPLE_FRAMES = 30
+
+# seconds before a single extraction is given up on
+EXTRACT_TIMEOUT = 30
+
+
+class ThumbnailCache:
+    """
+    Content addressed thumbnail files, evicting the least recently used once over max_bytes.
+    Recency is kept in each file's mtime, so it carries over between runs.
+    """
+
+    def __init__(self, path: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        # key -> file size, least recently used first. Loaded from disk on first use
+        self._entries: OrderedDict[str, int] | None = None
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        """
+        Looks up a thumbnail, marking it as recently used
+        :param key: Key from get_key
+        :return: Path of the thumbnail file, or None if it isn't cached
+        """
+        with self._lock:
+            self._load()
+
+            if key not in self._entries:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+
+        file_path = self._get_file_path(key)
+
+        try:
+            os.utime(file_path)
+        except OSError:
+            # removed outside the app
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+            return None
+
+        return file_path
+
+    def put(self, key: str, data: bytes) -> str:
+        """
+        Stores a thumbnail, evicting old ones if the cache is full
+        :param key: Key from get_key
+        :param data: PNG file contents
+        :return: Path of the thumbnail file
+        """
+        file_path = self._get_file_path(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        # write to a temporary file first, so a half written thumbnail is never read
+        temp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, file_path)
+
+        with self._lock:
+            self._load()
+
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+
+            evicted = self._evict()
+
+        for evicted_key in evicted:
+            try:
+                os.remove(self._get_file_path(evicted_key))
+            except OSError:
+                pass
+
+        return file_path
+
+    def get_stats(self) -> dict:
+        """
+        :return: Entry count, bytes used, hits, misses & hit rate of the cache
+        """
+        with self._lock:
+            self._load()
+            lookups = self.hits + self.misses
+
+            return {"entries": len(self._entries), "bytes": self._total_bytes, "hits": self.hits,
+                    "misses": self.misses, "hit_rate": self.hits / lookups if lookups > 0 else 0.0}
+
+    def _load(self) -> None:
+        """
+        Reads the cached files from disk, oldest first. Call with the lock held.
+        :return:
+        """
+        if self._entries is not None:
+            return
+
+        found = []
+        if os.path.isdir(self.path):
+            for dir_entry in os.scandir(self.path):
+                if not dir_entry.is_dir():
+                    continue
+
+                for entry in os.scandir(dir_entry.path):
+                    if entry.name.endswith(".png"):
+                        stat = entry.stat()
+                        found.append((stat.st_mtime_ns, entry.name[:-4], stat.st_size))
+                    elif entry.name.endswith(".tmp"):
+                        # left behind by a crash
+                        os.remove(entry.path)
+
+        found.sort()
+
+        self._entries = OrderedDict((key, size) for _mtime_ns, key, size in found)
+        self._total_bytes = sum(self._entries.values())
+
+    def _evict(self) -> list[str]:
+        """
+        Drops the least recently used entries until the cache fits. Call with the lock held.
+        :return: Keys of the dropped entries, whose files should be removed
+        """
+        evicted = []
+
+        # always keep the newest entry, even if it's bigger than the whole cache
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            evicted.append(key)
+
+        return evicted
+
+    def _get_file_path(self, key: str) -> str:
+        """
+        :param key: Key from get_key
+        :return: Path of the key's file, split into subfolders by the first two characters
+        """
+        return os.path.join(self.path, key[:2], f"{key}.png")
+
+
+class ThumbnailGenerator:
+    """
+    Pool of worker threads that make thumbnails in priority order. Each ffmpeg runs in its own process, so threads
+    are enough to keep several going at once.
+    """
+
+    def __init__(self, cache: ThumbnailCache, on_done: Callable[[int, str | None], None],
+                 max_workers: int = MAX_WORKERS):
+        """
+        :param cache: Cache to read & store thumbnails in
+        :param on_done: Called from a worker with the clip ID & path of its thumbnail, or None if it couldn't be made
+        :param max_workers: Number of worker threads
+        """
+        self.cache = cache
+        self.on_done = on_done
+
+        # (priority, order, clip ID), lowest priority first. Entries whose priority changed are skipped
+        self._heap: list[tuple[int, int, int]] = []
+        self._requests: dict[int, tuple[int, str, int | None]] = {}
+        self._order = 0
+
+        # clips that failed this run, so they aren't retried over & over
+        self._failed: set[int] = set()
+
+        self._condition = threading.Condition()
+        self._accepting = True
+        self._stopped = False
+
+        self._workers = [threading.Thread(target=self._run, name=f"ClipMaker thumbnails {index}", daemon=True)
+                         for index in range(max_workers)]
+
+    def start(self) -> None:
+        """
+        Starts the worker threads
+        :return:
+        """
+        for worker in self._workers:
+            worker.start()
+
+    def stop(self) -> None:
+        """
+        Drops waiting requests & stops the workers once their current thumbnail is done
+        :return:
+        """
+        self.stop_requests()
+
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.join()
+
+    def request(self, clip_id: int, path: str, duration_ms: int | None, priority: int) -> None:
+        """
+        Asks for a clip's thumbnail. Asking again with a lower priority moves the clip up the queue.
+        :param clip_id: ID of the clip
+        :param path: Path of the clip's file
+        :param duration_ms: Length of the clip if known, used to pick where frames are taken from
+        :param priority: Lower numbers are made first
+        :return:
+        """
+        with self._condition:
+            if not self._accepting or clip_id in self._failed:
+                return
+
+            previous = self._requests.get(clip_id)
+            if previous is not None and previous[0] <= priority:
+                return
+
+            self._requests[clip_id] = (priority, path, duration_ms)
+
+            heapq.heappush(self._heap, (priority, self._order, clip_id))
+            self._order += 1
+
+            self._condition.notify()
+
+    def stop_requests(self) -> None:
+        """
+        Drops waiting requests & ignores any new ones
+        :return:
+        """
+        with self._condition:
+            self._accepting = False
+            self._heap.clear()
+            self._requests.clear()
+
+    def pending(self) -> int:
+        """
+        :return: Number of thumbnails waiting to be made
+        """
+        with self._condition:
+            return len(self._requests)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                request = self._next_request()
+                while request is None and not self._stopped:
+                    self._condition.wait()
+                    request = self._next_request()
+
+                if self._stopped:
+                    return
+
+            clip_id, path, duration_ms = request
+
+            try:
+                thumbnail_path = self._make_thumbnail(path, duration_ms)
+            except FileNotFoundError:
+                # ffmpeg isn't installed, nothing can be made
+                logger.warning("ffmpeg could not be found, thumbnails won't be made until it is installed")
+                self.stop_requests()
+                thumbnail_path = None
+            except Exception:
+                logger.exception("Could not make a thumbnail for %s", path)
+                thumbnail_path = None
+
+            if thumbnail_path is None:
+                with self._condition:
+                    self._failed.add(clip_id)
+
+            self.on_done(clip_id, thumbnail_path)
+
+    def _next_request(self) -> tuple[int, str, int | None] | None:
+        """
+        Pops the highest priority request. Call with the lock held.
+        :return: (clip ID, path, duration_ms), or None if nothing is waiting
+        """
+        while len(self._heap) > 0:
+            priority, _order, clip_id = heapq.heappop(self._heap)
+
+            request = self._requests.get(clip_id)
+            if request is not None and request[0] == priority:
+                del self._requests[clip_id]
+                return clip_id, request[1], request[2]
+
+        return None
+
+    def _make_thumbnail(self, path: str, duration_ms: int | None) -> str | None:
+        """
+        Finds a clip's thumbnail in the cache, or extracts it with ffmpeg
+        :param path: Path of the clip's file
+        :param duration_ms: Length of the clip if known
+        :return: Path of the thumbnail file, or None if the clip couldn't be read
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        key = get_key(path, stat.st_mtime_ns, stat.st_size)
+
+        thumbnail_path = self.cache.get(key)
+        if thumbnail_path is not None:
+            return thumbnail_path
+
+        data = extract_frame(path, duration_ms)
+        if data is None:
+            return None
+
+        return self.cache.put(key, data)
+
+
+def get_key(path: str, mtime_ns: int, size: int) -> str:
+    """
+    :param path: Path of the clip's file
+    :param mtime_ns: mtime of the file
+    :param size: Size of the file in bytes
+    :return: Cache key of the file's thumbnail
+    """
+    return hashlib.sha1(f"{path}\0{mtime_ns}\0{size}\0{THUMBNAIL_WIDTH}x{THUMBNAIL_HEIGHT}".encode()).hexdigest()
+
+
+def extract_frame(path: str, duration_ms: int | None) -> bytes | None:
+    """
+    Picks a representative frame from a clip with ffmpeg's thumbnail filter
+    :param path: Path of the clip's file
+    :param duration_ms: Length of the clip if known. Frames are taken from FRAME_POSITION into it
+    :return: PNG data of the frame, scaled to fit THUMBNAIL_WIDTH x THUMBNAIL_HEIGHT, or None if ffmpeg failed
+    """
+    start = 0 if duration_ms is None else duration_ms * FRAME_POSITION / 1000
+
+    process = (
+        ffmpeg.input(path, ss=start)
+        .filter("thumbnail", SAMPLE_FRAMES)
+        .filter("scale", THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT, force_original_aspect_ratio="decrease")
+        .output("pipe:", vframes=1, format="image2", vcodec="png")
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
+
+    try:
+        data, stderr = process.communicate(timeout=EXTRACT_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+
+        logger.warning("Gave up on a thumbnail for %s after %d seconds", path, EXTRACT_TIMEOUT)
+        return None
+
+    if process.returncode != 0:
+        logger.debug("ffmpeg could not read %s: %s", path, stderr.decode(errors="replace"))
+        return None
+
+    # clips shorter than the start point give no frames
+    return data if len(data) > 0 else None
@@ -12,16 +12,31 @@ Each window is defined as its own function, and is placed on the UI stack throug
 from __future__ import annotations
 
 from utils import get_time_from_milliseconds, get_milliseconds_from_time
-from media_player import MediaPlayer, MediaSlider
-from tkinter import filedialog
+from media_player import MediaPlayer, MediaSlider, WaveformCanvas
+from tkinter import filedialog, messagebox
+from collections import OrderedDict, deque
 from functools import partial
 from tkinter import ttk
 import tkinter as tk
 import media_handler
+import export_queue
+import media_probe
+import threading
+import logging
+import queue
+import time
 import db_handler
+import db_profiler
+import folder_watcher
+import scanner
+import thumbnails
+import sprite_sheets
+import waveforms
 
 from models import *
 
+logger = logging.getLogger(__name__)
+
 ROOT: tk.Tk | None = None
 ACTIVE_FRAME = (None, None)
 PREVIOUS_FRAMES = []
@@ -31,6 +46,8 @@ TAG_SECTIONS: list[TagSection] = []
 CLIP_FOLDERS: list[ClipFolder] = []
 CURRENT_CLIP: Clip | None = None
 CURRENT_FILTER = []
+# clip IDs matching the search box, or None when not searching
+CURRENT_SEARCH: set[int] | None = None
 MEDIA_PLAYER: MediaPlayer | None = None
 
 VIDEO_SCALE = 1
@@ -41,10 +58,97 @@ TREE_MENU: tk.Menu | None = None
 
 VIDEO_EXTENSIONS: list[str] = []
 
-
-def create_ui() -> tk.Tk:
+# milliseconds to wait after a clip edit before writing it, so quick edits are merged
+EDIT_FLUSH_DELAY_MS = 1000
+EDIT_FLUSH_TIMER: str | None = None
+
+# milliseconds to wait after the last key press before searching
+SEARCH_DELAY_MS = 250
+SEARCH_TIMER: str | None = None
+
+# directory & file state from the last folder scan, see scanner.scan_folder
+KNOWN_DIRS: dict[int, dict[str, int]] = {}
+KNOWN_FILES: dict[str, dict[str, tuple[int, int]]] = {}
+
+# milliseconds between checks for folder changes
+WATCH_CHECK_MS = 500
+FOLDER_WATCHER: folder_watcher.FolderWatcher | None = None
+
+# rows waiting to be added to the clip tree, as (folder node, clip) pairs. Filled a chunk at a time so large
+# libraries don't freeze the UI
+TREE_QUEUE: deque[tuple[str, Clip]] = deque()
+TREE_CHUNK_SIZE = 500
+TREE_FEED_JOB: str | None = None
+TREE_FEED_TOTAL = 0
+
+# background folder scan, and the updates it sends back to the UI thread
+SCAN_THREAD: threading.Thread | None = None
+SCAN_UPDATES: queue.Queue = queue.Queue()
+SCAN_STARTED_AT = 0.0
+# folders waiting for the running scan to finish, & directories the watcher saw change in them
+PENDING_SCAN_FOLDERS: list[ClipFolder] = []
+PENDING_FORCE_DIRS: set[str] = set()
+# milliseconds between checks for scan updates
+SCAN_CHECK_MS = 100
+
+# IDs of clips whose files couldn't be found by the last check, or None if it hasn't run
+MISSING_CLIPS: set[int] | None = None
+MISSING_CHECKED_AT = 0.0
+# seconds before the missing clip check is run again
+MISSING_CHECK_MAX_AGE = 300
+
+# background thread reading clip details with ffprobe, if one is running
+PROBE_THREAD: threading.Thread | None = None
+PROBE_UPDATES: queue.Queue = queue.Queue()
+PROBE_STOP = threading.Event()
+# set when clips changed while probing, so another pass runs after
+PROBE_PENDING = False
+PROBE_TOTAL = 0
+PROBE_DONE = 0
+# milliseconds between checks for probe updates
+PROBE_CHECK_MS = 250
+
+# thumbnail workers, started with the library
+THUMBNAILS: thumbnails.ThumbnailGenerator | None = None
+THUMBNAIL_RESULTS: queue.Queue = queue.Queue()
+# clip ID to its thumbnail file, or None if one couldn't be made
+THUMBNAIL_PATHS: dict[int, str | None] = {}
+# clip tree images by clip ID, least recently shown first
+TREE_IMAGES: OrderedDict[int, tk.PhotoImage] = OrderedDict()
+TREE_IMAGE_LIMIT = 1000
+# clip tree images are shrunk by this factor
+TREE_IMAGE_SUBSAMPLE = 4
+# clip IDs of the rows on screen, top to bottom
+VISIBLE_CLIP_IDS: list[int] = []
+# set once every clip has been queued for a thumbnail, cleared when new clips show up
+THUMBNAILS_BACKFILLED = False
+# thumbnails for rows on screen come first, then everything else in clip tree order
+BACKFILL_PRIORITY = 1_000_000
+# milliseconds between checks for new thumbnails & scrolling
+THUMBNAIL_CHECK_MS = 200
+
+# scrub preview builder, sharing the thumbnail cache
+SPRITE_SHEETS: sprite_sheets.SpriteSheetGenerator | None = None
+SPRITE_RESULTS: queue.Queue = queue.Queue()
+
+# audio waveform builder, None without numpy
+WAVEFORMS: waveforms.WaveformGenerator | None = None
+WAVEFORM_RESULTS: queue.Queue = queue.Queue()
+
+# background exports, started with the first export
+EXPORT_QUEUE: export_queue.ExportQueue | None = None
+# jobs changed since the export popup last refreshed, by job ID. Only the latest state of each job is kept,
+# so updates made while the popup is closed can't pile up
+EXPORT_UPDATES: dict[int, export_queue.ExportJob] = {}
+EXPORT_UPDATES_LOCK = threading.Lock()
+EXPORT_POPUP: tk.Toplevel | None = None
+EXPORT_CHECK_MS = 200
+
+
+def create_ui(start_time: float | None = None) -> tk.Tk:
     """
-    Creates the base UI for the app
+    Creates the base UI for the app. The library is loaded once the window is up.
+    :param start_time: time.perf_counter() value from app start, used to log how long startup took
     """
     global ROOT, MEDIA_PLAYER, TAG_SECTIONS
 
@@ -71,6 +175,26 @@ def create_ui() -> tk.Tk:
     # bind clip tree variable, so it can be used in other functions
     root.clip_tree = clip_tree
 
+    # make rows tall enough for thumbnails
+    ttk.Style(root).configure("Treeview", rowheight=-(-thumbnails.THUMBNAIL_HEIGHT // TREE_IMAGE_SUBSAMPLE) + 4)
+
+    search_label = tk.Label(clip_list_frame, text="Search:")
+    search_variable = tk.StringVar()
+    search_entry = tk.Entry(clip_list_frame, textvariable=search_variable)
+
+    root.search_variable = search_variable
+
+    # add callback for variable editing
+    search_variable.trace_add("write", queue_search)
+
+    # library loading status
+    status_variable = tk.StringVar()
+    status_label = tk.Label(clip_list_frame, textvariable=status_variable)
+    status_bar = ttk.Progressbar(clip_list_frame, mode="determinate")
+
+    root.status_variable = status_variable
+    root.status_bar = status_bar
+
     # - playback frame -
     MEDIA_PLAYER = MediaPlayer(root, VIDEO_WIDTH, VIDEO_HEIGHT, VIDEO_SCALE)
 
@@ -81,11 +205,17 @@ def create_ui() -> tk.Tk:
     skip_back_btn = tk.Button(media_control_frame, text="<--", command=lambda: MEDIA_PLAYER.skip(-15000))
     skip_forward_btn = tk.Button(media_control_frame, text="-->", command=lambda: MEDIA_PLAYER.skip(15000))
 
-    media_slider = MediaSlider(media_control_frame, to=1000, command=MEDIA_PLAYER.move_slider)
+    media_slider = MediaSlider(media_control_frame, to=1000, command=MEDIA_PLAYER.move_slider,
+                               on_release=MEDIA_PLAYER.release_slider)
 
     # bind media slider variable to be accessed from the Media Player
     root.media_slider = media_slider
 
+    # audio waveform under the slider, for picking trim points
+    waveform_canvas = WaveformCanvas(media_control_frame, on_pick_start=pick_start_time, on_pick_end=pick_end_time)
+
+    root.waveform = waveform_canvas
+
     media_timer = tk.Label(media_control_frame, text="00:00")
     # bind media timer variable to be access from the Media Player
     root.media_timer = media_timer
@@ -145,6 +275,18 @@ def create_ui() -> tk.Tk:
     # bind duration entry to root
     root.duration_variable = duration_variable
 
+    media_label = tk.Label(clip_info_frame, text="Video:")
+    media_variable = tk.StringVar()
+    media_entry = tk.Entry(clip_info_frame, state=tk.DISABLED, textvariable=media_variable)
+
+    # bind media info entry to root
+    root.media_variable = media_variable
+
+    thumbnail_label = tk.Label(clip_info_frame)
+
+    # bind thumbnail to root
+    root.thumbnail_label = thumbnail_label
+
     favorite_label = tk.Label(clip_info_frame, text="Favorite: ")
     favorite_variable = tk.BooleanVar()
     favorite_box = tk.Checkbutton(clip_info_frame, variable=favorite_variable, command=set_favorite)
@@ -178,10 +320,16 @@ def create_ui() -> tk.Tk:
         clip_list_frame.columnconfigure(i, weight=1)
 
     # set clip list frame grid rows
-    for i in range(12):
+    for i in range(14):
         clip_list_frame.rowconfigure(i, weight=1)
 
     clip_tree.grid(row=0, column=0, rowspan=12, columnspan=5)
+
+    search_label.grid(row=12, column=0)
+    search_entry.grid(row=12, column=1, columnspan=4, sticky="EW")
+
+    status_label.grid(row=13, column=0, columnspan=2, sticky="W")
+    status_bar.grid(row=13, column=2, columnspan=3, sticky="EW")
     filter_button.grid(row=6, column=0)
 
     # - media control frame -
@@ -200,6 +348,9 @@ def create_ui() -> tk.Tk:
 
     media_slider.grid(row=0, column=2, columnspan=9, sticky="EW")
 
+    if waveforms.is_available():
+        waveform_canvas.grid(row=2, column=2, columnspan=9, sticky="EW")
+
     media_timer.grid(row=0, column=11, columnspan=2)
 
     previous_btn.grid(row=1, column=2, columnspan=2)
@@ -220,7 +371,7 @@ def create_ui() -> tk.Tk:
         clip_info_frame.columnconfigure(i, weight=1)
 
     # set clip list frame grid rows
-    for i in range(13):
+    for i in range(15):
         clip_info_frame.rowconfigure(i, weight=1)
 
     name_label.grid(row=0, column=0, columnspan=2)
@@ -232,11 +383,16 @@ def create_ui() -> tk.Tk:
     duration_label.grid(row=2, column=0, columnspan=2)
     duration_entry.grid(row=2, column=2, columnspan=3)
 
-    favorite_label.grid(row=3, column=0, columnspan=2)
-    favorite_box.grid(row=3, column=3)
+    media_label.grid(row=3, column=0, columnspan=2)
+    media_entry.grid(row=3, column=2, columnspan=3)
+
+    favorite_label.grid(row=4, column=0, columnspan=2)
+    favorite_box.grid(row=4, column=3)
+
+    tags_label.grid(row=5, column=0)
+    tag_list.grid(row=6, column=0, rowspan=8, columnspan=5)
 
-    tags_label.grid(row=4, column=0)
-    tag_list.grid(row=5, column=0, rowspan=8, columnspan=5)
+    thumbnail_label.grid(row=14, column=0, columnspan=5)
 
     root.protocol("WM_DELETE_WINDOW", close_app)
 
@@ -244,6 +400,11 @@ def create_ui() -> tk.Tk:
 
     # == Clip Tree Context ==
 
+    # how exact export cuts have to be, shared by both menus
+    export_precision_variable = tk.StringVar(value=media_handler.FRAME_PRECISION)
+
+    root.export_precision_variable = export_precision_variable
+
     # directory menu
     tree_dir_menu = tk.Menu(clip_list_frame, tearoff=0)
 
@@ -252,6 +413,10 @@ def create_ui() -> tk.Tk:
     tree_dir_menu.add_command(label="Export Folder", command=export_clips)
     tree_dir_menu.add_separator()
     tree_dir_menu.add_command(label="Refresh Clips", command=refresh_clips)
+    tree_dir_menu.add_command(label="Missing Clips", command=create_missing_clips_popup)
+    tree_dir_menu.add_cascade(label="Export Precision",
+                              menu=create_precision_menu(tree_dir_menu, export_precision_variable))
+    # kept last, it is swapped out each time the menu opens
     tree_dir_menu.add_command(label="Unhide Clips", command=unhide_clips)
 
     root.tree_dir_menu = tree_dir_menu
@@ -261,6 +426,8 @@ def create_ui() -> tk.Tk:
 
     tree_clip_menu.add_command(label="Hide Clip", command=hide_clip)
     tree_clip_menu.add_command(label="Export Clip", command=export_clips)
+    tree_clip_menu.add_cascade(label="Export Precision",
+                               menu=create_precision_menu(tree_clip_menu, export_precision_variable))
 
     root.tree_clip_menu = tree_clip_menu
 
@@ -270,11 +437,8 @@ def create_ui() -> tk.Tk:
     # generate tag menu
     root.tag_menu = create_tags_menu()
 
-    # set CLIP FOLDER info
-    rescan_folders()
-
-    # populate clip tree
-    refresh_clips()
+    # load the library once the window is showing
+    root.after_idle(start_library, start_time)
 
     # == bind events ==
 
@@ -290,22 +454,9 @@ def create_ui() -> tk.Tk:
     # bind spacebar to pause/resume
     ROOT.bind("<space>", MEDIA_PLAYER.change_play_state)
 
-    # start delayed commits
-    delayed_commit()
-
     return root
 
 
-def delayed_commit():
-    """
-    Delays all commits to a single point in time, allowing for the app to appear to be running smoothly
-    :return:
-    """
-    db_handler.DB_OBJ.commit()
-
-    ROOT.after(1000, delayed_commit)
-
-
 def tree_menu_popups(event):
     """
     Handles context menu events on the clip tree
@@ -350,6 +501,7 @@ def tree_menu_popups(event):
         popup_menu.grab_release()
 
 
+@db_profiler.track_action
 def add_folder():
     """
     Add a new folder to the clip folder view
@@ -363,15 +515,24 @@ def add_folder():
         return
 
     # check if directory is already in database
-    if db_handler.does_dir_exist(new_folder) is None:
+    folder_id = db_handler.does_dir_exist(new_folder)
+    if folder_id is None:
+        # ask whether clips in subfolders should be picked up too
+        include_subdirs = messagebox.askyesno("Add Folder", "Include clips in subfolders?")
+
         # add new folder to database if it doesn't exist
-        db_handler.add_dir(new_folder)
+        clip_folder = db_handler.add_dir(new_folder, include_subdirs)
+        CLIP_FOLDERS.append(clip_folder)
 
-    # refresh the loaded clips
-    rescan_folders()
-    refresh_clips()
+        # show the folder right away, its clips are added as the scan finds them
+        refresh_clips()
+    else:
+        clip_folder = next(clip_folder for clip_folder in CLIP_FOLDERS if clip_folder.db_id == folder_id)
+
+    start_background_scan([clip_folder])
 
 
+@db_profiler.track_action
 def remove_folder():
     """
     Delete a folder from the database & clip tree view
@@ -379,104 +540,809 @@ def remove_folder():
     """
     global CLIP_FOLDERS, CURRENT_CLIP
 
-    selected: str = ROOT.clip_tree.selection()[0]
+    selected: str = ROOT.clip_tree.selection()[0]
+
+    for folder in CLIP_FOLDERS:
+        if folder.db_id == int(selected[2:]):
+            clip_folder = folder
+            break
+    else:
+        # no folder found, return
+        return
+
+    # the scan would add clips back to the folder
+    if SCAN_THREAD is not None:
+        messagebox.showinfo("Remove Folder", "Folders are still being scanned, try again once the scan finishes.")
+        return
+
+    CLIP_FOLDERS.remove(clip_folder)
+
+    # remove the current clip if its in this folder
+    if CURRENT_CLIP in clip_folder.clips:
+        CURRENT_CLIP = None
+
+    # remove node & children from the clip tree
+    ROOT.clip_tree.delete(selected)
+
+    # remove folder & children in database
+    db_handler.remove_folder(clip_folder)
+
+    # stop watching the folder
+    KNOWN_DIRS.pop(clip_folder.db_id, None)
+    watch_folders()
+
+    # refresh tree view
+    refresh_clips()
+
+
+def start_library(start_time: float | None = None) -> None:
+    """
+    Shows the library as the database last saw it, then rescans the folders in the background
+    :param start_time: time.perf_counter() value from app start, used to log how long startup took
+    :return:
+    """
+    load_library()
+    refresh_clips()
+
+    # get the first rows on screen before handing back to the UI loop
+    feed_clip_tree()
+
+    if start_time is not None:
+        ROOT.after_idle(lambda: logger.info("First interactive frame %.1f ms after start",
+                                            (time.perf_counter() - start_time) * 1000))
+
+    # pick up new recordings without a rescan
+    start_watching()
+
+    start_preview_workers()
+
+    # pick up exports the last run didn't finish
+    resume_exports()
+
+    start_background_scan(CLIP_FOLDERS)
+
+
+@db_profiler.track_action
+def load_library() -> None:
+    """
+    Loads the clip folders & their clips from the database, as the last scan found them. Doesn't touch the disk.
+    :return:
+    """
+    global CLIP_FOLDERS, KNOWN_DIRS, KNOWN_FILES
+
+    # grab all clip folder objects
+    clip_folders = db_handler.get_clip_folders()
+    folder_ids = [clip_folder.db_id for clip_folder in clip_folders]
+
+    # load every known clip & its tags in bulk
+    known_clips = db_handler.get_clips_in_folders(folder_ids)
+
+    # load what the last scan found
+    known_dirs, known_files = db_handler.get_scan_state(folder_ids)
+
+    # clips from before scan state was stored are shown until a scan says otherwise
+    unscanned_ids = db_handler.get_unscanned_clip_ids()
+
+    for clip_folder in clip_folders:
+        # map known clips by path for quick lookups
+        folder_clips = {clip.path: clip for clip in known_clips[clip_folder.db_id]}
+
+        paths = scanner.known_paths(clip_folder.path, clip_folder.include_subdirs, known_dirs[clip_folder.db_id],
+                                    known_files)
+
+        # clips that belong to another folder, grab them from the database in one go
+        folder_clips.update(db_handler.get_clips_from_paths([path for path in paths if path not in folder_clips]))
+
+        clip_folder.clips.extend(folder_clips[path] for path in paths if path in folder_clips)
+        clip_folder.clips.extend(clip for clip in known_clips[clip_folder.db_id] if clip.db_id in unscanned_ids)
+
+    # set global clip folders
+    CLIP_FOLDERS = clip_folders
+    KNOWN_DIRS, KNOWN_FILES = known_dirs, known_files
+
+
+def start_background_scan(clip_folders: list[ClipFolder], force_dirs: set[str] | None = None) -> None:
+    """
+    Rescans folders on a worker thread. New clips are added to the clip tree as they are found.
+    :param clip_folders: Folders to scan
+    :param force_dirs: Directories to list again even if their mtime hasn't changed, see scanner.scan_folder
+    :return:
+    """
+    global SCAN_THREAD, SCAN_STARTED_AT
+
+    if SCAN_THREAD is not None:
+        # one scan at a time, the rest wait their turn
+        PENDING_SCAN_FOLDERS.extend(clip_folder for clip_folder in clip_folders
+                                    if clip_folder not in PENDING_SCAN_FOLDERS)
+        PENDING_FORCE_DIRS.update(force_dirs or set())
+        return
+
+    SCAN_THREAD = threading.Thread(target=scan_worker, name="ClipMaker library scan", daemon=True,
+                                   args=(list(clip_folders), scanner.build_extension_set(VIDEO_EXTENSIONS),
+                                         set(force_dirs or set())))
+    SCAN_STARTED_AT = time.perf_counter()
+    SCAN_THREAD.start()
+
+    update_status()
+    ROOT.after(SCAN_CHECK_MS, check_background_scan)
+
+
+def scan_worker(clip_folders: list[ClipFolder], extensions: frozenset[str], force_dirs: set[str]) -> None:
+    """
+    Runs on the scan thread. Only reaches the database through the writer & the UI through SCAN_UPDATES.
+    The scan state in KNOWN_DIRS & KNOWN_FILES is left alone by the UI thread until the scan is done.
+    :param clip_folders: Folders to scan
+    :param extensions: Set built with scanner.build_extension_set
+    :param force_dirs: Directories to list again even if their mtime hasn't changed
+    :return:
+    """
+    def add_batch(clip_folder: ClipFolder, paths: list[str]) -> None:
+        # save each batch of new clips while the scan continues, and send them to the clip tree
+        new_clips = db_handler.add_clips(clip_folder.db_id, paths)
+        if len(new_clips) > 0:
+            SCAN_UPDATES.put(("clips", clip_folder.db_id, new_clips))
+
+    try:
+        results = scanner.scan_folders(clip_folders, extensions, KNOWN_DIRS, KNOWN_FILES, add_batch, force_dirs)
+
+        # skip folders where nothing changed
+        results = {folder_id: result for folder_id, result in results.items()
+                   if result.needs_saving(KNOWN_DIRS.get(folder_id, {}))}
+
+        # save the scan state in one transaction
+        new_clips = db_handler.apply_scan_results(results, KNOWN_DIRS)
+
+        SCAN_UPDATES.put(("done", results, new_clips))
+    except Exception:
+        # writes are refused once the app is closing, the scan is simply redone on the next start
+        if not db_handler.writes_closed():
+            logger.exception("Folder scan failed")
+        SCAN_UPDATES.put(("done", {}, {}))
+
+
+def check_background_scan() -> None:
+    """
+    Applies the updates sent by the scan thread. Runs on a timer until the scan is done.
+    :return:
+    """
+    clip_folders = {clip_folder.db_id: clip_folder for clip_folder in CLIP_FOLDERS}
+
+    while True:
+        try:
+            update = SCAN_UPDATES.get_nowait()
+        except queue.Empty:
+            break
+
+        if update[0] == "done":
+            finish_background_scan(update[1], update[2])
+            return
+
+        _, folder_id, new_clips = update
+        clip_folder = clip_folders.get(folder_id)
+        if clip_folder is None:
+            continue
+
+        clip_folder.clips.extend(new_clips)
+
+        matching_ids = db_handler.get_filtered_clip_ids(CURRENT_FILTER)
+        queue_tree_rows((f"D-{folder_id}", clip) for clip in new_clips if is_clip_visible(clip, matching_ids))
+
+    update_status()
+    ROOT.after(SCAN_CHECK_MS, check_background_scan)
+
+
+@db_profiler.track_action
+def finish_background_scan(results: dict[int, scanner.ScanResult], new_clips: dict[int, list[Clip]]) -> None:
+    """
+    Applies what the scan thread found once it is done, then starts any scans that were waiting
+    :param results: Folder ID to the ScanResult of each folder that changed
+    :param new_clips: Folder ID to clips that were added when saving the results
+    :return:
+    """
+    global SCAN_THREAD
+
+    SCAN_THREAD.join()
+    SCAN_THREAD = None
+
+    patch_clip_folders(results, new_clips)
+
+    # watch any new directories
+    watch_folders()
+
+    # report what changed
+    logger.info("Scanned folders in %.1f ms: %d added, %d modified, %d removed across %d changed folders",
+                (time.perf_counter() - SCAN_STARTED_AT) * 1000,
+                sum(len(result.added) for result in results.values()),
+                sum(len(result.modified) for result in results.values()),
+                sum(len(result.removed) for result in results.values()), len(results))
+
+    if len(PENDING_SCAN_FOLDERS) > 0:
+        clip_folders = [clip_folder for clip_folder in PENDING_SCAN_FOLDERS if clip_folder in CLIP_FOLDERS]
+        force_dirs = set(PENDING_FORCE_DIRS)
+        PENDING_SCAN_FOLDERS.clear()
+        PENDING_FORCE_DIRS.clear()
+
+        start_background_scan(clip_folders, force_dirs)
+
+    # read the details of new & changed clips
+    start_probing()
+
+    update_status()
+
+
+def start_probing() -> None:
+    """
+    Reads the details of clips that were never probed, or whose file changed, on a worker thread
+    :return:
+    """
+    global PROBE_THREAD, PROBE_PENDING, PROBE_TOTAL, PROBE_DONE
+
+    if PROBE_THREAD is not None:
+        # run another pass once this one is done
+        PROBE_PENDING = True
+        return
+
+    PROBE_PENDING = False
+
+    clips = db_handler.get_unprobed_clips()
+    if len(clips) == 0:
+        return
+
+    PROBE_TOTAL = len(clips)
+    PROBE_DONE = 0
+
+    PROBE_THREAD = threading.Thread(target=probe_worker, name="ClipMaker probe", daemon=True, args=(clips,))
+    PROBE_THREAD.start()
+
+    ROOT.after(PROBE_CHECK_MS, check_probing)
+
+
+def probe_worker(clips: dict[int, tuple[str, tuple[int, int] | None]]) -> None:
+    """
+    Runs on the probe thread. Results are saved through the writer & the probed IDs sent to the UI thread.
+    :param clips: Clip ID to the clip's path & the (mtime_ns, size) its file had when last probed
+    :return:
+    """
+    def save_batch(results: dict[int, tuple[tuple[int, int], MediaInfo | None]]) -> None:
+        db_handler.save_media_info(results)
+        PROBE_UPDATES.put(set(results))
+
+    try:
+        start = time.perf_counter()
+        probed = media_probe.probe_files(clips, save_batch, PROBE_STOP)
+
+        logger.info("Probed %d of %d clips in %.1f ms", probed, len(clips), (time.perf_counter() - start) * 1000)
+    except FileNotFoundError:
+        logger.warning("ffprobe could not be found, clip details won't be shown until it is installed")
+    except Exception:
+        logger.exception("Probing clips failed")
+    finally:
+        PROBE_UPDATES.put(None)
+
+
+def check_probing() -> None:
+    """
+    Applies probe results to the clip info panel. Runs on a timer until probing is done.
+    :return:
+    """
+    global PROBE_THREAD, PROBE_DONE
+
+    while True:
+        try:
+            update = PROBE_UPDATES.get_nowait()
+        except queue.Empty:
+            break
+
+        if update is None:
+            PROBE_THREAD.join()
+            PROBE_THREAD = None
+
+            update_status()
+
+            if PROBE_PENDING:
+                start_probing()
+            return
+
+        PROBE_DONE += len(update)
+
+        # the selected clip was probed, show its details
+        if CURRENT_CLIP is not None and CURRENT_CLIP.db_id in update:
+            show_media_info(CURRENT_CLIP)
+
+    update_status()
+    ROOT.after(PROBE_CHECK_MS, check_probing)
+
+
+def start_preview_workers() -> None:
+    """
+    Starts the thumbnail, sprite sheet & waveform workers, and the timer that feeds them
+    :return:
+    """
+    global THUMBNAILS, SPRITE_SHEETS, WAVEFORMS
+
+    if THUMBNAILS is not None:
+        return
+
+    # results are handed to the UI thread through THUMBNAIL_RESULTS & SPRITE_RESULTS
+    THUMBNAILS = thumbnails.ThumbnailGenerator(thumbnails.ThumbnailCache(),
+                                               lambda clip_id, path: THUMBNAIL_RESULTS.put((clip_id, path)))
+    THUMBNAILS.start()
+
+    SPRITE_SHEETS = sprite_sheets.SpriteSheetGenerator(THUMBNAILS.cache,
+                                                      lambda clip_id, sheet: SPRITE_RESULTS.put((clip_id, sheet)))
+    SPRITE_SHEETS.start()
+
+    if waveforms.is_available():
+        WAVEFORMS = waveforms.WaveformGenerator(lambda clip_id, waveform: WAVEFORM_RESULTS.put((clip_id, waveform)))
+        WAVEFORMS.start()
+    else:
+        logger.info("numpy is not installed, waveforms are turned off")
+
+    ROOT.after(THUMBNAIL_CHECK_MS, check_previews)
+
+
+def check_previews() -> None:
+    """
+    Shows finished thumbnails, sprite sheets & waveforms, and queues thumbnails for rows that scrolled into view.
+    Runs on a timer.
+    :return:
+    """
+    global THUMBNAILS_BACKFILLED
+
+    while True:
+        try:
+            clip_id, path = THUMBNAIL_RESULTS.get_nowait()
+        except queue.Empty:
+            break
+
+        THUMBNAIL_PATHS[clip_id] = path
+
+        if path is not None and clip_id in VISIBLE_CLIP_IDS:
+            set_tree_image(clip_id)
+
+        if CURRENT_CLIP is not None and CURRENT_CLIP.db_id == clip_id:
+            show_clip_thumbnail(CURRENT_CLIP)
+
+    while True:
+        try:
+            clip_id, sheet = SPRITE_RESULTS.get_nowait()
+        except queue.Empty:
+            break
+
+        # the selection may have moved on while the sheet was built
+        if CURRENT_CLIP is not None and CURRENT_CLIP.db_id == clip_id:
+            ROOT.media_slider.set_preview(sheet)
+
+    while True:
+        try:
+            clip_id, waveform = WAVEFORM_RESULTS.get_nowait()
+        except queue.Empty:
+            break
+
+        if CURRENT_CLIP is not None and CURRENT_CLIP.db_id == clip_id:
+            ROOT.waveform.set_waveform(waveform)
+
+    request_visible_thumbnails()
+
+    # once the clip tree has settled, queue every other clip behind the visible rows
+    if not THUMBNAILS_BACKFILLED and SCAN_THREAD is None and len(TREE_QUEUE) == 0:
+        THUMBNAILS_BACKFILLED = True
+
+        index = 0
+        for clip_folder in CLIP_FOLDERS:
+            for clip in clip_folder.clips:
+                if clip.db_id not in THUMBNAIL_PATHS:
+                    request_thumbnail(clip, BACKFILL_PRIORITY + index)
+                    index += 1
+
+    ROOT.after(THUMBNAIL_CHECK_MS, check_previews)
+
+
+def request_visible_thumbnails() -> None:
+    """
+    Shows thumbnails for the clip tree rows on screen, queueing any that haven't been made yet
+    :return:
+    """
+    global VISIBLE_CLIP_IDS
+
+    visible = get_visible_clip_ids()
+    if visible == VISIBLE_CLIP_IDS:
+        return
+
+    VISIBLE_CLIP_IDS = visible
+
+    clips = db_handler.get_clips_from_ids(visible)
+
+    # top rows first
+    for index, clip_id in enumerate(visible):
+        if THUMBNAIL_PATHS.get(clip_id) is not None:
+            set_tree_image(clip_id)
+        elif clip_id not in THUMBNAIL_PATHS and clip_id in clips:
+            request_thumbnail(clips[clip_id], index)
+
+
+def get_visible_clip_ids() -> list[int]:
+    """
+    :return: IDs of the clips whose rows are on screen in the clip tree, top to bottom
+    """
+    tree = ROOT.clip_tree
+    row_height = max(1, int(ttk.Style(ROOT).lookup("Treeview", "rowheight") or 20))
+
+    clip_ids = []
+    for y in range(0, tree.winfo_height(), row_height // 2 or 1):
+        iid = tree.identify_row(y)
+
+        if iid.startswith("C-") and (len(clip_ids) == 0 or clip_ids[-1] != int(iid[2:])):
+            clip_ids.append(int(iid[2:]))
+
+    return clip_ids
+
+
+def request_thumbnail(clip: Clip, priority: int) -> None:
+    """
+    Queues a clip's thumbnail to be made
+    :param clip: Clip to make a thumbnail of
+    :param priority: Lower numbers are made first
+    :return:
+    """
+    if THUMBNAILS is None:
+        return
+
+    duration_ms = None if clip.media_info is None else clip.media_info.duration_ms
+    THUMBNAILS.request(clip.db_id, clip.path, duration_ms, priority)
+
+
+def set_tree_image(clip_id: int) -> None:
+    """
+    Shows a clip's thumbnail on its clip tree row, loading it if needed
+    :param clip_id: ID of a clip whose thumbnail has been made
+    :return:
+    """
+    iid = f"C-{clip_id}"
+    if not ROOT.clip_tree.exists(iid):
+        return
+
+    image = TREE_IMAGES.get(clip_id)
+
+    if image is None:
+        try:
+            image = tk.PhotoImage(file=THUMBNAIL_PATHS[clip_id]).subsample(TREE_IMAGE_SUBSAMPLE)
+        except tk.TclError:
+            # evicted from the cache since it was made
+            THUMBNAIL_PATHS.pop(clip_id, None)
+            return
+
+        TREE_IMAGES[clip_id] = image
+
+        # only keep images for the most recently shown rows
+        while len(TREE_IMAGES) > TREE_IMAGE_LIMIT:
+            old_id, _ = TREE_IMAGES.popitem(last=False)
+            if ROOT.clip_tree.exists(f"C-{old_id}"):
+                ROOT.clip_tree.item(f"C-{old_id}", image="")
+    else:
+        TREE_IMAGES.move_to_end(clip_id)
+
+    ROOT.clip_tree.item(iid, image=image)
+
+
+def show_clip_thumbnail(clip: Clip) -> None:
+    """
+    Shows a clip's thumbnail in the clip info panel, moving it to the front of the queue if it isn't made yet
+    :param clip: Clip to show
+    :return:
+    """
+    path = THUMBNAIL_PATHS.get(clip.db_id)
+
+    image = None
+    if path is not None:
+        try:
+            image = tk.PhotoImage(file=path)
+        except tk.TclError:
+            THUMBNAIL_PATHS.pop(clip.db_id, None)
+
+    if image is None and clip.db_id not in THUMBNAIL_PATHS:
+        request_thumbnail(clip, -1)
+
+    # keep a reference, tk doesn't
+    ROOT.thumbnail_label.configure(image=image or "")
+    ROOT.thumbnail_label.image = image
+
+
+def forget_thumbnail(clip_id: int) -> None:
+    """
+    Drops a clip's thumbnail, so a new one is made
+    :param clip_id: ID of the clip whose file changed
+    :return:
+    """
+    THUMBNAIL_PATHS.pop(clip_id, None)
+    TREE_IMAGES.pop(clip_id, None)
+
+    if ROOT.clip_tree.exists(f"C-{clip_id}"):
+        ROOT.clip_tree.item(f"C-{clip_id}", image="")
+
+    # visible rows are checked again on the next tick
+    VISIBLE_CLIP_IDS.clear()
+
+
+@db_profiler.track_action
+def refresh_clips() -> None:
+    """
+    Refresh the clip tree with info from CLIP_FOLDERS. Clip rows are added a chunk at a time by feed_clip_tree.
+    :return:
+    """
+    # clear tree & any rows still waiting from the last refresh
+    ROOT.clip_tree.delete(*ROOT.clip_tree.get_children())
+    TREE_QUEUE.clear()
+
+    # new rows need their thumbnails set again
+    VISIBLE_CLIP_IDS.clear()
+
+    # find clips matching the current filter
+    matching_ids = db_handler.get_filtered_clip_ids(CURRENT_FILTER)
+
+    rows = []
+    for clip_folder in CLIP_FOLDERS:
+        folder_obj = ROOT.clip_tree.insert("", tk.END, text=clip_folder.get_dir_name(), iid=f"D-{clip_folder.db_id}")
+
+        rows.extend((folder_obj, clip) for clip in clip_folder.clips if is_clip_visible(clip, matching_ids))
+
+    queue_tree_rows(rows)
+
+
+def queue_tree_rows(rows) -> None:
+    """
+    Queues rows to be added to the clip tree
+    :param rows: (folder node, clip) pairs
+    :return:
+    """
+    global TREE_FEED_JOB, TREE_FEED_TOTAL
+
+    count = len(TREE_QUEUE)
+    TREE_QUEUE.extend(rows)
+    TREE_FEED_TOTAL += len(TREE_QUEUE) - count
+
+    if TREE_FEED_JOB is None and len(TREE_QUEUE) > 0:
+        TREE_FEED_JOB = ROOT.after(1, feed_clip_tree)
+
+
+def feed_clip_tree() -> None:
+    """
+    Adds the next chunk of queued rows to the clip tree, then hands back to the UI loop until the next chunk
+    :return:
+    """
+    global TREE_FEED_JOB, TREE_FEED_TOTAL
+
+    if TREE_FEED_JOB is not None:
+        ROOT.after_cancel(TREE_FEED_JOB)
+        TREE_FEED_JOB = None
+
+    for _ in range(min(TREE_CHUNK_SIZE, len(TREE_QUEUE))):
+        folder_obj, clip = TREE_QUEUE.popleft()
+
+        # a clip can be in two overlapping folders, but only have one row
+        if not ROOT.clip_tree.exists(f"C-{clip.db_id}"):
+            ROOT.clip_tree.insert(folder_obj, tk.END, text=clip.get_clip_name(), iid=f"C-{clip.db_id}")
+
+    if len(TREE_QUEUE) > 0:
+        # a short delay, rather than none, lets the window redraw between chunks
+        TREE_FEED_JOB = ROOT.after(1, feed_clip_tree)
+    else:
+        TREE_FEED_TOTAL = 0
+
+    update_status()
+
+
+def update_status() -> None:
+    """
+    Shows library scanning & loading progress under the clip tree
+    :return:
+    """
+    if SCAN_THREAD is not None:
+        # the scan can't tell how much is left, so just show that it's working
+        ROOT.status_variable.set("Scanning folders...")
+        if str(ROOT.status_bar["mode"]) != "indeterminate":
+            ROOT.status_bar.configure(mode="indeterminate")
+            ROOT.status_bar.start()
+        return
+
+    if str(ROOT.status_bar["mode"]) == "indeterminate":
+        ROOT.status_bar.stop()
+        ROOT.status_bar.configure(mode="determinate")
+
+    if len(TREE_QUEUE) > 0:
+        ROOT.status_variable.set(f"Loading clips... {TREE_FEED_TOTAL - len(TREE_QUEUE)} of {TREE_FEED_TOTAL}")
+        ROOT.status_bar.configure(maximum=TREE_FEED_TOTAL, value=TREE_FEED_TOTAL - len(TREE_QUEUE))
+    elif PROBE_THREAD is not None:
+        # unchanged files are skipped without probing, so this can jump ahead at the end
+        ROOT.status_variable.set(f"Reading clip details... {PROBE_DONE} of {PROBE_TOTAL}")
+        ROOT.status_bar.configure(maximum=PROBE_TOTAL, value=PROBE_DONE)
+    else:
+        ROOT.status_variable.set("")
+        ROOT.status_bar.configure(value=0)
+
+
+def is_clip_visible(clip: Clip, matching_ids) -> bool:
+    """
+    Checks if a clip should be shown in the clip tree
+    :param clip: Clip to check
+    :param matching_ids: Clip IDs matching the current filter, from db_handler.get_filtered_clip_ids
+    :return: True if the clip isn't hidden & matches the current filter & search
+    """
+    # check if clips match current filter & search
+    matching = matching_ids is None or clip.db_id in matching_ids
+    matching = matching and (CURRENT_SEARCH is None or clip.db_id in CURRENT_SEARCH)
+
+    return not clip.is_hidden and matching
+
+
+def start_watching() -> None:
+    """
+    Starts watching the clip folders for changes
+    :return:
+    """
+    global FOLDER_WATCHER
+
+    FOLDER_WATCHER = folder_watcher.create_watcher()
+    watch_folders()
+    FOLDER_WATCHER.start()
+
+    ROOT.after(WATCH_CHECK_MS, check_watcher)
+
+
+def watch_folders() -> None:
+    """
+    Points the folder watcher at every directory found by the last scan
+    :return:
+    """
+    if FOLDER_WATCHER is not None:
+        FOLDER_WATCHER.set_dirs({path: mtime_ns for dirs in KNOWN_DIRS.values() for path, mtime_ns in dirs.items()})
+
+
+def check_watcher() -> None:
+    """
+    Applies any folder changes the watcher has collected. Runs on a timer, so a burst of file events only causes one
+    update instead of flooding the UI loop.
+    :return:
+    """
+    # changes wait while a scan is running, and are rescanned once it is done
+    if SCAN_THREAD is None:
+        changed_dirs = FOLDER_WATCHER.drain()
+        if len(changed_dirs) > 0:
+            apply_folder_changes(changed_dirs)
+
+    # schedule the next check once this one is done, so slow updates never stack up
+    ROOT.after(WATCH_CHECK_MS, check_watcher)
+
+
+def apply_folder_changes(changed_dirs: set[str]) -> None:
+    """
+    Rescans the folders that changed directories belong to on the scan thread. Once it is done only the affected clip
+    tree rows are patched, see finish_background_scan.
+    :param changed_dirs: Paths of the directories that changed
+    :return:
+    """
+    # only rescan the folders the changes happened in
+    clip_folders = [clip_folder for clip_folder in CLIP_FOLDERS if any(
+        scanner.is_within(path, clip_folder.path, clip_folder.include_subdirs) for path in changed_dirs)]
+
+    if len(clip_folders) == 0:
+        return
+
+    # files written in place don't change their directory's mtime, so the changed directories are always listed
+    start_background_scan(clip_folders, changed_dirs)
+
+
+def patch_clip_folders(results: dict[int, scanner.ScanResult], new_clips: dict[int, list[Clip]]) -> None:
+    """
+    Applies scan results to the loaded clip folders, only touching the clip tree rows of clips that came or went
+    :param results: Folder ID to the ScanResult of each folder that changed
+    :param new_clips: Folder ID to the clips that were newly added to the database for it
+    :return:
+    """
+    global THUMBNAILS_BACKFILLED
+
+    matching_ids = db_handler.get_filtered_clip_ids(CURRENT_FILTER)
+
+    # queue thumbnails for new clips
+    THUMBNAILS_BACKFILLED = False
+
+    for clip_folder in CLIP_FOLDERS:
+        result = results.get(clip_folder.db_id)
+        if result is None:
+            continue
+
+        # drop clips whose files are gone
+        removed = set(result.removed)
+        removed_clips = [clip for clip in clip_folder.clips if clip.path in removed]
+        clip_folder.clips[:] = [clip for clip in clip_folder.clips if clip.path not in removed]
+
+        for clip in removed_clips:
+            if MISSING_CLIPS is not None:
+                MISSING_CLIPS.add(clip.db_id)
+
+            if ROOT.clip_tree.exists(f"C-{clip.db_id}"):
+                ROOT.clip_tree.delete(f"C-{clip.db_id}")
+
+        if len(removed_clips) > 0 and len(TREE_QUEUE) > 0:
+            # don't add rows for removed clips that were still waiting
+            removed_ids = {clip.db_id for clip in removed_clips}
+            waiting_rows = [row for row in TREE_QUEUE if row[1].db_id not in removed_ids]
+            TREE_QUEUE.clear()
+            TREE_QUEUE.extend(waiting_rows)
+
+        # add rows for new files
+        folder_paths = {clip.path for clip in clip_folder.clips}
+        added_clips = {clip.path: clip for clip in new_clips.get(clip_folder.db_id, [])}
 
-    for folder in CLIP_FOLDERS:
-        if folder.db_id == int(selected[2:]):
-            clip_folder = folder
-            break
-    else:
-        # no folder found, return
-        return
+        # files that are already in the database, from another folder or an earlier scan
+        added_clips.update(db_handler.get_clips_from_paths(
+            [path for path in result.added if path not in folder_paths and path not in added_clips]))
 
-    CLIP_FOLDERS.remove(clip_folder)
+        rows = []
+        for path in result.added:
+            clip = added_clips.get(path)
+            if path in folder_paths or clip is None:
+                continue
 
-    # remove the current clip if its in this folder
-    if CURRENT_CLIP in clip_folder.clips:
-        CURRENT_CLIP = None
+            if MISSING_CLIPS is not None:
+                MISSING_CLIPS.discard(clip.db_id)
 
-    # remove node & children from the clip tree
-    ROOT.clip_tree.delete(selected)
+            clip_folder.clips.append(clip)
 
-    # remove folder & children in database
-    db_handler.remove_folder(clip_folder)
+            if is_clip_visible(clip, matching_ids):
+                rows.append((f"D-{clip_folder.db_id}", clip))
 
-    # refresh tree view
-    refresh_clips()
+        queue_tree_rows(rows)
+
+        # changed files need new thumbnails
+        modified = set(result.modified)
+        for clip in clip_folder.clips:
+            if clip.path in modified:
+                forget_thumbnail(clip.db_id)
 
+        # compare the next changes against this scan
+        scanner.update_known_files(KNOWN_FILES, result)
+        KNOWN_DIRS[clip_folder.db_id] = result.dirs
 
-def rescan_folders() -> None:
+
+def queue_search(*_args) -> None:
     """
-    Rescans all folders loaded into the clip maker
+    Restarts the search timer, so searches only run once typing pauses
     :return:
     """
-    global CLIP_FOLDERS
-
-    # grab all clip folder objects
-    clip_folders = db_handler.get_clip_folders()
+    global SEARCH_TIMER
 
-    for clip_folder in clip_folders:
-        # add clip items from folder
-        for file in os.listdir(clip_folder.path):
-            # loop through valid extensions
-            for extension in VIDEO_EXTENSIONS:
-                # check if path is a video file
-                if file.endswith(f".{extension}"):
-                    # create a full path object
-                    path = os.path.join(clip_folder.path, file)
-
-                    # ensure clip doesn't already exist in database
-                    clip = db_handler.does_clip_exist(path)
-                    if clip is None:
-                        # add clip to database
-                        clip = db_handler.add_clip(clip_folder=clip_folder.db_id, path=path)
-                    else:
-                        # grab clip object from database
-                        clip = db_handler.get_clip_from_id(clip)
-
-                    # add clip to clip folder list
-                    clip_folder.clips.append(clip)
-
-                    # move on to next clip
-                    break
-
-    # commit any updates
-    db_handler.DB_OBJ.commit()
+    if SEARCH_TIMER is not None:
+        ROOT.after_cancel(SEARCH_TIMER)
 
-    # set global clip folders
-    CLIP_FOLDERS = clip_folders
+    SEARCH_TIMER = ROOT.after(SEARCH_DELAY_MS, apply_search)
 
 
-def refresh_clips() -> None:
+@db_profiler.track_action
+def apply_search() -> None:
     """
-    Refresh the clip tree with info from CLIP_FOLDERS
+    Narrows the clip tree to clips matching the search box
     :return:
     """
-    # clear tree
-    ROOT.clip_tree.delete(*ROOT.clip_tree.get_children())
+    global CURRENT_SEARCH, SEARCH_TIMER
 
-    for clip_folder in CLIP_FOLDERS:
-        folder_obj = ROOT.clip_tree.insert("", tk.END, text=clip_folder.get_dir_name(), iid=f"D-{clip_folder.db_id}")
+    SEARCH_TIMER = None
 
-        for clip in clip_folder.clips:
-            # check if clips match current filter
-            matching = True
-
-            for section in range(len(CURRENT_FILTER)):
-                for tag in CURRENT_FILTER[section][-1]:
-                    if not db_handler.has_tag(clip.db_id, tag):
-                        # clip is not on tag
-                        matching = False
-                        break
+    query = ROOT.search_variable.get().strip()
+
+    if query == "":
+        CURRENT_SEARCH = None
+    else:
+        # make sure recent name edits are searchable
+        flush_clip_edits()
+        db_handler.wait_for_writes()
 
-                # clip does not match filter, skip
-                if not matching:
-                    break
+        CURRENT_SEARCH = set(db_handler.search_clips(query))
 
-            if not clip.is_hidden and matching:
-                ROOT.clip_tree.insert(folder_obj, tk.END, text=clip.get_clip_name(), iid=f"C-{clip.db_id}")
+    refresh_clips()
 
 
+@db_profiler.track_action
 def select_clip(_event) -> None:
     """
     Event handler for the clip tree item selection
@@ -493,21 +1359,46 @@ def select_clip(_event) -> None:
 
     # only handle C- events
     if selected.startswith("C-"):
+        # save edits to the previous clip
+        flush_clip_edits()
+
         # load clip from ID
         clip = db_handler.get_clip_from_id(int(selected[2:]))
 
         # set global current clip
         CURRENT_CLIP = clip
 
-        # queue clip into media player
-        MEDIA_PLAYER.play(clip.path)
+        if os.path.isfile(clip.path):
+            # queue clip into media player
+            MEDIA_PLAYER.play(clip.path)
+        else:
+            # the file was moved or deleted outside the app
+            db_handler.mark_clips_missing([clip.db_id])
+            if MISSING_CLIPS is not None:
+                MISSING_CLIPS.add(clip.db_id)
+
+            messagebox.showwarning("Missing Clip", f"{clip.path} can't be found. Use Missing Clips in the folder "
+                                                   f"menu to relink or remove it.")
 
         # populate information fields
         ROOT.name_variable.set(clip.get_clip_name())
 
         ROOT.path_variable.set(clip.path)
 
-        # duration is set in the Media Player due to technical limitations
+        # show probed details straight away, the Media Player fills in the duration of unprobed clips once loaded
+        show_media_info(clip)
+
+        show_clip_thumbnail(clip)
+
+        # scrub previews need the clip's length to lay out the sheet
+        ROOT.media_slider.set_preview(None)
+        if SPRITE_SHEETS is not None and clip.media_info is not None and clip.media_info.duration_ms:
+            SPRITE_SHEETS.request(clip.db_id, clip.path, clip.media_info.duration_ms)
+
+        ROOT.waveform.set_waveform(None)
+        ROOT.waveform.set_markers(clip.trimmed_start, clip.trimmed_end)
+        if WAVEFORMS is not None:
+            WAVEFORMS.request(clip.db_id, clip.path)
 
         ROOT.favorite_variable.set(clip.is_favorite)
 
@@ -520,18 +1411,37 @@ def select_clip(_event) -> None:
 
         # set start entry
         if clip.trimmed_start != -1:
-            ROOT.start_variable.set(get_time_from_milliseconds(clip.trimmed_start))
+            ROOT.start_variable.set(get_time_from_milliseconds(clip.trimmed_start, True))
         else:
             ROOT.start_variable.set("00:00")
 
         # set end entry
         if clip.trimmed_end != -1:
-            ROOT.end_variable.set(get_time_from_milliseconds(clip.trimmed_end))
+            ROOT.end_variable.set(get_time_from_milliseconds(clip.trimmed_end, True))
         else:
             # tick update handles times set as "-1".
             ROOT.end_variable.set("-1")
 
 
+def show_media_info(clip: Clip) -> None:
+    """
+    Fills the clip info panel with a clip's probed details
+    :param clip: Clip to show
+    :return:
+    """
+    media_info = clip.media_info
+
+    if media_info is None or media_info.duration_ms is None:
+        # the Media Player fills this in once the clip is loaded
+        ROOT.duration_variable.set("")
+    else:
+        seconds = media_info.duration_ms // 1000
+        ROOT.duration_variable.set(f"{seconds // 60}:{seconds % 60:02}")
+
+    ROOT.media_variable.set("" if media_info is None else media_info.get_summary())
+
+
+@db_profiler.track_action
 def hide_clip() -> None:
     """
     Hides a clip selected in the clip tree
@@ -544,8 +1454,8 @@ def hide_clip() -> None:
 
         ROOT.clip_tree.delete(f"C-{CURRENT_CLIP.db_id}")
 
-        # update favorite
-        db_handler.update_clip(CURRENT_CLIP)
+        # update hidden status
+        queue_clip_edit(CURRENT_CLIP, "is_hidden")
 
 
 def set_favorite() -> None:
@@ -559,17 +1469,23 @@ def set_favorite() -> None:
         CURRENT_CLIP.is_favorite = ROOT.favorite_variable.get()
 
         # update favorite
-        db_handler.update_clip(CURRENT_CLIP)
+        queue_clip_edit(CURRENT_CLIP, "is_favorite")
 
 
 def set_custom_name(*_args) -> None:
     # check that a current clip is set
     if CURRENT_CLIP is not None:
         # get new custom name
-        CURRENT_CLIP.custom_name = ROOT.name_variable.get()
+        custom_name = ROOT.name_variable.get()
+
+        # skip writes when nothing changed
+        if custom_name == CURRENT_CLIP.custom_name:
+            return
+
+        CURRENT_CLIP.custom_name = custom_name
 
         # update name
-        db_handler.update_clip(CURRENT_CLIP)
+        queue_clip_edit(CURRENT_CLIP, "custom_name")
 
         # update tree
         ROOT.clip_tree.item(f"C-{CURRENT_CLIP.db_id}", text=CURRENT_CLIP.custom_name)
@@ -580,12 +1496,20 @@ def set_start_time(*_args) -> None:
     if CURRENT_CLIP is not None:
         # get new start time
         try:
-            CURRENT_CLIP.trimmed_start = get_milliseconds_from_time(ROOT.start_variable.get())
+            trimmed_start = get_milliseconds_from_time(ROOT.start_variable.get())
         except AttributeError:
             return
 
-        # update name
-        db_handler.update_clip(CURRENT_CLIP)
+        # skip writes when nothing changed
+        if trimmed_start == CURRENT_CLIP.trimmed_start:
+            return
+
+        CURRENT_CLIP.trimmed_start = trimmed_start
+
+        # update start time
+        queue_clip_edit(CURRENT_CLIP, "trimmed_start")
+
+        ROOT.waveform.set_markers(CURRENT_CLIP.trimmed_start, CURRENT_CLIP.trimmed_end)
 
 
 def set_end_time(*_args) -> None:
@@ -593,14 +1517,72 @@ def set_end_time(*_args) -> None:
     if CURRENT_CLIP is not None:
         # get new end time
         try:
-            CURRENT_CLIP.trimmed_end = get_milliseconds_from_time(ROOT.end_variable.get())
+            trimmed_end = get_milliseconds_from_time(ROOT.end_variable.get())
         except AttributeError:
             return
 
-        # update name
-        db_handler.update_clip(CURRENT_CLIP)
+        # skip writes when nothing changed
+        if trimmed_end == CURRENT_CLIP.trimmed_end:
+            return
+
+        CURRENT_CLIP.trimmed_end = trimmed_end
+
+        # update end time
+        queue_clip_edit(CURRENT_CLIP, "trimmed_end")
+
+        ROOT.waveform.set_markers(CURRENT_CLIP.trimmed_start, CURRENT_CLIP.trimmed_end)
 
 
+def pick_start_time(milliseconds: int) -> None:
+    """
+    Sets the current clip's start from a click on the waveform
+    :param milliseconds: Time that was clicked
+    :return:
+    """
+    # the variable's trace saves it
+    ROOT.start_variable.set(get_time_from_milliseconds(milliseconds, True))
+
+
+def pick_end_time(milliseconds: int) -> None:
+    """
+    Sets the current clip's end from a click on the waveform
+    :param milliseconds: Time that was clicked
+    :return:
+    """
+    ROOT.end_variable.set(get_time_from_milliseconds(milliseconds, True))
+
+
+def queue_clip_edit(clip: Clip, *fields: str) -> None:
+    """
+    Queues changed clip fields to be written, and schedules a flush if one isn't already pending
+    :param clip: Clip that was edited
+    :param fields: Names of the edited fields
+    :return:
+    """
+    global EDIT_FLUSH_TIMER
+
+    db_handler.queue_clip_edit(clip, *fields)
+
+    if EDIT_FLUSH_TIMER is None:
+        EDIT_FLUSH_TIMER = ROOT.after(EDIT_FLUSH_DELAY_MS, flush_clip_edits)
+
+
+def flush_clip_edits() -> None:
+    """
+    Writes any queued clip edits
+    :return:
+    """
+    global EDIT_FLUSH_TIMER
+
+    # cancel the pending timer, this flush covers it
+    if EDIT_FLUSH_TIMER is not None:
+        ROOT.after_cancel(EDIT_FLUSH_TIMER)
+        EDIT_FLUSH_TIMER = None
+
+    db_handler.flush_clip_edits()
+
+
+@db_profiler.track_action
 def unhide_clips() -> None:
     """
     Unhides clips from the currently selected Clip Folder
@@ -622,7 +1604,7 @@ def unhide_clips() -> None:
         if clip.is_hidden:
             clip.is_hidden = False
 
-            db_handler.update_clip(clip)
+            queue_clip_edit(clip, "is_hidden")
 
     # refresh UI
     refresh_clips()
@@ -714,6 +1696,7 @@ def create_tags_menu() -> tk.Menu:
     return tag_menu
 
 
+@db_profiler.track_action
 def add_tag(tag_id: int) -> None:
     if CURRENT_CLIP is not None:
         # get tag
@@ -759,6 +1742,7 @@ def create_section_popup() -> None:
     save_button.grid(row=1, column=2)
 
 
+@db_profiler.track_action
 def create_section(variable: tk.StringVar, popup: tk.Toplevel):
     """
     Creates a new section with specified string variable's value
@@ -821,6 +1805,7 @@ def create_tag_popup() -> None:
     save_button.grid(row=2, column=2)
 
 
+@db_profiler.track_action
 def create_tag(section_variable: tk.StringVar, name_variable: tk.StringVar, popup: tk.Toplevel) -> None:
     """
     Creates a new tag from a section name, tag name, and a popup frame
@@ -840,11 +1825,8 @@ def create_tag(section_variable: tk.StringVar, name_variable: tk.StringVar, popu
         # section not found
         return
 
-    # create new tag
-    tag = db_handler.create_tag(chosen_section.db_id, name_variable.get())
-
-    # add tag to section tag list
-    chosen_section.tags.append(tag)
+    # create new tag, this also adds it to the section's tag list
+    db_handler.create_tag(chosen_section.db_id, name_variable.get())
 
     # reload tag context menu
     ROOT.tag_menu = create_tags_menu()
@@ -853,6 +1835,7 @@ def create_tag(section_variable: tk.StringVar, name_variable: tk.StringVar, popu
     popup.destroy()
 
 
+@db_profiler.track_action
 def remove_tag():
     active_tag = ROOT.tag_list.get(tk.ACTIVE)
 
@@ -872,8 +1855,10 @@ def remove_tag():
             # remove tag in DB
             db_handler.remove_tag(CURRENT_CLIP.db_id, tag.db_id)
 
-            # refresh UI
-            select_clip(None)
+            # refresh tag list without reloading the clip, the removal may not be written yet
+            ROOT.tag_list.delete(0, tk.END)
+            for tag in CURRENT_CLIP.tags:
+                ROOT.tag_list.insert(tk.END, tag.name)
 
 
 def change_tag_dropdown(*_args) -> None:
@@ -1003,6 +1988,7 @@ def create_section_delete_popup() -> None:
     save_button.grid(row=1, column=2)
 
 
+@db_profiler.track_action
 def delete_tag(section_variable: tk.StringVar, tag_variable: tk.StringVar, popup: tk.Toplevel) -> None:
     chosen_section = section_variable.get()
 
@@ -1035,6 +2021,7 @@ def delete_tag(section_variable: tk.StringVar, tag_variable: tk.StringVar, popup
     popup.destroy()
 
 
+@db_profiler.track_action
 def delete_section(section_variable: tk.StringVar, popup: tk.Toplevel) -> None:
     """
     Deletes a tag section
@@ -1067,6 +2054,7 @@ def delete_section(section_variable: tk.StringVar, popup: tk.Toplevel) -> None:
     popup.destroy()
 
 
+@db_profiler.track_action
 def open_filter_menu() -> None:
     """
     UI for handling filters
@@ -1134,6 +2122,7 @@ def open_filter_menu() -> None:
     apply_button.grid(row=6, column=5)
 
 
+@db_profiler.track_action
 def add_tag_filter():
     """
     Adds a new tag or section to the filter list
@@ -1210,6 +2199,7 @@ def clear_tag_filter():
         ROOT.selected_tag_list.delete(*ROOT.selected_tag_list.get_children())
 
 
+@db_profiler.track_action
 def apply_tag_filter():
     """
     Apply the filters chosen in the filter box to the clip search
@@ -1234,35 +2224,404 @@ def apply_tag_filter():
         ROOT.filter_popup.destroy()
 
 
+@db_profiler.track_action
+def check_missing_clips(force: bool = False) -> set[int]:
+    """
+    Checks every clip in the database for a missing file & flags the missing ones. The result is reused for
+    MISSING_CHECK_MAX_AGE seconds, and kept up to date by the folder watcher in the meantime.
+    :param force: Should the check run even if the last result is still fresh?
+    :return: IDs of the clips whose files can't be found
+    """
+    global MISSING_CLIPS, MISSING_CHECKED_AT
+
+    if not force and MISSING_CLIPS is not None and time.monotonic() - MISSING_CHECKED_AT < MISSING_CHECK_MAX_AGE:
+        return MISSING_CLIPS
+
+    start = time.perf_counter()
+
+    # make sure clips that are still being added are checked too
+    db_handler.wait_for_writes()
+
+    MISSING_CLIPS = scanner.find_missing(db_handler.get_clip_paths())
+    MISSING_CHECKED_AT = time.monotonic()
+
+    # flag them all in one go
+    db_handler.set_missing_clips(MISSING_CLIPS)
+
+    logger.info("Checked for missing clips in %.1f ms, %d missing", (time.perf_counter() - start) * 1000,
+                len(MISSING_CLIPS))
+
+    return MISSING_CLIPS
+
+
+def create_missing_clips_popup(force: bool = False) -> None:
+    """
+    Creates a popup window listing clips whose files can't be found, with options to relink or remove them
+    :param force: Should the missing clip check run even if the last result is still fresh?
+    :return:
+    """
+    missing_clips = db_handler.get_clips_from_ids(sorted(check_missing_clips(force)))
+
+    popup = tk.Toplevel()
+
+    count_label = tk.Label(popup, text=f"{len(missing_clips)} clips can't be found")
+
+    clip_list = tk.Listbox(popup, width=80, height=15)
+    for clip in missing_clips.values():
+        clip_list.insert(tk.END, clip.path)
+
+    def check_again():
+        popup.destroy()
+        create_missing_clips_popup(force=True)
+
+    # buttons
+    back_button = tk.Button(popup, text="Back", command=popup.destroy)
+    check_button = tk.Button(popup, text="Check Again", command=check_again)
+    relink_button = tk.Button(popup, text="Relink by Name", command=lambda: relink_missing_clips(popup))
+    prune_button = tk.Button(popup, text="Remove All", command=lambda: prune_missing_clips(popup))
+
+    if len(missing_clips) == 0:
+        relink_button.configure(state="disabled")
+        prune_button.configure(state="disabled")
+
+    # place items on grid
+    popup.grid()
+
+    count_label.grid(row=0, column=0, columnspan=4)
+    clip_list.grid(row=1, column=0, columnspan=4)
+
+    back_button.grid(row=2, column=0)
+    check_button.grid(row=2, column=1)
+    relink_button.grid(row=2, column=2)
+    prune_button.grid(row=2, column=3)
+
+
+@db_profiler.track_action
+def relink_missing_clips(popup: tk.Toplevel) -> None:
+    """
+    Points missing clips at files with the same name found in the clip folders
+    :param popup: Missing clips popup to close
+    :return:
+    """
+    # the library is reloaded below, which would swap the folders out from under the scan
+    if SCAN_THREAD is not None:
+        messagebox.showinfo("Missing Clips", "Folders are still being scanned, try again once the scan finishes.",
+                            parent=popup)
+        return
+
+    relinked = db_handler.relink_missing_clips()
+
+    if MISSING_CLIPS is not None:
+        MISSING_CLIPS.difference_update(relinked)
+
+    popup.destroy()
+
+    # relinked clips replace the clips made for their new files
+    load_library()
+    refresh_clips()
+
+    messagebox.showinfo("Missing Clips", f"Relinked {len(relinked)} clips.")
+
+
+@db_profiler.track_action
+def prune_missing_clips(popup: tk.Toplevel) -> None:
+    """
+    Removes every missing clip from the database, after asking the user
+    :param popup: Missing clips popup to close
+    :return:
+    """
+    global CURRENT_CLIP
+
+    if not messagebox.askyesno("Missing Clips", "Remove every missing clip & its tags from the library?",
+                               parent=popup):
+        return
+
+    removed = set(db_handler.prune_missing_clips())
+
+    if MISSING_CLIPS is not None:
+        MISSING_CLIPS.difference_update(removed)
+
+    # drop removed clips from the loaded folders & the clip tree
+    for clip_folder in CLIP_FOLDERS:
+        clip_folder.clips[:] = [clip for clip in clip_folder.clips if clip.db_id not in removed]
+
+    for clip_id in removed:
+        if ROOT.clip_tree.exists(f"C-{clip_id}"):
+            ROOT.clip_tree.delete(f"C-{clip_id}")
+
+    if CURRENT_CLIP is not None and CURRENT_CLIP.db_id in removed:
+        CURRENT_CLIP = None
+
+    popup.destroy()
+
+
+@db_profiler.track_action
 def export_clips():
+    """
+    Queues the selected clip, or every clip in the selected folder, to be exported in the background
+    :return:
+    """
+    global EXPORT_QUEUE
+
     # ensure clip tree exists
     if ROOT.clip_tree is not None:
+        # get selected clips
+        try:
+            selected = ROOT.clip_tree.selection()[0]
+        except IndexError:
+            return
+
         # get output directory
         output_dir = filedialog.askdirectory(mustexist=True)
+        if output_dir == "":
+            return
 
-        # get selected clips
-        selected = ROOT.clip_tree.selection()[0]
+        # make sure recent trim edits are saved before clips are read back
+        flush_clip_edits()
+        db_handler.wait_for_writes()
+
+        precision = ROOT.export_precision_variable.get()
 
-        # create export UI
-        media_handler.create_export_ui()
+        if EXPORT_QUEUE is None:
+            # updates are handed to the UI thread through EXPORT_UPDATES
+            EXPORT_QUEUE = export_queue.ExportQueue(queue_export_update)
 
         # check if this is a directory or not
         if selected.startswith("D-"):
-            # create list of clips
-            clip_ids = []
-
             # get all clips listed
-            clips = ROOT.clip_tree.get_children(selected)
-            for clip in clips:
-                clip_ids.append(int(clip[2:]))
+            clip_ids = [int(clip[2:]) for clip in ROOT.clip_tree.get_children(selected)]
 
-            media_handler.export_folder(clip_ids, output_dir)
+            media_handler.export_folder(clip_ids, output_dir, EXPORT_QUEUE, precision)
         else:
             # get clip
             clip = db_handler.get_clip_from_id(int(selected[2:]))
 
             # export clip
-            media_handler.trim_clip(clip.path, output_dir, clip.trimmed_start, clip.trimmed_end)
+            EXPORT_QUEUE.submit(clip, output_dir, precision)
+
+        create_export_popup()
+
+
+def resume_exports() -> None:
+    """
+    Queues exports that were queued or running when the app last closed, showing the export popup if there are any
+    :return:
+    """
+    global EXPORT_QUEUE
+
+    if len(db_handler.get_unfinished_export_jobs()) == 0:
+        return
+
+    if EXPORT_QUEUE is None:
+        # updates are handed to the UI thread through EXPORT_UPDATES
+        EXPORT_QUEUE = export_queue.ExportQueue(queue_export_update)
+
+    jobs = EXPORT_QUEUE.resume()
+    logger.info("Resumed %d unfinished exports", len(jobs))
+
+    create_export_popup()
+
+
+def create_precision_menu(parent: tk.Menu, variable: tk.StringVar) -> tk.Menu:
+    """
+    Creates a menu to pick how exact export cuts have to be
+    :param parent: Menu the new menu cascades from
+    :param variable: Variable holding the picked precision
+    :return: The new menu
+    """
+    precision_menu = tk.Menu(parent, tearoff=0)
+
+    # keyframe cuts can always be stream copied, frame exact cuts may need some re-encoding
+    precision_menu.add_radiobutton(label="Keyframe (fastest)", variable=variable,
+                                   value=media_handler.KEYFRAME_PRECISION)
+    precision_menu.add_radiobutton(label="Exact Frame", variable=variable, value=media_handler.FRAME_PRECISION)
+
+    return precision_menu
+
+
+def create_export_popup() -> None:
+    """
+    Creates a popup window listing exports & their progress, with options to cancel or retry them.
+    Closing the popup leaves the exports running.
+    :return:
+    """
+    global EXPORT_POPUP
+
+    if EXPORT_POPUP is not None:
+        # one popup at a time
+        refresh_export_popup()
+        EXPORT_POPUP.lift()
+        return
+
+    popup = tk.Toplevel()
+    popup.title("Exports")
+
+    EXPORT_POPUP = popup
+
+    summary_variable = tk.StringVar()
+    summary_label = tk.Label(popup, textvariable=summary_variable)
+
+    popup.summary_variable = summary_variable
+
+    job_tree = ttk.Treeview(popup, columns=("status", "progress", "speed", "eta"), selectmode="extended", height=15)
+    job_tree.heading("#0", text="Clip")
+    job_tree.heading("status", text="Status")
+    job_tree.heading("progress", text="Progress")
+    job_tree.heading("speed", text="Speed")
+    job_tree.heading("eta", text="ETA")
+    job_tree.column("#0", width=400)
+    job_tree.column("status", width=300)
+    job_tree.column("progress", width=80, anchor=tk.E)
+    job_tree.column("speed", width=120, anchor=tk.E)
+    job_tree.column("eta", width=80, anchor=tk.E)
+
+    popup.job_tree = job_tree
+
+    def selected_job_ids() -> list[int]:
+        return [int(iid[2:]) for iid in job_tree.selection()]
+
+    def cancel_selected():
+        for job_id in selected_job_ids():
+            EXPORT_QUEUE.cancel(job_id)
+
+    def retry_selected():
+        for job_id in selected_job_ids():
+            EXPORT_QUEUE.retry(job_id)
+
+    def close():
+        global EXPORT_POPUP
+
+        EXPORT_POPUP = None
+        popup.destroy()
+
+    # buttons
+    close_button = tk.Button(popup, text="Close", command=close)
+    cancel_button = tk.Button(popup, text="Cancel", command=cancel_selected)
+    retry_button = tk.Button(popup, text="Retry", command=retry_selected)
+    cancel_all_button = tk.Button(popup, text="Cancel All", command=lambda: EXPORT_QUEUE.cancel_all())
+
+    popup.protocol("WM_DELETE_WINDOW", close)
+
+    # place items on grid
+    popup.grid()
+
+    summary_label.grid(row=0, column=0, columnspan=4)
+    job_tree.grid(row=1, column=0, columnspan=4)
+
+    close_button.grid(row=2, column=0)
+    cancel_button.grid(row=2, column=1)
+    retry_button.grid(row=2, column=2)
+    cancel_all_button.grid(row=2, column=3)
+
+    refresh_export_popup()
+    popup.after(EXPORT_CHECK_MS, check_exports)
+
+
+def queue_export_update(job: export_queue.ExportJob) -> None:
+    """
+    Records that a job changed, for the export popup to show. Called from the export workers
+    :param job: Job that changed
+    :return:
+    """
+    with EXPORT_UPDATES_LOCK:
+        EXPORT_UPDATES[job.job_id] = job
+
+
+def check_exports() -> None:
+    """
+    Applies job updates from the export workers to the export popup. Runs on a timer while the popup is open.
+    :return:
+    """
+    with EXPORT_UPDATES_LOCK:
+        changed = list(EXPORT_UPDATES.values())
+        EXPORT_UPDATES.clear()
+
+    if EXPORT_POPUP is None:
+        # drop updates that came in while the popup was closed, it reads every job when reopened
+        return
+
+    if len(changed) > 0:
+        refresh_export_popup(changed)
+
+    EXPORT_POPUP.after(EXPORT_CHECK_MS, check_exports)
+
+
+def refresh_export_popup(jobs: list[export_queue.ExportJob] | None = None) -> None:
+    """
+    Updates the rows of the export popup
+    :param jobs: Jobs that changed, or None to update every job
+    :return:
+    """
+    job_tree = EXPORT_POPUP.job_tree
+
+    if jobs is None:
+        jobs = list(EXPORT_QUEUE.jobs.values())
+
+    for job in jobs:
+        status = job.state if job.error == "" else f"{job.state}: {job.error}"
+
+        if job.mode != "" and not job.is_finished():
+            # show how the clip is being cut
+            status = f"{status} ({job.mode})"
+
+            if job.step_count > 1:
+                status = f"{status} step {job.step}/{job.step_count}"
+
+        progress = f"{job.progress:.0%}" if job.progress is not None and job.state in (
+            export_queue.RUNNING, export_queue.DONE, export_queue.SKIPPED) else ""
+
+        if job.state == export_queue.RUNNING and job.speed > 0:
+            speed = f"{job.speed:.2f}x, {job.fps:.0f} fps"
+        else:
+            speed = ""
+
+        eta = job.get_eta()
+        eta = get_time_from_milliseconds(int(eta * 1000)) if eta is not None else ""
+
+        values = (status, progress, speed, eta)
+
+        if job_tree.exists(f"J-{job.job_id}"):
+            job_tree.item(f"J-{job.job_id}", values=values)
+        else:
+            job_tree.insert("", tk.END, iid=f"J-{job.job_id}", text=job.name, values=values)
+
+    # count jobs in each state, and total up progress & speed across them
+    counts = {}
+    total_ms = 0
+    done_ms = 0
+    speed = 0.0
+    fps = 0.0
+
+    for job in EXPORT_QUEUE.jobs.values():
+        counts[job.state] = counts.get(job.state, 0) + 1
+
+        if job.state == export_queue.RUNNING:
+            speed += job.speed
+            fps += job.fps
+
+        # cancelled & failed jobs won't add any more, and jobs of unknown length can't be counted
+        if job.duration_ms is not None and job.state in (export_queue.QUEUED, export_queue.RUNNING,
+                                                         export_queue.DONE, export_queue.SKIPPED):
+            total_ms += job.duration_ms
+            if job.state == export_queue.RUNNING:
+                done_ms += job.duration_ms * (job.progress or 0.0)
+            elif job.state != export_queue.QUEUED:
+                done_ms += job.duration_ms
+
+    summary = (f"{counts.get(export_queue.DONE, 0)} of {len(EXPORT_QUEUE.jobs)} exported, "
+               f"{counts.get(export_queue.SKIPPED, 0)} already up to date, "
+               f"{counts.get(export_queue.RUNNING, 0)} running, "
+               f"{counts.get(export_queue.FAILED, 0)} failed, "
+               f"{counts.get(export_queue.CANCELLED, 0)} cancelled")
+
+    if counts.get(export_queue.RUNNING, 0) > 0 and total_ms > 0:
+        summary += f"\n{done_ms / total_ms:.0%} done at {speed:.2f}x real time, {fps:.0f} fps"
+
+        if speed > 0:
+            # the running exports' combined speed, applied to all the media left
+            summary += f", about {get_time_from_milliseconds(int((total_ms - done_ms) / speed))} left"
+
+    EXPORT_POPUP.summary_variable.set(summary)
 
 
 def next_video():
@@ -1316,4 +2675,34 @@ def close_app():
     global ROOT
 
     if ROOT is not None:
+        # save edits to the current clip
+        flush_clip_edits()
+
         ROOT.destroy()
+
+    if FOLDER_WATCHER is not None:
+        FOLDER_WATCHER.stop()
+
+    if THUMBNAILS is not None:
+        THUMBNAILS.stop()
+
+    if SPRITE_SHEETS is not None:
+        SPRITE_SHEETS.stop()
+
+    if WAVEFORMS is not None:
+        WAVEFORMS.stop()
+
+    # stop exports, removing half written clips. They are resumed on the next start
+    if EXPORT_QUEUE is not None:
+        EXPORT_QUEUE.stop()
+
+    # stop probing, killing running probes. Clips that weren't probed are probed on the next start
+    PROBE_STOP.set()
+    if PROBE_THREAD is not None:
+        PROBE_THREAD.join()
+
+    # save any queued writes. A scan still running has its later writes refused & is redone on the next start
+    db_handler.stop_writer()
+
+    # log query stats if profiling is on
+    db_profiler.dump_summary()
@@ -10,24 +10,31 @@ Utility functions
 def get_milliseconds_from_time(time_value: str) -> int:
     """
     Converts a timestamp to milliseconds
-    :param time_value: The time value in a mm:ss format
+    :param time_value: The time value in a mm:ss or mm:ss.mmm format
     :return: Number of milliseconds
     """
     try:
-        minutes, seconds = list(map(int, time_value.split(":")))
+        minutes, seconds = time_value.split(":")
+
+        # seconds can have a fraction, kept to the millisecond
+        seconds, _, fraction = seconds.partition(".")
+        milliseconds = int(fraction.ljust(3, "0")[:3]) if fraction != "" else 0
+
+        minutes, seconds = int(minutes), int(seconds)
     except ValueError:
         return 0
 
     seconds += minutes * 60
 
-    return seconds * 1000
+    return seconds * 1000 + milliseconds
 
 
-def get_time_from_milliseconds(milliseconds: int) -> str:
+def get_time_from_milliseconds(milliseconds: int, show_milliseconds: bool = False) -> str:
     """
     Converts a milliseconds to timestamp
     :param milliseconds: Millisecond count
-    :return: Time in a mm:ss format
+    :param show_milliseconds: Add the milliseconds to the timestamp, when there are any
+    :return: Time in a mm:ss format, or mm:ss.mmm with show_milliseconds
     """
     # make sure a current clip exists
     seconds = milliseconds // 1000
@@ -35,4 +42,7 @@ def get_time_from_milliseconds(milliseconds: int) -> str:
     minutes = seconds // 60
     seconds %= 60
 
+    if show_milliseconds and milliseconds % 1000 != 0:
+        return f"{minutes:02}:{seconds:02}.{milliseconds % 1000:03}"
+
     return f"{minutes:02}:{seconds:02}"
@@ -0,0 +1,417 @@
+"""
+Developed by Keagan B
+ClipMaker -- waveforms.py
+
+Decodes a clip's audio once with ffmpeg into min/max peaks at several zoom levels. Each level is saved as a .npy
+file and opened memory mapped, so drawing only reads the peaks in view. Peak files are kept under a size budget,
+dropping the least recently used clips first. Needs numpy, waveforms are turned off without it.
+"""
+from __future__ import annotations
+
+from typing import Callable
+import subprocess
+import threading
+import hashlib
+import logging
+import ffmpeg
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# where peak files are stored, and how many bytes they can take up
+CACHE_DIR = "./waveforms"
+CACHE_MAX_BYTES = 128 * 1024 * 1024
+
+# audio is decoded to mono 16 bit at this rate
+SAMPLE_RATE = 8000
+
+# samples per peak at the finest level, 10 ms
+BASE_BUCKET_SAMPLES = 80
+
+# each level has this many times fewer peaks than the one before
+LEVEL_FACTOR = 4
+
+# levels stop once they have fewer peaks than this
+MIN_LEVEL_PEAKS = 256
+
+# bytes of audio read from ffmpeg at a time
+READ_SIZE = BASE_BUCKET_SAMPLES * 2 * 4096
+
+# seconds before decoding a clip's audio is given up on
+DECODE_TIMEOUT = 120
+
+
+def is_available() -> bool:
+    """
+    :return: True if numpy is installed, so waveforms can be built
+    """
+    return np is not None
+
+
+class Waveform:
+    """
+    A clip's peaks at every zoom level. Level 0 has one (min, max) pair per BASE_BUCKET_SAMPLES samples.
+    """
+
+    def __init__(self, levels: list):
+        """
+        :param levels: Memory mapped (n, 2) int16 arrays, finest first
+        """
+        self.levels = levels
+
+    def get_bucket_ms(self, level: int) -> float:
+        """
+        :param level: Zoom level
+        :return: Milliseconds covered by each peak on the level
+        """
+        return BASE_BUCKET_SAMPLES * LEVEL_FACTOR ** level * 1000 / SAMPLE_RATE
+
+    def get_duration_ms(self) -> float:
+        """
+        :return: Length of the decoded audio
+        """
+        return len(self.levels[0]) * self.get_bucket_ms(0)
+
+    def get_peaks(self, start_ms: float, end_ms: float, columns: int):
+        """
+        Gets the peaks for a time range, reading from the coarsest level that still has a peak for every column
+        :param start_ms: Start of the range
+        :param end_ms: End of the range
+        :param columns: Number of peaks wanted, usually the width in pixels
+        :return: (columns, 2) array of min & max values, fewer rows if the range has less audio
+        """
+        columns = max(1, columns)
+
+        # pick the level with the fewest peaks that still covers each column
+        level = 0
+        while (level + 1 < len(self.levels)
+               and (end_ms - start_ms) / self.get_bucket_ms(level + 1) >= columns):
+            level += 1
+
+        peaks = self.levels[level]
+        bucket_ms = self.get_bucket_ms(level)
+
+        # only this slice of the file is read
+        start = max(0, int(start_ms // bucket_ms))
+        end = min(len(peaks), int(-(-end_ms // bucket_ms)))
+        if end <= start:
+            return np.zeros((0, 2), dtype=np.int16)
+
+        visible = np.asarray(peaks[start:end])
+
+        # merge peaks into columns
+        edges = np.linspace(0, len(visible), min(columns, len(visible)) + 1).astype(np.int64)[:-1]
+
+        return np.stack((np.minimum.reduceat(visible[:, 0], edges), np.maximum.reduceat(visible[:, 1], edges)),
+                        axis=1)
+
+
+class WaveformGenerator(threading.Thread):
+    """
+    Builds waveforms one at a time on a background thread. Only the latest request is kept, since only the
+    selected clip's waveform is shown.
+    """
+
+    def __init__(self, on_done: Callable[[int, Waveform | None], None], path: str = CACHE_DIR,
+                 max_bytes: int = CACHE_MAX_BYTES):
+        """
+        :param on_done: Called from the thread with the clip ID & its waveform, or None if the clip has no audio
+        :param path: Folder peak files are stored in
+        :param max_bytes: How many bytes the peak files can take up
+        """
+        threading.Thread.__init__(self, name="ClipMaker waveforms", daemon=True)
+
+        self.on_done = on_done
+        self.path = path
+        self.max_bytes = max_bytes
+
+        self._request: tuple[int, str] | None = None
+        self._condition = threading.Condition()
+        self._stopped = False
+
+        # ffmpeg decoding the current clip, killed when a newer request comes in or the thread stops
+        self._process: subprocess.Popen | None = None
+        self._cancelled = False
+
+        # only warn about a missing ffmpeg once
+        self._warned = False
+
+    def request(self, clip_id: int, path: str) -> None:
+        """
+        Asks for a clip's waveform, replacing any waiting request & stopping any decode in progress
+        :param clip_id: ID of the clip
+        :param path: Path of the clip's file
+        :return:
+        """
+        with self._condition:
+            self._request = (clip_id, path)
+            self._cancel_decode()
+            self._condition.notify()
+
+    def stop(self) -> None:
+        """
+        Stops the thread, stopping any decode in progress
+        :return:
+        """
+        with self._condition:
+            self._stopped = True
+            self._request = None
+            self._cancel_decode()
+            self._condition.notify()
+
+        if self.is_alive():
+            self.join()
+
+    def run(self) -> None:
+        while True:
+            with self._condition:
+                while self._request is None and not self._stopped:
+                    self._condition.wait()
+
+                if self._stopped:
+                    return
+
+                clip_id, path = self._request
+                self._request = None
+                self._cancelled = False
+
+            try:
+                waveform = self._load_waveform(path)
+            except FileNotFoundError:
+                if not self._warned:
+                    logger.warning("ffmpeg could not be found, waveforms won't be shown until it is installed")
+                    self._warned = True
+                waveform = None
+            except Exception:
+                logger.exception("Could not build a waveform for %s", path)
+                waveform = None
+
+            with self._condition:
+                self._process = None
+
+                # a newer request replaced this one, its result isn't wanted
+                if self._cancelled:
+                    continue
+
+            self.on_done(clip_id, waveform)
+
+    def _cancel_decode(self) -> None:
+        """
+        Kills the running decode, if there is one. Call with the lock held.
+        :return:
+        """
+        self._cancelled = True
+
+        if self._process is not None:
+            self._process.kill()
+
+    def _set_process(self, process: subprocess.Popen) -> None:
+        """
+        Keeps the decode's ffmpeg process so it can be killed, killing it straight away if it was already cancelled
+        :param process: ffmpeg process
+        :return:
+        """
+        with self._condition:
+            self._process = process
+
+            if self._cancelled:
+                process.kill()
+
+    def _load_waveform(self, path: str) -> Waveform | None:
+        """
+        Opens a clip's stored peaks, decoding them first if they haven't been stored
+        :param path: Path of the clip's file
+        :return: The clip's Waveform, or None if the clip has no audio
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        key = get_key(path, stat.st_mtime_ns, stat.st_size)
+        base_path = os.path.join(self.path, key[:2], key)
+
+        if os.path.exists(f"{base_path}.0.npy"):
+            # mark as recently used, so it's kept over other clips
+            os.utime(f"{base_path}.0.npy")
+        else:
+            peaks = decode_peaks(path, self._set_process)
+            if peaks is None:
+                return None
+
+            save_levels(base_path, build_levels(peaks))
+            prune_cache(self.path, self.max_bytes, key)
+
+        levels = []
+        while os.path.exists(f"{base_path}.{len(levels)}.npy"):
+            levels.append(np.load(f"{base_path}.{len(levels)}.npy", mmap_mode="r"))
+
+        return Waveform(levels) if len(levels) > 0 else None
+
+
+def get_key(path: str, mtime_ns: int, size: int) -> str:
+    """
+    :param path: Path of the clip's file
+    :param mtime_ns: mtime of the file
+    :param size: Size of the file in bytes
+    :return: Key the file's peak files are named after
+    """
+    return hashlib.sha1(f"{path}\0{mtime_ns}\0{size}\0peaks {SAMPLE_RATE} {BASE_BUCKET_SAMPLES}".encode()).hexdigest()
+
+
+def decode_peaks(path: str, on_start: Callable[[subprocess.Popen], None] | None = None):
+    """
+    Decodes a clip's audio with ffmpeg, reducing it to peaks as it streams in so the whole track is never in memory
+    :param path: Path of the clip's file
+    :param on_start: Called with the ffmpeg process once it starts, so it can be killed from another thread
+    :return: (n, 2) int16 array of the min & max of every BASE_BUCKET_SAMPLES samples, or None if there's no audio
+    or the decode was stopped
+    """
+    process = (
+        ffmpeg.input(path)
+        .output("pipe:", format="s16le", acodec="pcm_s16le", ac=1, ar=SAMPLE_RATE, vn=None)
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
+
+    if on_start is not None:
+        on_start(process)
+
+    # give up on clips that take too long, killing ffmpeg ends the read loop below
+    timer = threading.Timer(DECODE_TIMEOUT, process.kill)
+    timer.daemon = True
+    timer.start()
+
+    # stderr is drained on its own thread so ffmpeg can't block on a full pipe
+    stderr = []
+    stderr_thread = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+    stderr_thread.start()
+
+    chunks = []
+    leftover = b""
+
+    while True:
+        data = process.stdout.read(READ_SIZE)
+        if len(data) == 0:
+            break
+
+        data = leftover + data
+
+        # only reduce whole buckets, keeping the rest for the next read
+        usable = len(data) - len(data) % (BASE_BUCKET_SAMPLES * 2)
+        leftover = data[usable:]
+
+        if usable > 0:
+            samples = np.frombuffer(data[:usable], dtype="<i2").reshape(-1, BASE_BUCKET_SAMPLES)
+            chunks.append(np.stack((samples.min(axis=1), samples.max(axis=1)), axis=1))
+
+    if len(leftover) >= 2:
+        samples = np.frombuffer(leftover[:len(leftover) - len(leftover) % 2], dtype="<i2")
+        chunks.append(np.array([[samples.min(), samples.max()]], dtype=np.int16))
+
+    process.wait()
+    stderr_thread.join()
+
+    timed_out = not timer.is_alive()
+    timer.cancel()
+
+    if timed_out:
+        logger.warning("Gave up on a waveform for %s after %d seconds", path, DECODE_TIMEOUT)
+        return None
+
+    if process.returncode != 0 or len(chunks) == 0:
+        logger.debug("ffmpeg could not read audio from %s: %s", path,
+                     b"".join(stderr).decode(errors="replace"))
+        return None
+
+    return np.concatenate(chunks).astype(np.int16)
+
+
+def build_levels(peaks) -> list:
+    """
+    Builds coarser zoom levels by merging every LEVEL_FACTOR peaks
+    :param peaks: (n, 2) array of the finest peaks
+    :return: List of (n, 2) arrays, finest first
+    """
+    levels = [peaks]
+
+    while len(levels[-1]) // LEVEL_FACTOR >= MIN_LEVEL_PEAKS:
+        previous = levels[-1]
+
+        # pad the last group with its own edge values so it merges like the rest
+        padding = -len(previous) % LEVEL_FACTOR
+        if padding > 0:
+            previous = np.concatenate((previous, np.repeat(previous[-1:], padding, axis=0)))
+
+        groups = previous.reshape(-1, LEVEL_FACTOR, 2)
+        levels.append(np.stack((groups[:, :, 0].min(axis=1), groups[:, :, 1].max(axis=1)), axis=1))
+
+    return levels
+
+
+def save_levels(base_path: str, levels: list) -> None:
+    """
+    Writes each level to its own .npy file. Level 0 is written last, since its existence marks the set as complete.
+    :param base_path: Path the files are named after, without the level & extension
+    :param levels: Arrays from build_levels
+    :return:
+    """
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+
+    for level in reversed(range(len(levels))):
+        # write to a temporary file first, so a half written file is never opened
+        temp_path = f"{base_path}.{level}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.save(f, levels[level])
+        os.replace(temp_path, f"{base_path}.{level}.npy")
+
+
+def prune_cache(path: str, max_bytes: int, keep_key: str | None = None) -> None:
+    """
+    Removes the peak files of the least recently used clips until the folder fits in max_bytes. A clip's level 0
+    file's mtime is when it was last used.
+    :param path: Folder peak files are stored in
+    :param max_bytes: How many bytes the peak files can take up
+    :param keep_key: Key of a clip to keep, even if it's the oldest
+    :return:
+    """
+    # key -> [last used, total bytes, file paths]
+    clips: dict[str, list] = {}
+    total_bytes = 0
+
+    for dir_entry in os.scandir(path):
+        if not dir_entry.is_dir():
+            continue
+
+        for entry in os.scandir(dir_entry.path):
+            stat = entry.stat()
+            key = entry.name.split(".")[0]
+
+            clip = clips.setdefault(key, [0, 0, []])
+            clip[1] += stat.st_size
+            clip[2].append(entry.path)
+
+            if entry.name.endswith(".0.npy"):
+                clip[0] = stat.st_mtime_ns
+
+            total_bytes += stat.st_size
+
+    # oldest first. Files left by a crash have no level 0 file, so they go first
+    for key, (_last_used, size, file_paths) in sorted(clips.items(), key=lambda item: item[1][0]):
+        if total_bytes <= max_bytes:
+            break
+
+        if key == keep_key:
+            continue
+
+        for file_path in file_paths:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+
+        total_bytes -= size
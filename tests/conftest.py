@@ -0,0 +1,45 @@
+"""
+Developed by Keagan B
+ClipMaker -- conftest.py
+
+Lets the tests import the app's modules from src, and gives them a fresh database
+
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import db_handler
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """
+    Path for a new database. db_handler is disconnected from it once the test is done
+    :return: Path of the database file
+    """
+    yield str(tmp_path / "clips.db")
+
+    db_handler.stop_writer()
+
+    if db_handler.DB_OBJ is not None:
+        db_handler.DB_OBJ.close()
+
+    db_handler.DB_OBJ = None
+    db_handler.DB_PATH = None
+    db_handler.clear_caches()
+
+
+@pytest.fixture
+def database(db_path):
+    """
+    Connects db_handler to a new database, with the writer thread running like in the app
+    :return: The read connection
+    """
+    db = db_handler.get_database(db_path)
+    db_handler.start_writer()
+
+    return db
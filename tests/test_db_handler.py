@@ -0,0 +1,156 @@
+"""
+Developed by Keagan B
+ClipMaker -- test_db_handler.py
+
+Tests upgrading an old database, that writes go through the writer thread & are refused once it is stopped, and
+searching clips
+
+"""
+import os
+import sqlite3
+import types
+
+import pytest
+
+import db_handler
+
+# tables as they were before any migration
+BASELINE_SCHEMA = """
+CREATE TABLE tag_sections (id INTEGER PRIMARY KEY AUTOINCREMENT, section_name TEXT UNIQUE);
+CREATE TABLE tags (id INTEGER PRIMARY KEY AUTOINCREMENT, tag_name TEXT);
+CREATE TABLE tag_section_to_tags (section_id INTEGER NOT NULL, tag_id INTEGER NOT NULL);
+CREATE TABLE clips (id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT UNIQUE, custom_name TEXT,
+    is_favorite INTEGER DEFAULT 0, is_hidden INTEGER DEFAULT 0, trimmed_start INTEGER DEFAULT 0,
+    trimmed_end INTEGER DEFAULT -1);
+CREATE TABLE clip_to_tags (id INTEGER PRIMARY KEY AUTOINCREMENT, clip_id INTEGER NOT NULL, tag_id INTEGER NOT NULL);
+CREATE TABLE clip_folders (id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT UNIQUE, include_subdirs INTEGER DEFAULT 0);
+CREATE TABLE clip_folder_to_clips (id INTEGER PRIMARY KEY AUTOINCREMENT, clip_folder_id INTEGER, clip_id INTEGER);
+"""
+
+
+def test_migrations(db_path):
+    db = sqlite3.connect(db_path)
+    db.executescript(BASELINE_SCHEMA)
+
+    db.execute("INSERT INTO clip_folders (path) VALUES ('/clips')")
+    db.executemany("INSERT INTO clips (path) VALUES (?)", [("/clips/a.mp4",), ("/clips/b.mp4",)])
+    db.execute("INSERT INTO tag_sections (section_name) VALUES ('Games')")
+    db.executemany("INSERT INTO tags (tag_name) VALUES (?)", [("chess",), ("go",), ("sectionless",)])
+
+    # duplicate links, & links to rows that were deleted
+    db.executemany("INSERT INTO clip_to_tags (clip_id, tag_id) VALUES (?, ?)",
+                   [(1, 1), (1, 1), (1, 2), (3, 1), (2, 9)])
+    db.executemany("INSERT INTO tag_section_to_tags (section_id, tag_id) VALUES (?, ?)",
+                   [(1, 1), (1, 1), (1, 2), (5, 2)])
+    db.executemany("INSERT INTO clip_folder_to_clips (clip_folder_id, clip_id) VALUES (?, ?)",
+                   [(1, 1), (1, 1), (1, 2), (7, 2), (1, 8)])
+    db.commit()
+    db.close()
+
+    database = db_handler.get_database(db_path)
+
+    assert database.execute("PRAGMA user_version").fetchone()[0] == len(db_handler.MIGRATIONS)
+    assert database.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    assert _links(database, "clip_to_tags", "clip_id, tag_id") == [(1, 1), (1, 2)]
+    assert _links(database, "tag_section_to_tags", "section_id, tag_id") == [(1, 1), (1, 2)]
+    assert _links(database, "clip_folder_to_clips", "clip_folder_id, clip_id") == [(1, 1), (1, 2)]
+    assert _links(database, "tags", "id, tag_name") == [(1, "chess"), (2, "go")]
+
+    # duplicates can't come back
+    with pytest.raises(sqlite3.IntegrityError):
+        database.execute("INSERT INTO clip_to_tags (clip_id, tag_id) VALUES (1, 1)")
+
+    # existing clips are searchable by file name & tags
+    assert db_handler.search_clips("chess") == [1]
+    assert db_handler.search_clips("b") == [2]
+
+
+def test_writes_refused_after_stop(database, tmp_path):
+    clip_folder = db_handler.add_dir(str(tmp_path), True)
+
+    db_handler.stop_writer()
+
+    # late writes from other threads must not fall back to the read connection
+    future = db_handler._write(db_handler._execute, "DELETE FROM clip_folders")
+    with pytest.raises(RuntimeError):
+        future.result()
+
+    assert db_handler.writes_closed()
+    assert db_handler.get_clip_folders()[0].db_id == clip_folder.db_id
+
+
+def test_export_job_ids(database, tmp_path):
+    clip = db_handler.add_clip(db_handler.add_dir(str(tmp_path)).db_id, os.path.join(str(tmp_path), "a.mp4"))
+    jobs = [_export_job(clip, os.path.join(str(tmp_path), f"{job_id}.mp4")) for job_id in range(3)]
+
+    # IDs are handed out before the rows are written
+    first_ids = db_handler.add_export_jobs(jobs[:2])
+    second_ids = db_handler.add_export_jobs(jobs[2:])
+    assert first_ids + second_ids == [1, 2, 3]
+
+    for job, db_id in zip(jobs, first_ids + second_ids):
+        job.db_id = db_id
+
+    # and updates queued straight after still find them
+    jobs[1].state = "Failed"
+    db_handler.update_export_job(jobs[1])
+    db_handler.wait_for_writes()
+
+    states = database.execute("SELECT id, state FROM export_jobs ORDER BY id").fetchall()
+    assert states == [(1, "Queued"), (2, "Failed"), (3, "Queued")]
+
+
+def test_delete_tags(database):
+    section = db_handler.create_tag_section("Games")
+    kept = db_handler.create_tag_section("People")
+    tag = db_handler.create_tag(section.db_id, "Chess")
+    db_handler.create_tag(section.db_id, "Go")
+    db_handler.create_tag(kept.db_id, "Alex")
+
+    db_handler.delete_tag(tag.db_id)
+
+    # gone from loaded objects before the write is committed
+    assert [tag.name for tag in db_handler.get_tags_in_section(section.db_id)] == ["Go"]
+
+    db_handler.delete_tag_section(section.db_id)
+    db_handler.wait_for_writes()
+
+    assert database.execute("SELECT tag_name FROM tags").fetchall() == [("Alex",)]
+    assert database.execute("SELECT COUNT(*) FROM tag_section_to_tags").fetchone()[0] == 1
+    assert [section.section_name for section in db_handler.get_all_tags()] == ["People"]
+
+
+def test_search(database, tmp_path):
+    clips = db_handler.add_clips(db_handler.add_dir(str(tmp_path)).db_id,
+                                 [os.path.join(str(tmp_path), name) for name in ("Valorant ace.mp4", "Minecraft.mkv")])
+    db_handler.wait_for_writes()
+
+    assert db_handler.search_clips("val") == [clips[0].db_id]
+    assert db_handler.search_clips("minecraft") == [clips[1].db_id]
+
+    # extensions aren't indexed, and single letters aren't searched as prefixes
+    assert db_handler.search_clips("mp") == []
+    assert db_handler.search_clips("m") == []
+
+
+def _export_job(clip, output_path):
+    """
+    Stands in for an ExportJob, which needs ffmpeg-python to import
+    :param clip: Clip being exported
+    :param output_path: Path the clip is exported to
+    :return: Object with the fields db_handler saves
+    """
+    return types.SimpleNamespace(db_id=None, clip_id=clip.db_id, input_path=clip.path, output_path=output_path,
+                                 start=0, end=5000, precision="frame", state="Queued", error="", fingerprint=None,
+                                 source_state=None, output_state=None, finished_at=0)
+
+
+def _links(database, table, columns):
+    """
+    :param database: Connection to read from
+    :param table: Table to read
+    :param columns: Columns to read, comma separated
+    :return: Every row of the columns, sorted
+    """
+    return sorted(database.execute(f"SELECT {columns} FROM {table}").fetchall())
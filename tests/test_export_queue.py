@@ -0,0 +1,49 @@
+"""
+Developed by Keagan B
+ClipMaker -- test_export_queue.py
+
+Tests that jobs which can't be exported are refused when queued, without running ffmpeg
+
+"""
+import logging
+import os
+
+import pytest
+
+pytest.importorskip("ffmpeg")
+
+import db_handler
+import export_queue
+import media_handler
+
+
+@pytest.fixture
+def jobs(database, monkeypatch):
+    """
+    Export queue with a single worker, stopped once the test is done. Progress isn't logged
+    :return: The ExportQueue object
+    """
+    monkeypatch.setattr(export_queue.progress_logger, "handlers", [logging.NullHandler()])
+
+    queue = export_queue.ExportQueue(lambda job: None, max_workers=1)
+    yield queue
+
+    queue.stop()
+
+
+@pytest.mark.parametrize("start, end", [(5000, 5000), (5000, 3000)])
+def test_empty_trim_refused(jobs, tmp_path, start, end):
+    clip = db_handler.add_clip(db_handler.add_dir(str(tmp_path)).db_id, os.path.join(str(tmp_path), "a.mp4"))
+    clip.trimmed_start, clip.trimmed_end = start, end
+
+    job = jobs.submit(clip, str(tmp_path / "exports"))
+
+    assert job.state == export_queue.FAILED
+    assert job.error == media_handler.TRIM_ERROR
+
+    # retrying doesn't queue it either
+    jobs.retry(job.job_id)
+    assert job.state == export_queue.FAILED
+
+    db_handler.wait_for_writes()
+    assert db_handler.get_unfinished_export_jobs() == []
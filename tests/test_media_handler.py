@@ -0,0 +1,211 @@
+"""
+Developed by Keagan B
+ClipMaker -- test_media_handler.py
+
+Tests that exported trims are as long as asked for & start at 0, on a generated test pattern clip. Skipped when ffmpeg
+isn't on the PATH
+
+"""
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip("ffmpeg")
+
+import media_handler
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None,
+                                reason="ffmpeg is not on the PATH")
+
+CLIP_SECONDS = 20
+FRAME_RATE = 30
+
+# keyframe every 2 seconds, like most recorders
+GOP_SIZE = 60
+GOP_MS = GOP_SIZE * 1000 // FRAME_RATE
+
+# cuts within a frame of the asked for time count as exact
+TOLERANCE_MS = 1000 / FRAME_RATE
+
+# (start, end) in milliseconds. Ends at -1 run to the end of the clip
+TRIMS = [(0, 5000), (2500, 7250), (1234, 9876), (4000, 10000), (4003, 10000), (12345, -1)]
+
+# trims starting between keyframes, which frame precision smart cuts
+SMART_CUT_TRIMS = [(2500, 7250), (1234, 9876), (12345, -1)]
+
+# trims starting on a keyframe, which keyframe precision copies exactly
+KEYFRAME_TRIMS = [(0, 5000), (4000, 10000), (GOP_MS * 6, -1)]
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    """
+    Makes a test pattern clip with a tone
+    :return: Path of the clip
+    """
+    path = str(tmp_path_factory.mktemp("clips") / "pattern.mp4")
+
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", f"testsrc=size=320x240:rate={FRAME_RATE}:"
+                    f"d={CLIP_SECONDS}", "-f", "lavfi", "-i", f"sine=frequency=440:d={CLIP_SECONDS}", "-c:v",
+                    "libx264", "-preset", "ultrafast", "-g", str(GOP_SIZE), "-c:a", "aac", "-shortest", path],
+                   check=True)
+
+    return path
+
+
+@pytest.mark.parametrize("start, end", TRIMS)
+def test_build_trim(clip, tmp_path, start, end):
+    output_path = str(tmp_path / "trimmed.mp4")
+
+    media_handler.build_trim(clip, output_path, start, end).run(quiet=True)
+
+    _assert_exact(output_path, start, end)
+
+
+@pytest.mark.parametrize("start, end", TRIMS)
+def test_frame_precision(clip, tmp_path, start, end):
+    output_path = str(tmp_path / "trimmed.mp4")
+
+    _run_plan(media_handler.plan_export(clip, output_path, start, end, media_handler.FRAME_PRECISION))
+
+    _assert_exact(output_path, start, end)
+
+
+@pytest.mark.parametrize("start, end", KEYFRAME_TRIMS)
+def test_keyframe_precision(clip, tmp_path, start, end):
+    output_path = str(tmp_path / "trimmed.mp4")
+
+    plan = media_handler.plan_export(clip, output_path, start, end, media_handler.KEYFRAME_PRECISION)
+    assert plan.mode == media_handler.COPY
+
+    _run_plan(plan)
+
+    _assert_exact(output_path, start, end)
+
+
+@pytest.mark.parametrize("start, end", [(2500, 7250), (12345, -1)])
+def test_keyframe_precision_snaps_back(clip, tmp_path, start, end):
+    output_path = str(tmp_path / "trimmed.mp4")
+
+    _run_plan(media_handler.plan_export(clip, output_path, start, end, media_handler.KEYFRAME_PRECISION))
+
+    duration_ms, first_frame_ms = _probe_output(output_path)
+
+    # the start can move back as far as the keyframe before it, but never forward
+    expected_ms = _expected_length(start, end)
+    assert expected_ms - TOLERANCE_MS <= duration_ms <= expected_ms + GOP_MS + TOLERANCE_MS
+    assert abs(first_frame_ms) <= TOLERANCE_MS
+
+
+def test_smart_cut_plan(clip, tmp_path):
+    # h264 can be matched, so a start between keyframes is smart cut rather than re-encoded
+    plan = media_handler.plan_export(clip, str(tmp_path / "trimmed.mp4"), 2500, 7250, media_handler.FRAME_PRECISION)
+
+    try:
+        assert plan.mode == media_handler.SMART_CUT
+        assert len(plan.steps) == 3
+
+        # planning writes nothing, the concat list is only written once the plan runs
+        list_path, = plan.concat_lists
+        assert not os.path.exists(list_path)
+
+        plan.prepare()
+        assert os.path.exists(list_path)
+    finally:
+        plan.cleanup()
+
+
+@pytest.mark.parametrize("start, end", SMART_CUT_TRIMS)
+def test_smart_cut_sync(clip, tmp_path, start, end):
+    output_path = str(tmp_path / "trimmed.mp4")
+
+    plan = media_handler.plan_export(clip, output_path, start, end, media_handler.FRAME_PRECISION)
+    assert plan.mode == media_handler.SMART_CUT
+
+    _run_plan(plan)
+
+    # the copied audio has to line up with the joined video
+    video_start_ms, video_duration_ms = _probe_stream(output_path, "v:0")
+    audio_start_ms, audio_duration_ms = _probe_stream(output_path, "a:0")
+
+    assert abs(audio_start_ms - video_start_ms) <= TOLERANCE_MS
+    assert abs(audio_duration_ms - video_duration_ms) <= TOLERANCE_MS
+
+
+@pytest.mark.parametrize("start, end", [(5000, 5000), (5000, 3000)])
+def test_empty_trim(clip, tmp_path, start, end):
+    # ffmpeg would export these from the start to the end of the clip
+    with pytest.raises(ValueError):
+        media_handler.plan_export(clip, str(tmp_path / "trimmed.mp4"), start, end)
+
+
+def _run_plan(plan):
+    """
+    Runs a plan's ffmpeg steps
+    :param plan: ExportPlan to run
+    :return:
+    """
+    try:
+        plan.prepare()
+
+        for stream in plan.steps:
+            stream.run(quiet=True)
+    finally:
+        plan.cleanup()
+
+
+def _expected_length(start, end):
+    """
+    :param start: Starting millisecond of a trim
+    :param end: Ending millisecond of a trim, -1 for the end of the clip
+    :return: How long the trim should be in milliseconds
+    """
+    return (end if end > 0 else CLIP_SECONDS * 1000) - start
+
+
+def _assert_exact(output_path, start, end):
+    """
+    Checks an export is within a frame of the trim's length & starts at 0
+    :param output_path: Path of the exported clip
+    :param start: Starting millisecond of the trim
+    :param end: Ending millisecond of the trim, -1 for the end of the clip
+    :return:
+    """
+    duration_ms, first_frame_ms = _probe_output(output_path)
+
+    assert abs(duration_ms - _expected_length(start, end)) <= TOLERANCE_MS
+    assert abs(first_frame_ms) <= TOLERANCE_MS
+
+
+def _probe_output(path):
+    """
+    :param path: Path of an exported clip
+    :return: Length of the clip's video & timestamp of its first video frame, in milliseconds
+    """
+    result = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries",
+                             "stream=duration:format=duration:frame=pts_time", "-read_intervals", "%+#1", "-of",
+                             "json", path], capture_output=True, check=True)
+    data = json.loads(result.stdout)
+
+    streams = data.get("streams", [])
+    duration = streams[0].get("duration") if streams else None
+    if duration in (None, "N/A"):
+        duration = data["format"]["duration"]
+
+    return float(duration) * 1000, float(data["frames"][0]["pts_time"]) * 1000
+
+
+def _probe_stream(path, stream):
+    """
+    :param path: Path of an exported clip
+    :param stream: ffprobe stream specifier, like a:0
+    :return: Start time & length of the stream, in milliseconds
+    """
+    result = subprocess.run(["ffprobe", "-v", "error", "-select_streams", stream, "-show_entries",
+                             "stream=start_time,duration", "-of", "json", path], capture_output=True, check=True)
+    data = json.loads(result.stdout)["streams"][0]
+
+    return float(data["start_time"]) * 1000, float(data["duration"]) * 1000
@@ -0,0 +1,117 @@
+"""
+Developed by Keagan B
+ClipMaker -- test_media_probe.py
+
+Tests reading clip details from ffprobe output, and that probing stops quickly. ffprobe is replaced by a script
+
+"""
+import json
+import os
+import stat
+import sys
+import threading
+import time
+
+import pytest
+
+import media_probe
+
+# ffprobe output for a 1080p60 clip with audio
+PROBE_OUTPUT = {
+    "format": {"duration": "12.345000", "bit_rate": "8000000", "size": "12345678"},
+    "streams": [
+        {"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080,
+         "avg_frame_rate": "60000/1001", "r_frame_rate": "60/1"},
+        {"codec_type": "audio", "codec_name": "aac"},
+    ],
+}
+
+
+def test_build_media_info():
+    media_info = media_probe.build_media_info(PROBE_OUTPUT)
+
+    assert media_info.duration_ms == 12345
+    assert (media_info.width, media_info.height) == (1920, 1080)
+    assert media_info.fps == 59.94
+    assert (media_info.video_codec, media_info.audio_codec) == ("h264", "aac")
+    assert media_info.bit_rate == 8000000
+    assert media_info.file_size == 12345678
+
+
+def test_build_media_info_missing_values():
+    media_info = media_probe.build_media_info({"format": {"duration": "N/A"},
+                                               "streams": [{"codec_type": "video", "avg_frame_rate": "0/0",
+                                                            "r_frame_rate": "30/1"}]})
+
+    assert media_info.duration_ms is None
+    assert media_info.fps == 30
+    assert media_info.audio_codec is None
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="ffprobe is replaced by a shell script")
+def test_probe_files(tmp_path, monkeypatch):
+    _fake_ffprobe(tmp_path, monkeypatch, f"echo '{json.dumps(PROBE_OUTPUT)}'")
+
+    paths = [_write_clip(tmp_path, name) for name in ("a.mp4", "b.mp4", "c.mp4")]
+    file_state = (os.stat(paths[2]).st_mtime_ns, os.stat(paths[2]).st_size)
+
+    batches = []
+    probed = media_probe.probe_files({1: (paths[0], None), 2: (paths[1], (0, 0)), 3: (paths[2], file_state)},
+                                     batches.append)
+
+    # the third clip hasn't changed since it was probed
+    assert probed == 2
+    assert len(batches) == 1 and set(batches[0]) == {1, 2}
+    assert batches[0][1][1].duration_ms == 12345
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="ffprobe is replaced by a shell script")
+def test_stop_kills_probes(tmp_path, monkeypatch):
+    _fake_ffprobe(tmp_path, monkeypatch, "sleep 30")
+
+    paths = {clip_id: (_write_clip(tmp_path, f"{clip_id}.mp4"), None) for clip_id in range(10)}
+    stop_event = threading.Event()
+
+    batches = []
+    thread = threading.Thread(target=media_probe.probe_files, args=(paths, batches.append, stop_event))
+    thread.start()
+
+    time.sleep(0.5)
+    start = time.monotonic()
+    stop_event.set()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert time.monotonic() - start < 2
+
+    # stopped probes aren't saved as unreadable
+    assert batches == []
+
+
+def _fake_ffprobe(tmp_path, monkeypatch, command):
+    """
+    Puts a script named ffprobe at the front of the PATH
+    :param command: Shell command the script runs
+    :return:
+    """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+
+    script = bin_dir / "ffprobe"
+
+    # exec, so killing the script kills the command like it would ffprobe
+    script.write_text(f"#!/bin/sh\nexec {command}\n")
+    script.chmod(script.stat().st_mode | stat.S_IXUSR)
+
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+
+
+def _write_clip(tmp_path, name):
+    """
+    :param name: File name of the clip
+    :return: Path of a new clip file
+    """
+    path = tmp_path / name
+    path.write_bytes(b"\0" * 10)
+
+    return str(path)
@@ -0,0 +1,325 @@
+"""
+Developed by Keagan B
+ClipMaker -- test_scanner.py
+
+Tests folder scans, and that rescans only report what changed since the last one
+
+"""
+import os
+
+import pytest
+
+import db_handler
+import scanner
+
+EXTENSIONS = scanner.build_extension_set(["mp4", ".MKV"])
+
+
+@pytest.fixture
+def folder(tmp_path):
+    """
+    Makes a clip folder with a subfolder & a file that isn't a video
+    :return: Path of the folder
+    """
+    _write(tmp_path / "b.mp4", 10)
+    _write(tmp_path / "a.MP4", 20)
+    _write(tmp_path / "notes.txt", 5)
+    _write(tmp_path / "sub" / "c.mkv", 30)
+
+    return str(tmp_path)
+
+
+def test_extension_set():
+    assert EXTENSIONS == frozenset({".mp4", ".mkv"})
+    assert scanner.is_video_file("clip.Mp4", EXTENSIONS)
+    assert not scanner.is_video_file("clip.mp4.txt", EXTENSIONS)
+
+
+def test_first_scan(folder):
+    result = scanner.scan_folder(folder, True, EXTENSIONS)
+
+    paths = [os.path.join(folder, "a.MP4"), os.path.join(folder, "b.mp4"), os.path.join(folder, "sub", "c.mkv")]
+    assert result.paths == paths
+    assert list(result.added) == paths
+    assert result.added[paths[1]] == _state(paths[1])
+    assert result.modified == {} and result.removed == []
+    assert set(result.dirs) == {folder, os.path.join(folder, "sub")}
+    assert result.needs_saving({})
+
+
+def test_without_subdirs(folder):
+    result = scanner.scan_folder(folder, False, EXTENSIONS)
+
+    assert result.paths == [os.path.join(folder, "a.MP4"), os.path.join(folder, "b.mp4")]
+    assert set(result.dirs) == {folder}
+
+
+def test_batches(folder, monkeypatch):
+    monkeypatch.setattr(scanner, "BATCH_SIZE", 2)
+
+    batches = []
+    result = scanner.scan_folder(folder, True, EXTENSIONS, on_batch=batches.append)
+
+    assert batches == [result.paths[:2], result.paths[2:]]
+
+
+def test_unchanged_rescan(folder):
+    first = scanner.scan_folder(folder, True, EXTENSIONS)
+    result = _rescan(folder, first)
+
+    # nothing is listed again, the stored listing is reused
+    assert result.skipped_dirs == 2
+    assert result.paths == first.paths
+    assert not result.has_changes()
+    assert not result.needs_saving(first.dirs)
+
+
+def test_added_file(folder):
+    first = scanner.scan_folder(folder, True, EXTENSIONS)
+
+    new_path = os.path.join(folder, "sub", "d.mp4")
+    _write(new_path, 40)
+    _bump_mtime(os.path.join(folder, "sub"))
+
+    result = _rescan(folder, first)
+
+    assert result.added == {new_path: _state(new_path)}
+    assert result.modified == {} and result.removed == []
+    assert result.skipped_dirs == 1
+    sub = os.path.join(folder, "sub")
+    assert result.changed_dirs(first.dirs) == {sub: os.stat(sub).st_mtime_ns}
+    assert result.needs_saving(first.dirs)
+
+
+def test_removed_file(folder):
+    first = scanner.scan_folder(folder, True, EXTENSIONS)
+
+    os.remove(os.path.join(folder, "b.mp4"))
+    _bump_mtime(folder)
+
+    result = _rescan(folder, first)
+
+    assert result.removed == [os.path.join(folder, "b.mp4")]
+    assert result.added == {}
+    assert os.path.join(folder, "b.mp4") not in result.paths
+
+
+def test_modified_file_in_changed_dir(folder):
+    first = scanner.scan_folder(folder, True, EXTENSIONS)
+
+    path = os.path.join(folder, "a.MP4")
+    _write(path, 50)
+    _write(os.path.join(folder, "other.txt"), 1)
+    _bump_mtime(folder)
+
+    result = _rescan(folder, first)
+
+    assert result.modified == {path: _state(path)}
+    assert result.added == {} and result.removed == []
+
+
+def test_removed_subdir(folder):
+    first = scanner.scan_folder(folder, True, EXTENSIONS)
+
+    sub = os.path.join(folder, "sub")
+    os.remove(os.path.join(sub, "c.mkv"))
+    os.rmdir(sub)
+    _bump_mtime(folder)
+
+    result = _rescan(folder, first)
+
+    assert result.removed == [os.path.join(sub, "c.mkv")]
+    assert result.removed_dirs(first.dirs) == [sub]
+    assert result.needs_saving(first.dirs)
+
+
+def test_subdirs_turned_off(folder):
+    first = scanner.scan_folder(folder, True, EXTENSIONS)
+
+    known_files = {}
+    scanner.update_known_files(known_files, first)
+
+    # the subfolder's files aren't part of the folder any more
+    result = scanner.scan_folder(folder, False, EXTENSIONS, first.dirs, known_files)
+
+    assert result.removed == [os.path.join(folder, "sub", "c.mkv")]
+    assert result.removed_dirs(first.dirs) == [os.path.join(folder, "sub")]
+
+
+def test_known_paths(folder):
+    first = scanner.scan_folder(folder, True, EXTENSIONS)
+
+    known_files = {}
+    scanner.update_known_files(known_files, first)
+
+    assert scanner.known_paths(folder, True, first.dirs, known_files) == first.paths
+    assert scanner.known_paths(folder, False, first.dirs, known_files) == first.paths[:2]
+
+
+def test_update_known_files(folder):
+    first = scanner.scan_folder(folder, True, EXTENSIONS)
+
+    sub = os.path.join(folder, "sub")
+
+    known_files = {}
+    scanner.update_known_files(known_files, first)
+    assert known_files == {folder: {path: _state(path) for path in first.paths[:2]},
+                           sub: {first.paths[2]: _state(first.paths[2])}}
+    os.remove(os.path.join(sub, "c.mkv"))
+    _bump_mtime(sub)
+
+    scanner.update_known_files(known_files, _rescan(folder, first))
+
+    # directories with no files left are dropped
+    assert sub not in known_files
+
+
+def test_file_written_in_place(folder):
+    first = scanner.scan_folder(folder, True, EXTENSIONS)
+
+    # writing to a file doesn't change its directory's mtime
+    path = os.path.join(folder, "a.MP4")
+    _finish_writing(path, 100)
+
+    assert not _rescan(folder, first).has_changes()
+
+    # unless the watcher saw it being written
+    result = _rescan(folder, first, {folder})
+
+    assert result.modified == {path: _state(path)}
+    assert result.added == {} and result.removed == []
+    assert not result.changed_dirs(first.dirs)
+
+
+def test_finished_recording_is_stored(folder, database):
+    clip_folder = db_handler.add_dir(folder, True)
+    known_dirs = {clip_folder.db_id: {}}
+    known_files = {}
+
+    # the recording is picked up as soon as it is created
+    path = os.path.join(folder, "recording.mp4")
+    _write(path, 10)
+    _apply_scan(clip_folder, known_dirs, known_files)
+    assert known_files[folder][path] == (os.stat(path).st_mtime_ns, 10)
+
+    # then written to until it is closed
+    _finish_writing(path, 5000)
+    _apply_scan(clip_folder, known_dirs, known_files, {folder})
+
+    db_handler.wait_for_writes()
+    _stored_dirs, stored_files = db_handler.get_scan_state([clip_folder.db_id])
+
+    assert stored_files[folder][path] == _state(path)
+    assert stored_files[folder][path][1] == 5000
+
+
+def test_is_within():
+    folder = os.path.join(os.sep, "clips")
+
+    assert scanner.is_within(folder, folder, False)
+    assert scanner.is_within(os.path.join(folder, "sub"), folder, True)
+    assert not scanner.is_within(os.path.join(folder, "sub"), folder, False)
+    assert not scanner.is_within(folder + "2", folder, True)
+
+
+def test_scan_folders(folder, tmp_path_factory):
+    other = tmp_path_factory.mktemp("other")
+    _write(other / "e.mp4", 10)
+
+    class Folder:
+        def __init__(self, db_id, path, include_subdirs):
+            self.db_id = db_id
+            self.path = path
+            self.include_subdirs = include_subdirs
+
+    results = scanner.scan_folders([Folder(1, folder, True), Folder(2, str(other), False)], EXTENSIONS)
+
+    assert len(results[1].paths) == 3
+    assert results[2].paths == [os.path.join(str(other), "e.mp4")]
+
+
+def test_find_missing(folder):
+    missing = scanner.find_missing({1: os.path.join(folder, "a.MP4"), 2: os.path.join(folder, "gone.mp4"), 3: folder})
+
+    # directories aren't clip files either
+    assert missing == {2, 3}
+
+
+def _rescan(folder, previous, force_dirs=None):
+    """
+    Scans a folder again, compared against an earlier scan of it
+    :param folder: Folder to scan
+    :param previous: ScanResult of the earlier scan
+    :param force_dirs: Directories to list even if their mtime hasn't changed
+    :return: ScanResult of the new scan
+    """
+    known_files = {}
+    scanner.update_known_files(known_files, previous)
+
+    return scanner.scan_folder(folder, True, EXTENSIONS, previous.dirs, known_files, force_dirs=force_dirs)
+
+
+def _apply_scan(clip_folder, known_dirs, known_files, force_dirs=None):
+    """
+    Scans a clip folder & saves what changed, the way the app does after a folder change
+    :param clip_folder: ClipFolder to scan
+    :param known_dirs: Folder ID to directory mtimes, updated in place
+    :param known_files: Directory path to file state, updated in place
+    :param force_dirs: Directories the watcher reported
+    :return:
+    """
+    results = scanner.scan_folders([clip_folder], EXTENSIONS, known_dirs, known_files, force_dirs=force_dirs)
+    db_handler.apply_scan_results(results, known_dirs)
+
+    scanner.update_known_files(known_files, results[clip_folder.db_id])
+    known_dirs[clip_folder.db_id] = results[clip_folder.db_id].dirs
+
+
+def _write(path, size):
+    """
+    Writes a file of a given size, making its directory if needed
+    :param path: Path of the file
+    :param size: Number of bytes to write
+    :return:
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+
+
+def _finish_writing(path, size):
+    """
+    Grows a file in place & moves its mtime forward, keeping its directory's mtime
+    :param path: Path of the file
+    :param size: Size to grow the file to
+    :return:
+    """
+    dir_stat = os.stat(os.path.dirname(path))
+
+    with open(path, "ab") as f:
+        f.write(b"\0" * (size - os.path.getsize(path)))
+
+    mtime_ns = os.stat(path).st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    os.utime(os.path.dirname(path), ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+
+
+def _bump_mtime(path):
+    """
+    Moves a directory's mtime forward, since quick changes can land within the same filesystem timestamp
+    :param path: Path of the directory
+    :return:
+    """
+    mtime_ns = os.stat(path).st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def _state(path):
+    """
+    :param path: Path of a file
+    :return: The file's (mtime_ns, size), as scans store it
+    """
+    stat = os.stat(path)
+
+    return stat.st_mtime_ns, stat.st_size
@@ -0,0 +1,59 @@
+"""
+Developed by Keagan B
+ClipMaker -- test_utils.py
+
+Tests converting between timestamps & milliseconds
+
+"""
+import pytest
+
+import utils
+
+
+@pytest.mark.parametrize("time_value, milliseconds", [
+    ("00:00", 0),
+    ("00:05", 5000),
+    ("01:30", 90000),
+    ("90:00", 5400000),
+    ("00:05.250", 5250),
+    ("01:02.003", 62003),
+    ("00:00.5", 500),
+    ("00:00.05", 50),
+    ("00:01.23456", 1234),
+])
+def test_milliseconds_from_time(time_value, milliseconds):
+    assert utils.get_milliseconds_from_time(time_value) == milliseconds
+
+
+@pytest.mark.parametrize("time_value", ["", "5", "aa:bb", "00:05.x", "00:05:01", "1.5:00"])
+def test_milliseconds_from_bad_time(time_value):
+    assert utils.get_milliseconds_from_time(time_value) == 0
+
+
+@pytest.mark.parametrize("milliseconds, time_value", [
+    (0, "00:00"),
+    (5000, "00:05"),
+    (5250, "00:05"),
+    (90000, "01:30"),
+    (5400000, "90:00"),
+])
+def test_time_from_milliseconds(milliseconds, time_value):
+    assert utils.get_time_from_milliseconds(milliseconds) == time_value
+
+
+@pytest.mark.parametrize("milliseconds, time_value", [
+    (0, "00:00"),
+    (5000, "00:05"),
+    (5250, "00:05.250"),
+    (62003, "01:02.003"),
+    (999, "00:00.999"),
+])
+def test_time_from_milliseconds_shown(milliseconds, time_value):
+    assert utils.get_time_from_milliseconds(milliseconds, show_milliseconds=True) == time_value
+
+
+@pytest.mark.parametrize("milliseconds", [0, 1, 999, 1000, 5250, 62003, 3599999])
+def test_round_trip(milliseconds):
+    time_value = utils.get_time_from_milliseconds(milliseconds, show_milliseconds=True)
+
+    assert utils.get_milliseconds_from_time(time_value) == milliseconds